@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'recipe_project.settings')
+# Serve recipe, glossary and search pages with their async views
+os.environ.setdefault('RECIPES_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'recipes.staticfiles.StaticFilesMiddleware',
+    'recipes.profiling.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,6 +72,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'recipes.context_processors.category_menu',
             ],
         },
     },
@@ -81,13 +84,35 @@ WSGI_APPLICATION = 'recipe_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# SQLite with a tuning profile (recipes.backends.sqlite3): 'production' uses
+# WAL, synchronous=NORMAL, busy_timeout and larger caches, and writes BEGIN
+# IMMEDIATE so concurrent writers queue instead of failing as locked. It is
+# on when DEBUG is off or RECIPES_SQLITE_PROFILE=production; WAL persists in
+# the database file and keeps -wal/-shm files next to it.
+SQLITE_PROFILE = os.environ.get('RECIPES_SQLITE_PROFILE', 'default' if DEBUG else 'production')
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'recipes.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'profile': SQLITE_PROFILE,
+            'transaction_mode': 'IMMEDIATE' if SQLITE_PROFILE == 'production' else 'DEFERRED',
+        },
     }
 }
 
+# Optional read-only connection for reads, routed by recipes.routers.ReadReplicaRouter
+if os.environ.get('RECIPES_SQLITE_REPLICA') == '1':
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'read_only': True},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['recipes.routers.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -132,6 +157,111 @@ STATICFILES_DIRS = [
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Production serving: collectstatic writes hashed, precompressed files, and
+# StaticFilesMiddleware serves them and media uploads when DEBUG is off.
+# Set SENDFILE_HEADER to 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache)
+# to let the front server send the files.
+if not DEBUG:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'recipes.staticfiles.CompressedManifestStaticFilesStorage'},
+    }
+
+RECIPES_STATIC = {
+    'SERVE': not DEBUG,
+    'SERVE_MEDIA': True,
+    'MAX_AGE': 60,
+    'SENDFILE_HEADER': None,
+}
+
+# Cache
+# Shared tier for the recipes page cache; each process also keeps a small LRU in front of it
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+RECIPES_CACHE = {
+    'ALIAS': 'default',
+    'LOCAL_MAX_ENTRIES': 500,
+    'PAGE_TIMEOUT': 600,
+    'VERSION_TIMEOUT': 5,
+}
+
+# Recipe view counts are buffered in memory and written in batches
+RECIPES_VIEW_COUNTER = {
+    'FLUSH_SIZE': 100,
+    'FLUSH_INTERVAL': 10,
+    'BACKGROUND': True,
+}
+
+# Listing pagination: 'page' for numbered pages, 'cursor' for keyset pagination
+RECIPES_PAGINATION = {
+    'MODE': 'page',
+    'COUNT_CACHE_TIMEOUT': 300,
+}
+
+# Related recipes precomputed from shared terms and categories
+RECIPES_RECOMMENDER = {
+    'TOP_K': 6,
+    'MIN_SCORE': 0.05,
+}
+
+# Resized WebP/JPEG copies of uploaded images, made by a background worker pool
+RECIPES_IMAGES = {
+    'WIDTHS': [320, 640, 1024, 1600],
+    'FORMATS': ['webp', 'jpeg'],
+    'WORKERS': 2,
+}
+
+# Ingredient lines without an exact glossary match, e.g. "2 large eggs", are
+# matched to the closest glossary name within a small edit distance
+RECIPES_RESOLVER = {
+    'ENABLED': True,
+    'MAX_DISTANCE': 2,
+    'CACHE_SIZE': 20000,
+}
+
+# Async read views (recipes.async_views), switched on by asgi.py
+RECIPES_ASYNC_VIEWS = os.environ.get('RECIPES_ASYNC_VIEWS') == '1'
+
+# Request profiling: a sample of requests is timed and its SQL counted;
+# routes over their query budget are logged and listed at /profiling-stats/
+RECIPES_PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': float(os.environ.get('RECIPES_PROFILING_SAMPLE_RATE', '1' if DEBUG else '0.1')),
+    'QUERY_BUDGET': 50,
+    'ROUTE_BUDGETS': {
+        'recipe_list': 10,
+        'recipe_detail': 20,
+    },
+    'SLOW_MS': 500,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{levelname} {asctime} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'recipes': {
+            'handlers': ['console'],
+            'level': os.environ.get('RECIPES_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 # Crispy Forms
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap4'
@@ -18,11 +18,15 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from videos.views import search_results
+from recipes.views import search_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('recipes.urls')),
     path('videos/', include('videos.urls')),
-    path('search/', search_results, name='search_results'),
+    path('search/', search_view, name='search_results'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if getattr(settings, 'RECIPES_ASYNC_VIEWS', False):
+    # Under ASGI the read-heavy pages are served by their async versions
+    urlpatterns = [path('', include('recipes.async_urls'))] + urlpatterns
@@ -1,11 +1,27 @@
 from django.contrib import admin
+from django.db import transaction
 from mptt.admin import MPTTModelAdmin
-from .models import Recipe, Category, Glossary, GlossaryCategory, Nutrient, GlossaryNutrient,RecipeReview, ReviewReply
+from .models import Recipe, Category, Glossary, GlossaryCategory, Nutrient, GlossaryNutrient,RecipeReview, ReviewReply, RecipeIngredient
+from .nutrition import rebuild_catalog_nutrition
+from .search import search_ids
+from .cache import invalidate
 
 # Register your models here.
 
+class IndexedSearchMixin:
+    """
+    Use the full-text search index for admin searches when the backend has one.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term:
+            ids = search_ids(self.model, search_term)
+            if ids is not None:
+                return queryset.filter(pk__in=ids), False
+        return super().get_search_results(request, queryset, search_term)
+
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ('recipe_name','get_categories', 'difficulty', 'preparation_time', 'cooking_time', 'created_at')
     list_filter = ('categories', 'difficulty', 'created_at')
     search_fields = ('recipe_name', 'description', 'ingredients_text')
@@ -31,10 +47,24 @@ class RecipeAdmin(admin.ModelAdmin):
         })
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('categories')
+
     def get_categories(self, obj):
         return ", ".join([category.name for category in obj.categories.all()])
     get_categories.short_description = 'Categories'
 
+    actions = ['rebuild_nutrition']
+
+    def rebuild_nutrition(self, request, queryset):
+        """
+        Admin action to recalculate the stored nutrition of selected recipes
+        """
+        rows = rebuild_catalog_nutrition(queryset.values_list('id', flat=True))
+        invalidate('glossary')
+        self.message_user(request, f"Nutrition was recalculated ({rows} rows).")
+    rebuild_nutrition.short_description = "Recalculate nutrition of selected recipes"
+
 @admin.register(Category)
 class CategoryAdmin(MPTTModelAdmin):
     list_display = ('name', 'slug')
@@ -47,18 +77,29 @@ class GlossaryNutrientInline(admin.TabularInline):
     autocomplete_fields = ['nutrient']
 
 @admin.register(Glossary)
-class GlossaryAdmin(MPTTModelAdmin):
+class GlossaryAdmin(IndexedSearchMixin, MPTTModelAdmin):
     list_display = ('name', 'singular_name', 'plural_name', 'slug', 'category', 'created_at', 'updated_at')
     search_fields = ('name', 'singular_name', 'plural_name', 'description')
     prepopulated_fields = {'slug': ('name',)}
     list_filter = ('created_at', 'updated_at', 'category')
     inlines = [GlossaryNutrientInline]
+    actions = ['rebuild_recipe_nutrition']
     fieldsets = (
         (None, {
             'fields': ('name', 'singular_name', 'plural_name', 'slug', 'description', 'parent', 'category')
         }),
     )
 
+    def rebuild_recipe_nutrition(self, request, queryset):
+        """
+        Admin action to recalculate the stored nutrition of every recipe using the selected terms
+        """
+        recipe_ids = set(RecipeIngredient.objects.filter(glossary__in=queryset).values_list('recipe_id', flat=True))
+        rebuild_catalog_nutrition(recipe_ids)
+        invalidate('glossary')
+        self.message_user(request, f"Nutrition of {len(recipe_ids)} recipes was recalculated.")
+    rebuild_recipe_nutrition.short_description = "Recalculate nutrition of recipes using selected terms"
+
 @admin.register(GlossaryNutrient)
 class GlossaryNutrientAdmin(admin.ModelAdmin):
     list_display = ('glossary', 'nutrient', 'value')
@@ -96,7 +137,12 @@ class RecipeReviewAdmin(admin.ModelAdmin):
         """
         Admin action to approve selected reviews
         """
-        queryset.update(is_approved=True)
+        with transaction.atomic():
+            recipes = set(queryset.filter(is_approved=False).values_list('recipe_id', 'recipe__slug'))
+            queryset.update(is_approved=True)
+            # update() bypasses the review signals, so recount the affected recipes
+            Recipe.recount_review_stats([recipe_id for recipe_id, _ in recipes])
+        invalidate('recipes', *[f'recipe:{slug}' for _, slug in recipes])
         self.message_user(request, f"{queryset.count()} reviews were successfully approved.")
     approve_reviews.short_description = "Approve selected reviews"
 
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import register_default_documents
+        from .images import register_default_images
+        register_default_documents()
+        register_default_images()
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import async_views
+
+# Async read views, placed in front of the sync URLs when RECIPES_ASYNC_VIEWS is on
+urlpatterns = [
+    path('', async_views.recipe_list_view, name='recipe_list'),
+    path('recipe/<slug:slug>/', async_views.recipe_detail_view, name='recipe_detail'),
+    path('glossary/<slug:slug>/', async_views.glossary_detail_view, name='glossary_detail'),
+    path('search/', async_views.search_view, name='search_results'),
+]
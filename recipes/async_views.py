@@ -0,0 +1,192 @@
+"""
+Async versions of the read-heavy views, served when the site runs under ASGI.
+
+Queries and template rendering go through sync_to_async() and run one after
+another in Django's thread-sensitive worker, since templates may still touch
+lazy relations and database connections belong to their thread. Giving each
+query a thread of its own, to run them concurrently, made pages slower with
+SQLite as measured by benchmark_read_path. Forms and other writes stay on the
+sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.http import Http404
+from django.shortcuts import render
+
+from .cache import cache_anonymous_page
+from .counters import count_recipe_view
+from .forms import RecipeReviewForm, ReviewReplyForm
+from .models import Recipe, Category, Glossary, RecipeReview
+from .pagination import CachedCountPaginator, CursorPaginator, use_cursor_pagination
+from .search import SearchResults
+from .views import recipe_card_queryset
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    """
+    Async get_object_or_404() for a model or queryset.
+    """
+    queryset = getattr(queryset, '_default_manager', queryset)
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+
+
+async def arender(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def _page_number(value):
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+@cache_anonymous_page('recipes', 'categories')
+async def recipe_list_view(request, category_slug=None):
+    """
+    Async view to list recipes, optionally filtered by category.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        category_slug (str, optional): Slug of the category to filter recipes
+
+    Returns:
+        HttpResponse: Rendered recipe list template
+    """
+    queryset = recipe_card_queryset()
+
+    if category_slug:
+        category = await aget_object_or_404(Category, slug=category_slug)
+        queryset = queryset.filter(categories=category)
+
+    if use_cursor_pagination(request):
+        paginator = CursorPaginator(queryset, 12, ('-created_at', '-id'), scopes=('recipes',))
+        page_obj = await sync_to_async(paginator.get_page)(request.GET.get('cursor'))
+    else:
+        paginator = CachedCountPaginator(queryset, 12, scopes=('recipes',))
+        page_obj = await sync_to_async(paginator.get_page)(request.GET.get('page'))
+    categories = [category async for category in Category.objects.all()]
+    if not isinstance(page_obj.object_list, list):
+        # Fetch the page with its prefetched categories before rendering
+        page_obj.object_list = [recipe async for recipe in page_obj.object_list]
+
+    context = {
+        'recipes': page_obj,
+        'categories': categories,
+        'is_paginated': page_obj.has_other_pages(),
+    }
+    return await arender(request, 'recipes/recipe_list.html', context)
+
+
+@count_recipe_view
+@cache_anonymous_page('recipe:{slug}', 'glossary', 'categories', 'recommendations')
+async def recipe_detail_view(request, slug):
+    """
+    Async view to display a single recipe's details.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the recipe
+
+    Returns:
+        HttpResponse: Rendered recipe detail template
+    """
+    recipe = await aget_object_or_404(Recipe, slug=slug)
+
+    related_recipes = await recipe.aget_related_recipes()
+    nutritional_details = await sync_to_async(recipe.get_detailed_nutritional_values)()
+    reviews = [
+        review async for review in
+        RecipeReview.objects.filter(recipe=recipe, is_approved=True).order_by('-created_at')
+    ]
+
+    context = {
+        'recipe': recipe,
+        'related_recipes': related_recipes,
+        'total_nutrition': nutritional_details['total'],
+        'daily_values': nutritional_details['daily_values'],
+        'reviews': reviews,
+        # Review statistics are stored on the recipe
+        'average_rating': recipe.averageReview(),
+        'review_count': recipe.review_count,
+        'star_values': [5, 4, 3, 2, 1],
+        'star_percentages': recipe.get_star_percentages(),
+        'review_form': RecipeReviewForm(),
+        'reply_form': ReviewReplyForm(),
+    }
+    return await arender(request, 'recipes/recipe_detail.html', context)
+
+
+@cache_anonymous_page('glossary:{slug}', 'recipes')
+async def glossary_detail_view(request, slug):
+    """
+    Async view to display a single Glossary term's details.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the glossary term
+
+    Returns:
+        HttpResponse: Rendered glossary detail template
+    """
+    glossary_term = await aget_object_or_404(Glossary, slug=slug)
+
+    # Child terms and recipes using this term in [brackets]
+    child_terms = [term async for term in Glossary.objects.filter(parent=glossary_term)]
+    related_recipes = [
+        recipe async for recipe in
+        Recipe.objects.filter(ingredient_terms__term__in=glossary_term.get_term_forms()).distinct()
+    ]
+
+    # If no recipes found and term has children, check child terms
+    if not related_recipes and child_terms:
+        term_forms = set()
+        async for term in glossary_term.get_descendants().only('name', 'singular_name', 'plural_name'):
+            term_forms |= term.get_term_forms()
+        related_recipes = [
+            recipe async for recipe in Recipe.objects.filter(ingredient_terms__term__in=term_forms).distinct()
+        ]
+
+    context = {
+        'glossary_term': glossary_term,
+        'child_terms': child_terms,
+        'related_recipes': related_recipes,
+    }
+    return await arender(request, 'recipes/glossary_detail.html', context)
+
+
+async def search_view(request):
+    """
+    Async view to search recipes, glossary terms and videos.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with the query in ?q=
+            and an optional ?type= of recipe, glossary or video
+
+    Returns:
+        HttpResponse: Rendered search results template
+    """
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type')
+    results = SearchResults(query, kinds=[kind] if kind else None)
+
+    per_page = 12
+    paginator = Paginator(results, per_page)
+    paginator.count = count = await sync_to_async(results.count)()
+    # Past the end: show the last page, like Paginator.get_page()
+    number = min(_page_number(request.GET.get('page')), paginator.num_pages)
+    offset = (number - 1) * per_page
+    hits = await sync_to_async(results.__getitem__)(slice(offset, offset + per_page))
+    page_obj = paginator._get_page(hits, number, paginator)
+
+    context = {
+        'query': query,
+        'type': kind,
+        'results': page_obj,
+        'result_count': count,
+        'is_paginated': page_obj.has_other_pages(),
+    }
+    return await arender(request, 'recipes/search_results.html', context)
@@ -0,0 +1 @@
+# SQLite backend with tuning profiles
@@ -0,0 +1,79 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+# Pragmas applied to every new connection, by profile
+PROFILES = {
+    # SQLite defaults, as with django.db.backends.sqlite3
+    'default': {},
+    # Readers never block the writer and the writer never blocks readers
+    'production': {
+        'journal_mode': 'WAL',
+        # Durable at checkpoints only, which is safe in WAL mode
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+        # Negative sizes are in KiB
+        'cache_size': -64 * 1024,
+        'temp_store': 'MEMORY',
+    },
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+# OPTIONS handled here instead of being passed to sqlite3.connect()
+BACKEND_OPTIONS = ('profile', 'pragmas', 'transaction_mode', 'read_only')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite backend with tuning profiles, set in the database OPTIONS.
+
+    OPTIONS:
+        profile (str): 'default' or 'production' (WAL, synchronous=NORMAL,
+            busy_timeout, mmap and cache sizes)
+        pragmas (dict): Pragmas added to or overriding the profile
+        transaction_mode (str): How atomic blocks BEGIN. 'IMMEDIATE' takes
+            the write lock up front, so a transaction that reads and then
+            writes waits for busy_timeout instead of failing with
+            "database is locked" when another writer got there first.
+        read_only (bool): Refuse writes on this connection (PRAGMA query_only),
+            for a read replica alias on the same file
+    """
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for name in BACKEND_OPTIONS:
+            kwargs.pop(name, None)
+        return kwargs
+
+    @property
+    def tuning(self):
+        options = self.settings_dict['OPTIONS']
+        profile = options.get('profile', 'default')
+        if profile not in PROFILES:
+            raise ImproperlyConfigured(f"Unknown SQLite profile '{profile}', use one of {', '.join(PROFILES)}")
+        pragmas = {**PROFILES[profile], **options.get('pragmas', {})}
+        if self.is_in_memory_db():
+            pragmas.pop('journal_mode', None)
+            pragmas.pop('mmap_size', None)
+        if options.get('read_only'):
+            pragmas['query_only'] = 'ON'
+        return pragmas
+
+    @property
+    def transaction_mode(self):
+        options = self.settings_dict['OPTIONS']
+        if options.get('read_only'):
+            return 'DEFERRED'
+        mode = options.get('transaction_mode', 'DEFERRED').upper()
+        if mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(f"Unknown SQLite transaction_mode '{mode}', use one of {', '.join(TRANSACTION_MODES)}")
+        return mode
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.tuning.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
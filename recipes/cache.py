@@ -0,0 +1,277 @@
+import hashlib
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+
+
+CSRF_PLACEHOLDER = '__recipes_csrf_token__'
+CSRF_INPUT_RE = re.compile(r'(name=["\']csrfmiddlewaretoken["\'] value=["\'])([^"\']+)(["\'])')
+
+_MISSING = object()
+
+# Shared tier values carry their wall clock expiry, so local copies expire with them
+SharedEntry = namedtuple('SharedEntry', ['expires', 'value'])
+
+
+def get_cache_settings():
+    """
+    Returns the RECIPES_CACHE settings merged with their defaults.
+    """
+    options = {
+        'ALIAS': 'default',
+        'LOCAL_MAX_ENTRIES': 500,
+        'PAGE_TIMEOUT': 600,
+        'VERSION_TIMEOUT': 5,
+        'PAGES': True,
+    }
+    options.update(getattr(settings, 'RECIPES_CACHE', {}))
+    return options
+
+
+class LRUCache:
+    """
+    Thread-safe in-process cache that evicts the least recently used entry.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns a (found, value) tuple, dropping the entry if it has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return False, None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, timeout=None):
+        expires = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    Two-tier cache: a per-process LRU in front of a shared Django cache.
+
+    Keys are built from scope versions kept in the shared tier. Invalidating
+    a scope bumps its version, so old entries are never read again and age
+    out of both tiers. Other processes notice a bump once their local copy
+    of the version expires, after VERSION_TIMEOUT seconds.
+    """
+
+    def __init__(self, alias='default', local_max_entries=500, version_timeout=5):
+        self.alias = alias
+        self.version_timeout = version_timeout
+        self.local = LRUCache(local_max_entries)
+        self.stats = Counter()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get(self, key, default=None):
+        found, value = self.local.get(key)
+        if found:
+            self.stats['local_hits'] += 1
+            return value
+        entry = self.shared.get(key, _MISSING)
+        if isinstance(entry, SharedEntry):
+            remaining = None if entry.expires is None else entry.expires - time.time()
+            if remaining is None or remaining > 0:
+                self.stats['shared_hits'] += 1
+                self.local.set(key, entry.value, remaining)
+                return entry.value
+        self.stats['misses'] += 1
+        return default
+
+    def set(self, key, value, timeout=None):
+        self.local.set(key, value, timeout)
+        expires = None if timeout is None else time.time() + timeout
+        self.shared.set(key, SharedEntry(expires, value), timeout)
+
+    def get_or_set(self, key, default, timeout=None):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default() if callable(default) else default
+            self.set(key, value, timeout)
+        return value
+
+    def get_version(self, scope):
+        key = f'recipes:version:{scope}'
+        found, version = self.local.get(key)
+        if found:
+            return version
+        version = self.shared.get(key)
+        if version is None:
+            # Start from the clock so versions never repeat after the shared cache is cleared
+            version = int(time.time() * 1000)
+            if not self.shared.add(key, version, timeout=None):
+                version = self.shared.get(key, version)
+        self.local.set(key, version, self.version_timeout)
+        return version
+
+    def invalidate(self, *scopes):
+        """
+        Bump the version of each scope so entries built from it are no longer used.
+        """
+        for scope in scopes:
+            key = f'recipes:version:{scope}'
+            try:
+                self.shared.incr(key)
+            except ValueError:
+                self.shared.add(key, int(time.time() * 1000), timeout=None)
+            self.local.delete(key)
+            self.stats['invalidations'] += 1
+
+    def make_key(self, name, scopes, extra=''):
+        """
+        Build a key that changes whenever one of its scopes is invalidated.
+        """
+        versions = ','.join(f'{scope}={self.get_version(scope)}' for scope in scopes)
+        digest = hashlib.md5(f'{versions}|{extra}'.encode()).hexdigest()
+        return f'recipes:{name}:{digest}'
+
+    def get_stats(self):
+        lookups = self.stats['local_hits'] + self.stats['shared_hits'] + self.stats['misses']
+        hits = self.stats['local_hits'] + self.stats['shared_hits']
+        return {
+            'local_hits': self.stats['local_hits'],
+            'shared_hits': self.stats['shared_hits'],
+            'misses': self.stats['misses'],
+            'invalidations': self.stats['invalidations'],
+            'hit_rate': hits / lookups if lookups else 0,
+            'local_entries': len(self.local),
+            'local_max_entries': self.local.max_entries,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide TieredCache configured by RECIPES_CACHE.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                options = get_cache_settings()
+                _cache = TieredCache(
+                    alias=options['ALIAS'],
+                    local_max_entries=options['LOCAL_MAX_ENTRIES'],
+                    version_timeout=options['VERSION_TIMEOUT'],
+                )
+    return _cache
+
+
+def invalidate(*scopes):
+    get_cache().invalidate(*scopes)
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD') or not get_cache_settings()['PAGES']:
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Pending messages must be shown to this visitor, not baked into the page
+    return len(messages.get_messages(request)) == 0
+
+
+def cache_anonymous_page(*scopes):
+    """
+    Cache the rendered page for anonymous visitors.
+
+    The CSRF token is stored as a placeholder and replaced with the current
+    visitor's token on every hit, so guest review forms keep working.
+    Logged-in users and requests with pending messages always get a fresh render.
+
+    Args:
+        *scopes (str): Scopes the page depends on, formatted with the view's
+            keyword arguments, e.g. 'recipe:{slug}'
+    """
+    def decorator(view_func):
+        def page_key(request, kwargs):
+            return get_cache().make_key(
+                f'page:{view_func.__name__}',
+                [scope.format(**kwargs) for scope in scopes],
+                request.get_full_path(),
+            )
+
+        def cached_response(request, key):
+            cached = get_cache().get(key)
+            if cached is None:
+                return None
+            content_type, content = cached
+            if CSRF_PLACEHOLDER in content:
+                content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        def store_response(key, response):
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                content = response.content.decode(response.charset)
+                content = CSRF_INPUT_RE.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<3>', content)
+                get_cache().set(key, (response['Content-Type'], content), get_cache_settings()['PAGE_TIMEOUT'])
+            response['X-Cache'] = 'MISS'
+            return response
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                # Loading the user and the messages reads the session
+                if not await sync_to_async(_is_cacheable_request)(request):
+                    return await view_func(request, *args, **kwargs)
+                key = page_key(request, kwargs)
+                response = cached_response(request, key)
+                if response is None:
+                    response = store_response(key, await view_func(request, *args, **kwargs))
+                return response
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not _is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+            key = page_key(request, kwargs)
+            response = cached_response(request, key)
+            if response is None:
+                response = store_response(key, view_func(request, *args, **kwargs))
+            return response
+        return wrapper
+    return decorator
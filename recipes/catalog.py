@@ -0,0 +1,417 @@
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from itertools import groupby
+
+from django.apps import apps
+from django.core.serializers import serialize
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .importer import BulkImporter, RECIPE_FIELDS, REVIEW_FIELDS, chunked, clear_catalog
+from .models import (
+    Category, Glossary, GlossaryCategory, GlossaryNutrient, Nutrient, Recipe, RecipeReview, ReviewReply,
+)
+
+
+CATALOG_FORMAT = 'recipes-catalog'
+CATALOG_VERSION = 1
+
+
+class CatalogError(Exception):
+    """
+    Raised for unreadable, corrupt or incompatible catalog files.
+    """
+
+
+def _timestamps(obj):
+    return {
+        'created_at': obj.created_at.isoformat() if obj.created_at else None,
+        'updated_at': obj.updated_at.isoformat() if obj.updated_at else None,
+    }
+
+
+def export_nutrients(chunk_size):
+    return Nutrient.objects.order_by('id').values('name', 'unit', 'nutrient_type').iterator(chunk_size=chunk_size)
+
+
+def export_glossary_categories(chunk_size):
+    return (
+        GlossaryCategory.objects.order_by('id')
+        .values('category_name', 'slug', 'description')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def export_categories(chunk_size):
+    rows = Category.objects.order_by('tree_id', 'lft').values_list('name', 'slug', 'parent__slug')
+    for name, slug, parent in rows.iterator(chunk_size=chunk_size):
+        yield {'name': name, 'slug': slug, 'parent': parent}
+
+
+def export_glossary(chunk_size):
+    rows = Glossary.objects.order_by('tree_id', 'lft').values_list(
+        'name', 'slug', 'singular_name', 'plural_name', 'description', 'category__category_name', 'parent__slug')
+    for name, slug, singular_name, plural_name, description, category, parent in rows.iterator(chunk_size=chunk_size):
+        yield {
+            'name': name,
+            'slug': slug,
+            'singular_name': singular_name,
+            'plural_name': plural_name,
+            'description': description,
+            'category': category,
+            'parent': parent,
+        }
+
+
+def export_glossary_nutrients(chunk_size):
+    rows = GlossaryNutrient.objects.order_by('glossary_id', 'nutrient_id').values_list(
+        'glossary__slug', 'glossary__name', 'nutrient__name', 'value')
+    for (slug, name), values in groupby(rows.iterator(chunk_size=chunk_size), key=lambda row: row[:2]):
+        yield {'slug': slug, 'name': name, 'nutrition': {nutrient: value for _, _, nutrient, value in values}}
+
+
+def export_recipes(chunk_size):
+    recipes = (
+        Recipe.objects.order_by('id')
+        .defer('ingredients_html')
+        .prefetch_related(
+            Prefetch('categories', queryset=Category.objects.only('id', 'slug')),
+            Prefetch('related_terms', queryset=Glossary.objects.only('id', 'slug')),
+        )
+    )
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        record = {field: getattr(recipe, field) for field in RECIPE_FIELDS}
+        record['image'] = recipe.image.name or None
+        record.update(_timestamps(recipe))
+        record['slug'] = recipe.slug
+        record['categories'] = [category.slug for category in recipe.categories.all()]
+        record['related_terms'] = [term.slug for term in recipe.related_terms.all()]
+        yield record
+
+
+def export_recipe_links(chunk_size):
+    rows = Recipe.related_recipes.through.objects.order_by('from_recipe_id', 'to_recipe_id').values_list(
+        'from_recipe__slug', 'to_recipe__slug')
+    for slug, links in groupby(rows.iterator(chunk_size=chunk_size), key=lambda row: row[0]):
+        yield {'slug': slug, 'related_recipes': [to_slug for _, to_slug in links]}
+
+
+def export_reviews(chunk_size):
+    reviews = (
+        RecipeReview.objects.order_by('id')
+        .select_related('recipe', 'user')
+        .only('recipe__slug', 'user__username', *REVIEW_FIELDS, 'created_at', 'updated_at')
+        .prefetch_related(Prefetch('replies', queryset=ReviewReply.objects.select_related('user').order_by('id')))
+    )
+    for review in reviews.iterator(chunk_size=chunk_size):
+        record = {field: getattr(review, field) for field in REVIEW_FIELDS}
+        record.update(_timestamps(review))
+        record['recipe'] = review.recipe.slug
+        record['user'] = review.user.username if review.user else None
+        record['replies'] = [
+            {
+                'user': reply.user.username,
+                'reply_text': reply.reply_text,
+                'ip': reply.ip,
+                'is_approved': reply.is_approved,
+                **_timestamps(reply),
+            }
+            for reply in review.replies.all()
+        ]
+        yield record
+
+
+def export_videos(chunk_size):
+    """
+    Videos have no dedicated importer, so they use Django's serialization format.
+    """
+    if not apps.is_installed('videos'):
+        return
+    for model in apps.get_app_config('videos').get_models():
+        for chunk in chunked(model._default_manager.order_by('pk').iterator(chunk_size=chunk_size), chunk_size):
+            yield from serialize('python', chunk)
+
+
+# Section name, export function and BulkImporter method, in dependency order
+SECTIONS = [
+    ('nutrients', export_nutrients, 'import_nutrients'),
+    ('glossary_categories', export_glossary_categories, 'import_glossary_categories'),
+    ('categories', export_categories, 'import_categories'),
+    ('glossary', export_glossary, 'import_glossary'),
+    ('glossary_nutrients', export_glossary_nutrients, 'import_glossary_nutrients'),
+    ('recipes', export_recipes, 'import_recipes'),
+    ('recipe_links', export_recipe_links, 'import_recipe_links'),
+    ('reviews', export_reviews, 'import_reviews'),
+    ('videos', export_videos, 'import_objects'),
+]
+
+
+def export_catalog(path, chunk_size=1000, sections=None):
+    """
+    Stream the catalog to a gzip-compressed JSON Lines file.
+
+    Each section starts with a '#section <name>' line and ends with an
+    '#end <name> <count> <sha256>' line, where the checksum covers the
+    section's record lines. Rows are read with iterator(), so memory use
+    does not grow with the catalog. The file is written next to path and
+    moved into place once complete.
+
+    Args:
+        path (str): Output file, usually ending in .jsonl.gz
+        chunk_size (int): Rows fetched per database round trip
+        sections (list, optional): Section names to export, all by default
+
+    Returns:
+        dict: Number of records written per section
+    """
+    header = {
+        'format': CATALOG_FORMAT,
+        'version': CATALOG_VERSION,
+        'id': uuid.uuid4().hex,
+        'created_at': timezone.now().isoformat(),
+    }
+    counts = {}
+    temp_path = f'{path}.tmp'
+
+    # One transaction, so every section sees the same snapshot
+    with transaction.atomic(), gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        f.write(f'#catalog {json.dumps(header)}\n')
+        for name, export, _ in SECTIONS:
+            if sections and name not in sections:
+                continue
+            count = 0
+            digest = hashlib.sha256()
+            f.write(f'#section {name}\n')
+            for record in export(chunk_size):
+                line = json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':')) + '\n'
+                digest.update(line.encode('utf-8'))
+                f.write(line)
+                count += 1
+            f.write(f'#end {name} {count} {digest.hexdigest()}\n')
+            counts[name] = count
+
+    os.replace(temp_path, path)
+    return counts
+
+
+class CatalogSection:
+    """
+    Records of one catalog section, read lazily and checked against the section's end line.
+    """
+
+    def __init__(self, name, lines):
+        self.name = name
+        self._lines = lines
+        self._skip = 0
+        self.finished = False
+
+    def skip(self, count):
+        """
+        Skip the first records, e.g. those committed by an interrupted import.
+        """
+        self._skip = count
+
+    def __iter__(self):
+        if self.finished:
+            return
+        digest = hashlib.sha256()
+        count = 0
+        for line in self._lines:
+            if line.startswith('#end '):
+                self._check_end(line, count, digest)
+                return
+            if line.startswith('#'):
+                raise CatalogError(f'Section {self.name} has no end line')
+            digest.update(line.encode('utf-8'))
+            count += 1
+            if count > self._skip:
+                yield json.loads(line)
+        raise CatalogError(f'Catalog ends inside section {self.name}')
+
+    def _check_end(self, line, count, digest):
+        self.finished = True
+        try:
+            _, name, expected_count, expected_digest = line.split()
+        except ValueError:
+            raise CatalogError(f'Malformed end line for section {self.name}')
+        if name != self.name or int(expected_count) != count or expected_digest != digest.hexdigest():
+            raise CatalogError(f'Checksum mismatch in section {self.name}')
+
+    def drain(self):
+        """
+        Read and verify the rest of the section.
+        """
+        for _ in self:
+            pass
+
+
+def _read_lines(path):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            yield from f
+    except (OSError, EOFError) as e:
+        raise CatalogError(f'Could not read {path}: {e}')
+
+
+def read_catalog(path):
+    """
+    Read a catalog file written by export_catalog.
+
+    Returns:
+        tuple: The header dict and an iterator of CatalogSection objects
+    """
+    lines = _read_lines(path)
+    first = next(lines, '')
+    try:
+        header = json.loads(first[len('#catalog '):]) if first.startswith('#catalog ') else None
+    except ValueError:
+        header = None
+    if not header or header.get('format') != CATALOG_FORMAT:
+        raise CatalogError(f'{path} is not a recipe catalog')
+    if header.get('version') != CATALOG_VERSION:
+        raise CatalogError(f'Unsupported catalog version {header.get("version")}')
+
+    def sections():
+        for line in lines:
+            if line.startswith('#section '):
+                section = CatalogSection(line.split()[1], lines)
+                yield section
+                section.drain()
+            elif line.strip():
+                raise CatalogError(f'Unexpected line outside a section: {line[:80]!r}')
+
+    return header, sections()
+
+
+def verify_catalog(path):
+    """
+    Check every section checksum of a catalog file.
+
+    Returns:
+        dict: Number of records per section
+    """
+    _, sections = read_catalog(path)
+    counts = {}
+    for section in sections:
+        count = 0
+        for _ in section:
+            count += 1
+        counts[section.name] = count
+    return counts
+
+
+class ImportProgress:
+    """
+    Remembers how far an import got, so an interrupted import can resume.
+
+    Stored as JSON next to the catalog file and rewritten after every
+    committed chunk.
+    """
+
+    def __init__(self, path, catalog_id):
+        self.path = path
+        self.catalog_id = catalog_id
+        self.done = []
+        self.section = None
+        self.records = 0
+
+    @classmethod
+    def load(cls, path, catalog_id):
+        progress = cls(path, catalog_id)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('catalog') != catalog_id:
+            return None
+        progress.done = data.get('done', [])
+        progress.section = data.get('section')
+        progress.records = data.get('records', 0)
+        return progress
+
+    def save(self):
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'catalog': self.catalog_id,
+                'done': self.done,
+                'section': self.section,
+                'records': self.records,
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def committed(self, count):
+        self.records += count
+        self.save()
+
+    def start(self, section):
+        if self.section != section:
+            self.section = section
+            self.records = 0
+
+    def finish(self, section):
+        self.done.append(section)
+        self.section = None
+        self.records = 0
+        self.save()
+
+    def delete(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def import_catalog(path, chunk_size=1000, batch_size=500, resume=False, verify=True, log=None):
+    """
+    Load a catalog file written by export_catalog.
+
+    A fresh import clears the existing catalog first. With resume, an import
+    interrupted earlier continues after its last committed chunk.
+
+    Args:
+        path (str): Catalog file
+        chunk_size (int): Records saved per transaction
+        batch_size (int): Rows per INSERT statement
+        resume (bool): Continue from the progress file of an earlier run
+        verify (bool): Check every section checksum before writing anything
+        log (callable, optional): Called with a message after each section
+
+    Returns:
+        BulkImporter: The importer, with its stats and errors
+    """
+    log = log or (lambda message: None)
+    if verify:
+        verify_catalog(path)
+
+    header, sections = read_catalog(path)
+    progress_path = f'{path}.progress'
+    progress = ImportProgress.load(progress_path, header['id']) if resume else None
+    if progress is None:
+        clear_catalog()
+        progress = ImportProgress(progress_path, header['id'])
+    elif progress.section:
+        log(f'Resuming {progress.section} after {progress.records} records')
+
+    importer = BulkImporter(chunk_size=chunk_size, batch_size=batch_size, on_chunk=progress.committed)
+    methods = {name: method for name, _, method in SECTIONS}
+
+    for section in sections:
+        if section.name not in methods:
+            raise CatalogError(f'Unknown section {section.name}')
+        if section.name in progress.done:
+            continue
+        progress.start(section.name)
+        section.skip(progress.records)
+        getattr(importer, methods[section.name])(section)
+        progress.finish(section.name)
+        log(f'Imported {section.name}')
+
+    # Earlier chunks may come from an interrupted run, so rebuild for the whole catalog
+    importer.finish(rebuild_all=True)
+    progress.delete()
+    return importer
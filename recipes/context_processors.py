@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from .trees import get_category_tree
+
+
+def category_menu(request):
+    """
+    Adds the cached category tree for navigation menus.
+
+    The snapshot is only loaded when a template uses it. Menus iterate
+    category_tree in tree order (each node has its level) or start from
+    category_tree.roots and category_tree.children, without querying per node.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        dict: Template context with 'category_tree'
+    """
+    return {'category_tree': SimpleLazyObject(get_category_tree)}
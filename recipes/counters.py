@@ -0,0 +1,182 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Coalesce
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_counter_settings():
+    """
+    Returns the RECIPES_VIEW_COUNTER settings merged with their defaults.
+    """
+    options = {
+        'FLUSH_SIZE': 100,
+        'FLUSH_INTERVAL': 10,
+        'BACKGROUND': True,
+    }
+    options.update(getattr(settings, 'RECIPES_VIEW_COUNTER', {}))
+    return options
+
+
+class ViewCountBuffer:
+    """
+    Collects recipe view counts in memory and writes them in batches.
+
+    Each flush takes the pending counts under a lock and writes them with a
+    single UPDATE ... CASE statement, so a count is only ever written once.
+    Counts are put back if the write fails.
+    """
+
+    def __init__(self, flush_size=100, flush_interval=10, background=True):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.background = background
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, slug, count=1):
+        with self._lock:
+            self._counts[slug] += count
+            pending = sum(self._counts.values())
+        if self.background:
+            self._ensure_thread()
+            if pending >= self.flush_size:
+                self._wake.set()
+        elif pending >= self.flush_size:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def _take(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def _restore(self, counts):
+        with self._lock:
+            self._counts.update(counts)
+
+    def flush(self):
+        """
+        Write all pending counts to Recipe.views_count.
+
+        Returns:
+            int: Number of recipes updated
+        """
+        from .models import Recipe
+
+        with self._flush_lock:
+            counts = self._take()
+            if not counts:
+                return 0
+            increment = Case(
+                *[When(slug=slug, then=Value(count)) for slug, count in counts.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            try:
+                return Recipe.objects.filter(slug__in=list(counts)).update(
+                    views_count=Coalesce(F('views_count'), 0) + increment
+                )
+            except DatabaseError:
+                logger.exception('Could not flush %d recipe view counts, keeping them for the next flush', len(counts))
+                self._restore(counts)
+                return 0
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='recipe-view-counter', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        from django.db import connection
+
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+    def stop(self):
+        """
+        Stop the background thread and write whatever is still pending.
+        """
+        self._stop.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(self.flush_interval)
+        self.flush()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_view_counter():
+    """
+    Returns the process-wide ViewCountBuffer configured by RECIPES_VIEW_COUNTER.
+    """
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                options = get_counter_settings()
+                _buffer = ViewCountBuffer(
+                    flush_size=options['FLUSH_SIZE'],
+                    flush_interval=options['FLUSH_INTERVAL'],
+                    background=options['BACKGROUND'],
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def count_recipe_view(view_func):
+    """
+    Count successful GET requests of a recipe page in the view count buffer.
+
+    Applied outside the page cache so cached hits are counted too.
+    """
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view_func(request, *args, **kwargs)
+            if request.method == 'GET' and response.status_code == 200:
+                counter = get_view_counter()
+                if counter.background:
+                    counter.add(kwargs['slug'])
+                else:
+                    # Adding may flush to the database
+                    await sync_to_async(counter.add)(kwargs['slug'])
+            return response
+        return async_wrapper
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if request.method == 'GET' and response.status_code == 200:
+            get_view_counter().add(kwargs['slug'])
+        return response
+    return wrapper
@@ -1 +1,269 @@
+from django import forms
+from django.db.models import F
+from django.utils.text import slugify
+from .models import Recipe, Category, Glossary, Nutrient, RecipeNutrition, RecipeReview, ReviewReply
+from .trees import recipes_in_subtree
+from crispy_forms.helper import FormHelper
+from crispy_forms.layout import Layout, Submit, Row, Column
 
+class CategoryForm(forms.ModelForm):
+    class Meta:
+        model = Category
+        fields = ['name', 'slug', 'parent']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.add_input(Submit('submit', 'Save Category'))
+
+class GlossaryForm(forms.ModelForm):
+    class Meta:
+        model = Glossary
+        fields = ['name', 'singular_name', 'plural_name', 'slug', 'description', 'parent']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.add_input(Submit('submit', 'Save Term'))
+
+class RecipeForm(forms.ModelForm):
+    class Meta:
+        model = Recipe
+        fields = [
+            'recipe_name',
+            'title',
+            'slug',
+            'description',
+            'ingredients_text',
+            'instructions',
+            'categories',
+            'preparation_time',
+            'cooking_time',
+            'servings',
+            'difficulty',
+            'image',
+            'related_terms'
+        ]
+        widgets = {
+            'description': forms.Textarea(attrs={'rows': 3}),
+            'ingredients_text': forms.Textarea(attrs={
+                'rows': 8,
+                'placeholder': 'Enter ingredients with quantities. Use [brackets] around terms to link to glossary.\nExample:\n2 cups [flour]\n1 teaspoon [baking powder]\n3 [eggs]'
+            }),
+            'instructions': forms.Textarea(attrs={'rows': 10}),
+            'categories': forms.SelectMultiple(attrs={'class': 'form-select'}),
+            'related_terms': forms.CheckboxSelectMultiple(),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.layout = Layout(
+            Row(
+                Column('title', css_class='col-md-8'),
+                Column('slug', css_class='col-md-4'),
+            ),
+            Row(
+                Column('description', css_class='col-12'),
+            ),
+            Row(
+                Column('ingredients_text', css_class='col-12'),
+            ),
+            Row(
+                Column('instructions', css_class='col-12'),
+            ),
+            Row(
+                Column('preparation_time', css_class='col-md-3'),
+                Column('cooking_time', css_class='col-md-3'),
+                Column('servings', css_class='col-md-3'),
+                Column('difficulty', css_class='col-md-3'),
+            ),
+            Row(
+                Column('image', css_class='col-md-6'),
+                Column('categories', css_class='col-md-6'),
+            ),
+            'related_terms',
+            Submit('submit', 'Save Recipe')
+        )
+
+
+
+
+
+class RecipeReviewForm(forms.ModelForm):
+    """
+    Form for creating recipe reviews, supporting both authenticated 
+    and non-authenticated users.
+    """
+    name = forms.CharField(
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={
+            'placeholder': 'Your Name',
+            'class': 'form-control'
+        })
+    )
+    email = forms.EmailField(
+        required=False,
+        widget=forms.EmailInput(attrs={
+            'placeholder': 'Your Email',
+            'class': 'form-control'
+        })
+    )
+
+    class Meta:
+        model = RecipeReview
+        fields = ['rating', 'review_text']
+        widgets = {
+            'rating': forms.Select(attrs={
+                'class': 'form-control'
+            }),
+            'review_text': forms.Textarea(attrs={
+                'rows': 4,
+                'placeholder': 'Write your review here...',
+                'class': 'form-control'
+            })
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.add_input(Submit('submit', 'Submit Review', css_class='btn-primary'))
+
+    def clean(self):
+        """
+        Validate form data, ensuring name and email are provided for guest reviews.
+        """
+        cleaned_data = super().clean()
+
+        # If user is not authenticated, require name and email
+        name = cleaned_data.get('name')
+        email = cleaned_data.get('email')
+
+        if 'name' in self.fields and 'email' in self.fields:
+            if (name and not email) or (email and not name):
+                raise forms.ValidationError("Both name and email are required for guest reviews.")
+
+        return cleaned_data
+
+class ReviewReplyForm(forms.ModelForm):
+    class Meta:
+        model = ReviewReply
+        fields = ['reply_text']
+        widgets = {
+            'reply_text': forms.Textarea(attrs={
+                'rows': 3,
+                'placeholder': 'Write your reply here...'
+            })
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'post'
+        self.helper.add_input(Submit('submit', 'Post Reply', css_class='btn-secondary'))
+
+
+class RecipeFilterForm(forms.Form):
+    """
+    Filter and sort recipes by nutrients per serving, difficulty, total time and category.
+
+    Every nutrient gets min_<key> and max_<key> fields, where the key is the
+    nutrient name in snake case (e.g. max_calories, min_vitamin_c), and can
+    be used as a sort key, prefixed with '-' for highest first.
+    """
+    SORT_CHOICES = [
+        ('newest', 'Newest'),
+        ('total_time', 'Quickest'),
+        ('-total_time', 'Longest'),
+    ]
+
+    difficulty = forms.MultipleChoiceField(choices=Recipe.DIFFICULTY_CHOICES, required=False)
+    min_time = forms.IntegerField(min_value=0, required=False, help_text="Minimum total time in minutes")
+    max_time = forms.IntegerField(min_value=0, required=False, help_text="Maximum total time in minutes")
+    category = forms.ModelChoiceField(queryset=Category.objects.all(), to_field_name='slug', required=False,
+                                      help_text="Recipes in this category or any of its subcategories")
+    sort = forms.ChoiceField(required=False)
+
+    def __init__(self, *args, nutrients=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if nutrients is None:
+            nutrients = Nutrient.objects.all()
+        self.nutrients = {self.nutrient_key(nutrient): nutrient for nutrient in nutrients}
+
+        sort_choices = list(self.SORT_CHOICES)
+        for key, nutrient in self.nutrients.items():
+            label = f'{nutrient.name} per serving ({nutrient.unit})'
+            self.fields[f'min_{key}'] = forms.FloatField(required=False, label=f'Min {label}')
+            self.fields[f'max_{key}'] = forms.FloatField(required=False, label=f'Max {label}')
+            sort_choices += [(key, f'Lowest {nutrient.name}'), (f'-{key}', f'Highest {nutrient.name}')]
+        self.fields['sort'].choices = sort_choices
+
+        self.helper = FormHelper()
+        self.helper.form_method = 'get'
+        self.helper.add_input(Submit('submit', 'Filter', css_class='btn-primary'))
+
+    @staticmethod
+    def nutrient_key(nutrient):
+        return slugify(nutrient.name).replace('-', '_')
+
+    def nutrient_ranges(self):
+        """
+        Returns (nutrient, minimum, maximum) for every nutrient with a bound set.
+        """
+        ranges = []
+        for key, nutrient in self.nutrients.items():
+            minimum = self.cleaned_data.get(f'min_{key}')
+            maximum = self.cleaned_data.get(f'max_{key}')
+            if minimum is not None or maximum is not None:
+                ranges.append((nutrient, minimum, maximum))
+        return ranges
+
+    def sort_nutrient(self):
+        """
+        Returns (nutrient, descending) when sorting by a nutrient, otherwise (None, False).
+        """
+        sort = self.cleaned_data.get('sort') or 'newest'
+        nutrient = self.nutrients.get(sort.lstrip('-'))
+        return nutrient, sort.startswith('-')
+
+    def filter_queryset(self, queryset):
+        """
+        Apply the cleaned filters and ordering to a Recipe queryset.
+
+        Nutrient ranges become indexed lookups on RecipeNutrition (nutrient,
+        per_serving), total time uses the stored total_time column and the
+        category covers its whole MPTT subtree.
+        """
+        data = self.cleaned_data
+
+        if data.get('difficulty'):
+            queryset = queryset.filter(difficulty__in=data['difficulty'])
+        if data.get('min_time') is not None:
+            queryset = queryset.filter(total_time__gte=data['min_time'])
+        if data.get('max_time') is not None:
+            queryset = queryset.filter(total_time__lte=data['max_time'])
+        if data.get('category'):
+            queryset = recipes_in_subtree(data['category'], queryset)
+
+        for nutrient, minimum, maximum in self.nutrient_ranges():
+            rows = RecipeNutrition.objects.filter(nutrient=nutrient)
+            if minimum is not None:
+                rows = rows.filter(per_serving__gte=minimum)
+            if maximum is not None:
+                rows = rows.filter(per_serving__lte=maximum)
+            queryset = queryset.filter(id__in=rows.values('recipe_id'))
+
+        nutrient, descending = self.sort_nutrient()
+        sort = data.get('sort') or 'newest'
+        if nutrient is not None:
+            queryset = queryset.filter(nutrition__nutrient=nutrient).annotate(sort_value=F('nutrition__per_serving'))
+            order = F('sort_value').desc(nulls_last=True) if descending else F('sort_value').asc(nulls_last=True)
+            return queryset.order_by(order, '-id')
+        if sort == 'newest':
+            return queryset.order_by('-created_at', '-id')
+        return queryset.order_by(sort, '-id')
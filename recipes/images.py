@@ -0,0 +1,289 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from PIL import Image, ImageOps
+
+from .cache import get_cache, invalidate
+
+
+logger = logging.getLogger(__name__)
+
+# Pillow format names and file extensions of the derivative formats
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+_fields = {}
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_settings():
+    """
+    Returns the RECIPES_IMAGES settings merged with their defaults.
+    """
+    options = {
+        'WIDTHS': [320, 640, 1024, 1600],
+        'FORMATS': ['webp', 'jpeg'],
+        'QUALITY': {'webp': 80, 'jpeg': 82},
+        'DIRECTORY': 'derivatives',
+        'WORKERS': 2,
+        'BACKGROUND': True,
+    }
+    options.update(getattr(settings, 'RECIPES_IMAGES', {}))
+    return options
+
+
+def derivative_name(digest, width, image_format):
+    """
+    Storage name of a derivative. It only depends on the original's content,
+    so the file never changes once written and can be cached forever.
+    """
+    extension = FORMATS[image_format][1]
+    return f"{get_image_settings()['DIRECTORY']}/{digest[:2]}/{digest[:16]}-{width}w.{extension}"
+
+
+def target_widths(original_width, widths):
+    """
+    Returns the configured widths smaller than the original, plus the
+    original width when it is below the largest one. Images are never upscaled.
+    """
+    targets = {width for width in widths if width < original_width}
+    if original_width < max(widths):
+        targets.add(original_width)
+    return sorted(targets)
+
+
+def render_derivatives(source, storage=None):
+    """
+    Resize one image into every configured width and format.
+
+    Only touches storage, never the database, so it can run in worker
+    processes. Files already written for the same content are kept.
+
+    Args:
+        source (str): Storage name of the original image
+        storage (Storage, optional): Storage holding the images, default_storage by default
+
+    Returns:
+        list: Dicts describing each derivative, ready for store_derivatives()
+    """
+    storage = storage or default_storage
+    options = get_image_settings()
+    with storage.open(source, 'rb') as original:
+        content = original.read()
+    digest = hashlib.sha256(content).hexdigest()
+
+    with Image.open(io.BytesIO(content)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+        derivatives = []
+        for width in target_widths(image.width, options['WIDTHS']):
+            height = max(round(image.height * width / image.width), 1)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for image_format in options['FORMATS']:
+                name = derivative_name(digest, width, image_format)
+                if not storage.exists(name):
+                    pillow_format = FORMATS[image_format][0]
+                    output = resized.convert('RGB') if pillow_format == 'JPEG' else resized
+                    buffer = io.BytesIO()
+                    output.save(buffer, pillow_format, quality=options['QUALITY'].get(image_format, 80), optimize=True)
+                    storage.save(name, ContentFile(buffer.getvalue()))
+                derivatives.append({
+                    'digest': digest,
+                    'width': width,
+                    'height': height,
+                    'format': image_format,
+                    'name': name,
+                })
+    return derivatives
+
+
+def store_derivatives(source, derivatives):
+    """
+    Replace the recorded derivatives of an image.
+    """
+    from .models import ImageDerivative
+
+    with transaction.atomic():
+        ImageDerivative.objects.filter(source=source).delete()
+        ImageDerivative.objects.bulk_create([ImageDerivative(source=source, **row) for row in derivatives])
+    invalidate(f'image:{source}')
+
+
+def generate_derivatives(source, storage=None):
+    """
+    Render and record the derivatives of an image.
+
+    Returns:
+        list: The derivative dicts
+    """
+    derivatives = render_derivatives(source, storage)
+    store_derivatives(source, derivatives)
+    return derivatives
+
+
+def remove_derivatives(source, storage=None):
+    """
+    Forget the derivatives of an image, deleting files no other image shares.
+    """
+    from .models import ImageDerivative
+
+    storage = storage or default_storage
+    rows = ImageDerivative.objects.filter(source=source)
+    names = set(rows.values_list('name', flat=True))
+    rows.delete()
+    shared = set(ImageDerivative.objects.filter(name__in=names).values_list('name', flat=True))
+    for name in names - shared:
+        storage.delete(name)
+    invalidate(f'image:{source}')
+
+
+def get_derivatives(source):
+    """
+    Returns the derivative dicts of an image, from the cache tiers or one indexed query.
+    """
+    from .models import ImageDerivative
+
+    if not source:
+        return []
+
+    def load():
+        return list(
+            ImageDerivative.objects.filter(source=source).values('digest', 'width', 'height', 'format', 'name')
+        )
+
+    cache = get_cache()
+    return cache.get_or_set(cache.make_key('images', (f'image:{source}',)), load, None)
+
+
+def srcset(image, image_format='jpeg'):
+    """
+    Build a srcset attribute value for an image field in one format.
+
+    Args:
+        image (FieldFile): Image field value
+        image_format (str): 'webp' or 'jpeg'
+
+    Returns:
+        str: "url 320w, url 640w, ..." or '' when no derivatives exist yet
+    """
+    if not image:
+        return ''
+    return ', '.join(
+        f"{default_storage.url(row['name'])} {row['width']}w"
+        for row in get_derivatives(image.name)
+        if row['format'] == image_format
+    )
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=get_image_settings()['WORKERS'], thread_name_prefix='recipe-images',
+                )
+    return _pool
+
+
+def _run(source):
+    from django.db import connection
+
+    try:
+        generate_derivatives(source)
+    except Exception:
+        logger.exception('Could not create image derivatives of %s', source)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(source):
+    """
+    Create the derivatives of an image once the current transaction commits.
+
+    They are made by the worker pool unless RECIPES_IMAGES['BACKGROUND'] is False.
+    """
+    if get_image_settings()['BACKGROUND']:
+        transaction.on_commit(lambda: _get_pool().submit(_run, source))
+    else:
+        transaction.on_commit(lambda: generate_derivatives(source))
+
+
+def _snapshot_image(sender, instance, **kwargs):
+    instance._image_snapshot = {}
+    if instance.pk:
+        names = _fields[sender]
+        instance._image_snapshot = sender._default_manager.filter(pk=instance.pk).values(*names).first() or {}
+
+
+def _refresh_image(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_image_snapshot', {})
+    for name in _fields[sender]:
+        source = getattr(instance, name).name or ''
+        if source == (old.get(name) or ''):
+            continue
+        if old.get(name):
+            transaction.on_commit(lambda previous=old[name]: remove_derivatives(previous))
+        if source:
+            schedule_derivatives(source)
+
+
+def _remove_images(sender, instance, **kwargs):
+    for name in _fields[sender]:
+        source = getattr(instance, name).name
+        if source:
+            transaction.on_commit(lambda previous=source: remove_derivatives(previous))
+
+
+def register(model, *field_names):
+    """
+    Create derivatives whenever one of the image fields of a model changes.
+
+    Args:
+        model (Model): Model class with the image fields
+        *field_names (str): Names of its ImageField/FileField fields
+    """
+    _fields[model] = list(field_names)
+    uid = model._meta.label_lower
+    pre_save.connect(_snapshot_image, sender=model, dispatch_uid=f'images_snapshot_{uid}')
+    post_save.connect(_refresh_image, sender=model, dispatch_uid=f'images_refresh_{uid}')
+    post_delete.connect(_remove_images, sender=model, dispatch_uid=f'images_remove_{uid}')
+
+
+def get_registered_fields():
+    return {model: list(names) for model, names in _fields.items()}
+
+
+def register_default_images():
+    """
+    Register Recipe.image and, when the videos app is installed, video thumbnails and photos.
+    """
+    from .models import Recipe
+
+    register(Recipe, 'image')
+
+    if apps.is_installed('videos'):
+        try:
+            video_model = apps.get_model('videos', 'YTVideo')
+        except LookupError:
+            return
+        field_names = {field.name for field in video_model._meta.get_fields()}
+        names = [name for name in ('thumbnail', 'photo') if name in field_names]
+        if names:
+            register(video_model, *names)
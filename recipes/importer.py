@@ -0,0 +1,680 @@
+import json
+from collections import Counter
+from itertools import islice
+
+from django.core.serializers import deserialize
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from .cache import invalidate
+from .matcher import invalidate_term_matcher
+from .models import (
+    Category, Glossary, GlossaryCategory, GlossaryNutrient, Nutrient, Recipe, RecipeIngredient, RecipeIngredientTerm,
+    RecipeNutrition, RecipeRecommendation, RecipeReview, ReviewReply,
+)
+from .ingredients import parse_ingredients_text, resolve_ingredients
+from .nutrition import rebuild_catalog_nutrition
+from .resolver import invalidate_ingredient_resolver
+from .search import document_for_model, get_backend
+
+
+# Recipe fields read from import records, with the value used when a record leaves one out
+RECIPE_FIELDS = {
+    'recipe_name': None,
+    'title': None,
+    'description': '',
+    'ingredients_text': '',
+    'instructions': '',
+    'preparation_time': 0,
+    'cooking_time': 0,
+    'servings': 0,
+    'difficulty': 'medium',
+    'code': None,
+    'status': 0,
+    'views_count': 0,
+    'image': None,
+}
+
+REVIEW_FIELDS = {
+    'name': None,
+    'email': None,
+    'rating': 5,
+    'review_text': None,
+    'ip': '',
+    'is_approved': False,
+}
+
+# Kept from import records when present, instead of the time of the import
+TIMESTAMP_FIELDS = ['created_at', 'updated_at']
+
+
+def iter_records(path, read_size=65536):
+    """
+    Stream records from a JSON array or a JSON Lines file without loading it whole.
+
+    Args:
+        path (str): File path; '.jsonl' files are read line by line
+        read_size (int): Number of characters read at a time from JSON arrays
+
+    Yields:
+        dict: One record at a time
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+
+        decoder = json.JSONDecoder()
+        buffer = ''
+        started = False
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if not started:
+                if not buffer and not eof:
+                    chunk = f.read(read_size)
+                    eof = not chunk
+                    buffer += chunk
+                    continue
+                if not buffer.startswith('['):
+                    raise ValueError(f'{path} must contain a JSON array')
+                buffer = buffer[1:]
+                started = True
+                continue
+            buffer = buffer.lstrip(', \t\r\n')
+            if buffer.startswith(']'):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            buffer = buffer[end:]
+            yield record
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of up to size items from an iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def delete_all(*models):
+    """
+    Delete every row of the given models without loading them or sending signals.
+
+    Models must be listed with dependent tables first. Derived data, caches
+    and the search index are not updated.
+    """
+    with transaction.atomic():
+        for model in models:
+            queryset = model._base_manager.all()
+            queryset._raw_delete(queryset.db)
+
+
+def insert_rows(model, fields, rows, batch_size=500):
+    """
+    Insert plain value tuples with executemany, skipping model instances.
+
+    Meant for narrow tables such as M2M through tables where building a
+    model instance per row costs more than the insert itself.
+
+    Args:
+        model (Model): Model whose table receives the rows
+        fields (list): Field names matching the order of each tuple
+        rows (list): Value tuples, already in database form
+        batch_size (int): Rows sent per executemany call
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+
+
+class BulkImporter:
+    """
+    Imports categories, glossary terms, nutrients, recipes and reviews in bulk.
+
+    Lookup maps are loaded once, rows and M2M through rows are written
+    with bulk_create, and each chunk of records is saved in its own
+    transaction. Rows skip the model signals, so tree fields, ingredient
+    terms, nutrition, the search index and page caches are brought up to
+    date once in finish() instead of once per row.
+
+    Records matching an existing row are left alone, like get_or_create
+    would: by slug when the record has one, by name otherwise. References
+    to categories, glossary terms and parents may be given as a slug or a name.
+
+    Args:
+        chunk_size (int): Number of records saved per transaction
+        batch_size (int): Number of rows per INSERT statement
+        on_chunk (callable, optional): Called with the number of records in
+            each chunk once its transaction has committed
+    """
+
+    def __init__(self, chunk_size=1000, batch_size=500, on_chunk=None):
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.on_chunk = on_chunk
+        self.stats = Counter()
+        self.errors = []
+        self._trees = set()
+        self._recipe_ids = []
+        self._review_recipe_ids = set()
+        self._nutrition_glossary_ids = set()
+        self._changed_terms = set()
+
+    def _error(self, message):
+        self.errors.append(message)
+
+    def _chunks(self, records):
+        for chunk in chunked(records, self.chunk_size):
+            yield chunk
+            # The caller's transaction for this chunk has committed by now
+            if self.on_chunk is not None:
+                self.on_chunk(len(chunk))
+
+    @staticmethod
+    def _unique_slug(value, slugs, max_length):
+        base = slugify(value)[:max_length] or 'item'
+        slug, suffix = base, 2
+        while slug in slugs:
+            tail = f'-{suffix}'
+            slug = f'{base[:max_length - len(tail)]}{tail}'
+            suffix += 1
+        return slug
+
+    @staticmethod
+    def _keys(model, name_field='name'):
+        """
+        Returns (by_slug, by_name) id maps; the oldest row wins for duplicate names.
+        """
+        by_slug, by_name = {}, {}
+        for pk, slug, name in model.objects.order_by('-id').values_list('id', 'slug', name_field):
+            by_slug[slug] = pk
+            by_name[name] = pk
+        return by_slug, by_name
+
+    @staticmethod
+    def _resolve(keys, reference):
+        by_slug, by_name = keys
+        pk = by_slug.get(reference)
+        return pk if pk is not None else by_name.get(reference)
+
+    @staticmethod
+    def _apply_timestamps(model, objects, records):
+        """
+        Restore created_at/updated_at from records, which bulk_create overwrites.
+        """
+        changed = []
+        for obj, record in zip(objects, records):
+            values = {field: parse_datetime(record[field]) for field in TIMESTAMP_FIELDS if record.get(field)}
+            if values:
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                changed.append(obj)
+        if changed:
+            model.objects.bulk_update(changed, TIMESTAMP_FIELDS, batch_size=100)
+
+    def _import_tree(self, model, records, build, stat):
+        """
+        Import nodes of an MPTT model, linking parents once every node exists.
+
+        Args:
+            model (Model): Category or Glossary
+            records (iterable): Records with a name and optional slug and parent
+            build (callable): Returns an unsaved instance for a record, or None to skip it
+            stat (str): Key counted in self.stats
+        """
+        keys = by_slug, by_name = self._keys(model)
+        pending = []
+
+        for chunk in self._chunks(records):
+            objects, parents = [], []
+            for record in chunk:
+                slug = record.get('slug')
+                if (slug in by_slug) if slug else (record['name'] in by_name):
+                    self.stats[f'{stat}_existing'] += 1
+                    continue
+                obj = build(record)
+                if obj is None:
+                    continue
+                obj.slug = slug or self._unique_slug(record['name'], by_slug, 200)
+                # Tree fields are filled in by a single rebuild() in finish()
+                obj.tree_id = obj.lft = obj.rght = obj.level = 0
+                by_slug[obj.slug] = None
+                by_name.setdefault(obj.name, None)
+                objects.append(obj)
+                parents.append(record.get('parent'))
+
+            with transaction.atomic():
+                created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+                self._index(model, created)
+
+            for obj, parent in zip(created, parents):
+                by_slug[obj.slug] = obj.pk
+                if by_name.get(obj.name) is None:
+                    by_name[obj.name] = obj.pk
+                if parent:
+                    pending.append((obj, parent))
+            self._trees.add(model)
+            self.stats[stat] += len(created)
+
+        updates = []
+        for obj, parent in pending:
+            parent_id = self._resolve(keys, parent)
+            if parent_id is None:
+                self._error(f'Parent not found for {obj.name}: {parent}')
+            elif parent_id != obj.pk:
+                obj.parent_id = parent_id
+                updates.append(obj)
+        for chunk in chunked(updates, self.chunk_size):
+            with transaction.atomic():
+                model.objects.bulk_update(chunk, ['parent'], batch_size=self.batch_size)
+
+    def import_categories(self, records):
+        """
+        Import recipe categories from records with a name, an optional slug and an optional parent.
+        """
+        self._import_tree(Category, records, lambda record: Category(name=record['name']), 'categories')
+
+    def import_glossary_categories(self, records):
+        """
+        Import glossary categories from records with a category_name, slug and description.
+        """
+        existing = set(GlossaryCategory.objects.values_list('category_name', flat=True))
+        slugs = set(GlossaryCategory.objects.exclude(slug=None).values_list('slug', flat=True))
+        for chunk in self._chunks(records):
+            objects = []
+            for record in chunk:
+                name = record['category_name']
+                if name in existing:
+                    self.stats['glossary_categories_existing'] += 1
+                    continue
+                slug = record.get('slug') or self._unique_slug(name, slugs, 350)
+                existing.add(name)
+                slugs.add(slug)
+                objects.append(GlossaryCategory(category_name=name, slug=slug, description=record.get('description')))
+            with transaction.atomic():
+                created = GlossaryCategory.objects.bulk_create(objects, batch_size=self.batch_size)
+            self.stats['glossary_categories'] += len(created)
+
+    def import_glossary(self, records):
+        """
+        Import glossary terms.
+
+        Records have a name and may have singular_name, plural_name,
+        description, slug, category (a GlossaryCategory name) and parent.
+        """
+        categories = dict(GlossaryCategory.objects.values_list('category_name', 'id'))
+
+        def build(record):
+            name = record['name']
+            category_id = None
+            if record.get('category'):
+                category_id = categories.get(record['category'])
+                if category_id is None:
+                    self._error(f'Category not found: {record["category"]}')
+                    return None
+            term = Glossary(
+                name=name,
+                singular_name=record.get('singular_name') or name,
+                plural_name=record.get('plural_name') or name + 's',
+                description=record.get('description') or '',
+                category_id=category_id,
+            )
+            self._changed_terms |= term.get_term_forms()
+            return term
+
+        self._import_tree(Glossary, records, build, 'glossary')
+
+    def import_nutrients(self, records):
+        """
+        Create nutrients that do not exist yet.
+
+        Returns:
+            dict: Every nutrient keyed by lowercase name
+        """
+        existing = {name.lower() for name in Nutrient.objects.values_list('name', flat=True)}
+        objects = [Nutrient(**record) for record in records if record['name'].lower() not in existing]
+        with transaction.atomic():
+            Nutrient.objects.bulk_create(objects, batch_size=self.batch_size, ignore_conflicts=True)
+        self.stats['nutrients'] += len(objects)
+        return {nutrient.name.lower(): nutrient for nutrient in Nutrient.objects.all()}
+
+    def import_glossary_nutrients(self, records):
+        """
+        Replace the nutrient values of glossary terms.
+
+        Records have a term name (or slug) and a nutrition dict of values per
+        100g keyed by nutrient name; names are matched case-insensitively.
+        """
+        by_slug, by_name = {}, {}
+        for pk, slug, name in Glossary.objects.order_by('-id').values_list('id', 'slug', 'name'):
+            by_slug[slug] = pk
+            by_name[name.lower()] = pk
+        nutrients = {name.lower(): pk for name, pk in Nutrient.objects.values_list('name', 'id')}
+
+        for chunk in self._chunks(records):
+            glossary_ids, rows = [], []
+            for record in chunk:
+                glossary_id = by_slug.get(record.get('slug')) or by_name.get(record['name'].lower())
+                if glossary_id is None:
+                    self._error(f'Glossary term {record["name"]} not found')
+                    continue
+                glossary_ids.append(glossary_id)
+                self._nutrition_glossary_ids.add(glossary_id)
+                for nutrient_name, value in record['nutrition'].items():
+                    nutrient_id = nutrients.get(nutrient_name.lower())
+                    if nutrient_id:
+                        rows.append((glossary_id, nutrient_id, value))
+            with transaction.atomic():
+                existing = GlossaryNutrient.objects.filter(glossary_id__in=glossary_ids)
+                existing._raw_delete(existing.db)
+                insert_rows(GlossaryNutrient, ['glossary', 'nutrient', 'value'], rows, self.batch_size)
+            self.stats['glossary_nutrition'] += len(glossary_ids)
+
+    def import_recipes(self, records):
+        """
+        Import recipes with their categories and related terms.
+
+        Records hold Recipe field values plus categories and related_terms,
+        given as slugs or names. Without a slug, one is made from the title.
+        """
+        categories = self._keys(Category)
+        terms = self._keys(Glossary)
+        slugs = set(Recipe.objects.exclude(slug=None).values_list('slug', flat=True))
+        Categories = Recipe.categories.through
+        RelatedTerms = Recipe.related_terms.through
+
+        for chunk in self._chunks(records):
+            objects, kept = [], []
+            for record in chunk:
+                slug = record.get('slug') or slugify(record.get('title') or record.get('recipe_name') or '')[:450]
+                if slug in slugs:
+                    self.stats['recipes_existing'] += 1
+                    continue
+                slugs.add(slug)
+                recipe = Recipe(slug=slug, **{
+                    field: record.get(field, default) for field, default in RECIPE_FIELDS.items()
+                })
+                recipe.total_time = recipe.calculate_total_time()
+                objects.append(recipe)
+                kept.append(record)
+
+            with transaction.atomic():
+                created = Recipe.objects.bulk_create(objects, batch_size=self.batch_size)
+                if created and created[0].pk is None:
+                    # Backends that cannot return ids from a bulk insert
+                    ids = dict(Recipe.objects.filter(slug__in=[obj.slug for obj in created]).values_list('slug', 'id'))
+                    for obj in created:
+                        obj.pk = ids[obj.slug]
+                self._apply_timestamps(Recipe, created, kept)
+
+                category_rows, term_rows, ingredient_rows, line_rows = [], [], [], []
+                for recipe, record in zip(created, kept):
+                    category_ids = {self._resolve(categories, name) for name in record.get('categories', [])}
+                    term_ids = {self._resolve(terms, name) for name in record.get('related_terms', [])}
+                    category_rows += [(recipe.pk, pk) for pk in category_ids if pk is not None]
+                    term_rows += [(recipe.pk, pk) for pk in term_ids if pk is not None]
+                    # Lines are resolved to glossary terms in finish(), once every term exists
+                    parsed = parse_ingredients_text(recipe.ingredients_text)
+                    ingredient_rows += [(recipe.pk, term) for term in {term for line in parsed for term in line.terms}]
+                    line_rows += [
+                        (recipe.pk, line.section, line.position, line.raw, line.quantity, line.unit, line.text, line.term)
+                        for line in parsed
+                    ]
+                insert_rows(Categories, ['recipe', 'category'], category_rows, self.batch_size)
+                insert_rows(RelatedTerms, ['recipe', 'glossary'], term_rows, self.batch_size)
+                insert_rows(RecipeIngredientTerm, ['recipe', 'term'], ingredient_rows, self.batch_size)
+                insert_rows(RecipeIngredient, [
+                    'recipe', 'section', 'position', 'raw', 'quantity', 'unit', 'text', 'term',
+                ], line_rows, self.batch_size)
+                self._index(Recipe, created)
+
+            self._recipe_ids += [recipe.pk for recipe in created]
+            self.stats['recipes'] += len(created)
+
+    def import_recipe_links(self, records):
+        """
+        Import related recipes from records with a slug and a list of related_recipes slugs.
+
+        Run after import_recipes so every linked recipe exists.
+        """
+        Links = Recipe.related_recipes.through
+        for chunk in self._chunks(records):
+            slugs = {record['slug'] for record in chunk}
+            slugs.update(slug for record in chunk for slug in record.get('related_recipes', []))
+            ids = dict(Recipe.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+            from_ids = [ids[record['slug']] for record in chunk if record['slug'] in ids]
+            existing = set(Links.objects.filter(from_recipe_id__in=from_ids).values_list('from_recipe_id', 'to_recipe_id'))
+
+            rows = []
+            for record in chunk:
+                from_id = ids.get(record['slug'])
+                if from_id is None:
+                    self._error(f'Recipe not found: {record["slug"]}')
+                    continue
+                for slug in record.get('related_recipes', []):
+                    to_id = ids.get(slug)
+                    if to_id is not None and (from_id, to_id) not in existing:
+                        existing.add((from_id, to_id))
+                        rows.append((from_id, to_id))
+            with transaction.atomic():
+                insert_rows(Links, ['from_recipe', 'to_recipe'], rows, self.batch_size)
+            self.stats['recipe_links'] += len(rows)
+
+    def import_reviews(self, records):
+        """
+        Import recipe reviews and their replies.
+
+        Records have the recipe slug, the reviewer's username (or None for
+        guests), the RecipeReview fields and a list of replies. Reviews that
+        already exist for the same recipe and user or email are skipped, and
+        replies whose user does not exist are dropped.
+        """
+        User = RecipeReview._meta.get_field('user').related_model
+        for chunk in self._chunks(records):
+            recipe_ids = dict(Recipe.objects.filter(slug__in={record['recipe'] for record in chunk}).values_list('slug', 'id'))
+            usernames = {record.get('user') for record in chunk}
+            usernames.update(reply.get('user') for record in chunk for reply in record.get('replies', []))
+            user_ids = dict(User.objects.filter(username__in=usernames - {None}).values_list('username', 'id'))
+            existing = set()
+            for recipe_id, user_id, email in RecipeReview.objects.filter(
+                    recipe_id__in=recipe_ids.values()).values_list('recipe_id', 'user_id', 'email'):
+                existing.update({('user', recipe_id, user_id), ('email', recipe_id, email)})
+
+            reviews, kept = [], []
+            for record in chunk:
+                recipe_id = recipe_ids.get(record['recipe'])
+                if recipe_id is None:
+                    self._error(f'Recipe not found for review: {record["recipe"]}')
+                    continue
+                user_id = user_ids.get(record.get('user'))
+                email = record.get('email')
+                if (user_id and ('user', recipe_id, user_id) in existing) or (email and ('email', recipe_id, email) in existing):
+                    self.stats['reviews_existing'] += 1
+                    continue
+                existing.update({('user', recipe_id, user_id), ('email', recipe_id, email)})
+                reviews.append(RecipeReview(
+                    recipe_id=recipe_id, user_id=user_id, **{field: record.get(field, default) for field, default in REVIEW_FIELDS.items()},
+                ))
+                kept.append(record)
+
+            with transaction.atomic():
+                created = RecipeReview.objects.bulk_create(reviews, batch_size=self.batch_size)
+                self._apply_timestamps(RecipeReview, created, kept)
+                replies, reply_records = [], []
+                for review, record in zip(created, kept):
+                    for reply in record.get('replies', []):
+                        user_id = user_ids.get(reply.get('user'))
+                        if user_id is None:
+                            continue
+                        replies.append(ReviewReply(
+                            review_id=review.pk, user_id=user_id,
+                            reply_text=reply.get('reply_text') or '', ip=reply.get('ip') or '',
+                            is_approved=reply.get('is_approved', False),
+                        ))
+                        reply_records.append(reply)
+                created_replies = ReviewReply.objects.bulk_create(replies, batch_size=self.batch_size)
+                self._apply_timestamps(ReviewReply, created_replies, reply_records)
+
+            self._review_recipe_ids.update(review.recipe_id for review in created)
+            self.stats['reviews'] += len(created)
+            self.stats['review_replies'] += len(created_replies)
+
+    def import_objects(self, records):
+        """
+        Import records in Django's serialization format, for models without a dedicated importer.
+
+        Objects keep their primary keys and are saved one by one, so this is
+        only meant for small tables such as videos.
+        """
+        for chunk in self._chunks(records):
+            with transaction.atomic():
+                for deserialized in deserialize('python', chunk):
+                    deserialized.save()
+            self.stats['objects'] += len(chunk)
+
+    def _index(self, model, instances):
+        backend = get_backend()
+        document = document_for_model(model)
+        if backend.indexed and document is not None and instances:
+            backend.bulk_index(document, instances)
+
+    def _resolve_ingredients(self, rebuild_all=False):
+        """
+        Point the ingredient lines of new recipes, and lines naming new terms, at their glossary terms.
+
+        Returns:
+            set: Ids of recipes whose lines now resolve differently
+        """
+        invalidate_ingredient_resolver()
+        if rebuild_all:
+            return resolve_ingredients(batch_size=self.batch_size, chunk_size=self.chunk_size)
+        changed = resolve_ingredients(recipe_ids=self._recipe_ids, batch_size=self.batch_size)
+        if self._changed_terms:
+            changed |= resolve_ingredients(terms=self._changed_terms, batch_size=self.batch_size)
+            # New terms may fuzzily match lines nothing matched before
+            changed |= resolve_ingredients(unresolved=True, batch_size=self.batch_size, chunk_size=self.chunk_size)
+        return changed
+
+    def _rebuild_nutrition(self, rebuild_all=False, recipe_ids=()):
+        if rebuild_all:
+            rebuild_catalog_nutrition(chunk_size=self.chunk_size)
+            return
+        recipe_ids = set(recipe_ids) | set(self._recipe_ids)
+        for glossary_ids in chunked(sorted(self._nutrition_glossary_ids), 500):
+            recipe_ids.update(
+                RecipeIngredient.objects.filter(glossary_id__in=glossary_ids).values_list('recipe_id', flat=True)
+            )
+        rebuild_catalog_nutrition(recipe_ids)
+
+    def finish(self, rebuild_all=False):
+        """
+        Rebuild everything the skipped signals would have kept up to date.
+
+        Args:
+            rebuild_all (bool): Rebuild trees, nutrition and review stats of the
+                whole catalog, e.g. when earlier chunks came from another run
+        """
+        from .recommender import rebuild_recommendations
+
+        trees = {Category, Glossary} if rebuild_all else self._trees
+        for model in trees:
+            with transaction.atomic():
+                model.objects.rebuild()
+
+        # Stored ingredient HTML that may link to new terms is re-rendered on next view
+        if rebuild_all:
+            Recipe.objects.exclude(ingredients_html='').update(ingredients_html='')
+        elif self._changed_terms:
+            Recipe.objects.filter(ingredient_terms__term__in=self._changed_terms).update(ingredients_html='')
+
+        self._rebuild_nutrition(rebuild_all, self._resolve_ingredients(rebuild_all))
+        if rebuild_all or self._recipe_ids:
+            rebuild_recommendations(self.chunk_size)
+        if rebuild_all or self._review_recipe_ids:
+            Recipe.recount_review_stats(None if rebuild_all else self._review_recipe_ids)
+
+        invalidate_term_matcher()
+        invalidate_ingredient_resolver()
+        invalidate('recipes', 'categories', 'category_counts', 'glossary')
+
+        self._trees.clear()
+        self._recipe_ids = []
+        self._review_recipe_ids.clear()
+        self._nutrition_glossary_ids.clear()
+        self._changed_terms.clear()
+
+
+def detach_other_apps(*models):
+    """
+    Remove the links that models of other apps, such as videos, hold to rows of the given models.
+
+    Nullable foreign keys are set to NULL and many-to-many links are deleted.
+    Rows of other apps that cannot exist without the linked row are not
+    touched; they make this fail before anything is changed.
+
+    Raises:
+        ValueError: When another app has rows that require the given models
+    """
+    nullable, through_models = [], []
+    for model in models:
+        for relation in model._meta.related_objects:
+            related_model = relation.related_model
+            if related_model._meta.app_label == model._meta.app_label:
+                continue
+            if relation.many_to_many:
+                through_models.append(relation.through)
+            elif relation.field.null:
+                nullable.append((related_model, relation.field.name))
+            elif related_model._base_manager.exists():
+                raise ValueError(
+                    f'{related_model._meta.label} rows require {model._meta.label} rows; delete them first'
+                )
+
+    with transaction.atomic():
+        for related_model, field_name in nullable:
+            related_model._base_manager.exclude(**{field_name: None}).update(**{field_name: None})
+        delete_all(*through_models)
+
+
+def clear_catalog():
+    """
+    Delete all recipes, categories and glossary terms with their dependent rows.
+
+    Links from other apps, such as a video's recipe and categories, are removed first.
+    """
+    with transaction.atomic():
+        detach_other_apps(Recipe, Category, Glossary)
+        delete_all(
+            RecipeNutrition, RecipeRecommendation, RecipeIngredient, RecipeIngredientTerm, ReviewReply, RecipeReview,
+            Recipe.categories.through, Recipe.related_terms.through, Recipe.related_recipes.through,
+            Recipe, Category, GlossaryNutrient, Glossary,
+        )
+    backend = get_backend()
+    for model in (Recipe, Glossary):
+        document = document_for_model(model)
+        if document is not None:
+            backend.clear(document)
+    invalidate_term_matcher()
+    invalidate_ingredient_resolver()
+    invalidate('recipes', 'categories', 'category_counts', 'glossary')
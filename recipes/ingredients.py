@@ -0,0 +1,245 @@
+"""
+The ingredient parser.
+
+A recipe's ingredients text is parsed once, when the recipe is saved, into
+RecipeIngredient rows: one per ingredient line, with its # section, its
+position, the leading quantity and unit, the text after the quantity and
+the glossary term it resolves to. Rendering, pluralization, nutrition and
+search read those rows instead of running their own regexes.
+"""
+import operator
+import re
+from collections import namedtuple
+from functools import reduce
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+SECTION_RE = re.compile(r'^#\s*(.+)$')
+QUANTITY_RE = re.compile(r'^(\d+(?:\.\d+)?)\s*')
+TERM_RE = re.compile(r'\[(.*?)\]')
+TOKEN_RE = re.compile(r'\[.*?\]|[^\[\]]+')
+
+UNITS = {
+    'g', 'gram', 'grams', 'kg', 'mg', 'ml', 'l', 'litre', 'litres', 'liter', 'liters', 'dl', 'cl',
+    'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds',
+    'tsp', 'teaspoon', 'teaspoons', 'tbsp', 'tablespoon', 'tablespoons', 'cup', 'cups',
+    'pinch', 'pinches', 'dash', 'clove', 'cloves', 'slice', 'slices', 'piece', 'pieces',
+    'can', 'cans', 'bunch', 'bunches', 'handful', 'sprig', 'sprigs', 'stick', 'sticks',
+}
+
+# Lookups of many terms are split so queries stay under SQLite's variable limit
+LOOKUP_CHUNK_SIZE = 300
+
+ParsedIngredient = namedtuple(
+    'ParsedIngredient', ['section', 'position', 'raw', 'quantity', 'unit', 'text', 'terms', 'term'],
+)
+
+
+def parse_ingredients_text(text):
+    """
+    Parse ingredients text into one ParsedIngredient per ingredient line.
+
+    Format:
+    # Section Name
+    2 cups [flour]
+    1 [egg]
+
+    Lines before the first heading have an empty section. The term of a
+    line is its first [bracketed] term, or its whole text when it has none,
+    lowercased, and is what the line resolves to a glossary term by.
+
+    Args:
+        text (str): Raw ingredients text of a recipe
+
+    Returns:
+        list: ParsedIngredient tuples in the order of the text
+    """
+    parsed = []
+    section = ''
+    for line in (text or '').split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        section_match = SECTION_RE.match(line)
+        if section_match:
+            section = section_match.group(1).strip()[:200]
+            continue
+
+        quantity_match = QUANTITY_RE.match(line)
+        if quantity_match:
+            quantity = float(quantity_match.group(1))
+            remainder = line[len(quantity_match.group(0)):].strip()
+        else:
+            quantity = None
+            remainder = line
+
+        words = remainder.split(None, 1)
+        unit = words[0].rstrip('.').lower() if words and words[0].rstrip('.').lower() in UNITS else ''
+        terms = [term.strip().lower()[:200] for term in TERM_RE.findall(line) if term.strip()]
+        term = terms[0] if terms else remainder.strip('[] ').lower()[:200]
+        parsed.append(ParsedIngredient(section, len(parsed), line, quantity, unit, remainder, terms, term))
+    return parsed
+
+
+def _chunks(values, size=LOOKUP_CHUNK_SIZE):
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def glossary_ids_for(terms):
+    """
+    Resolve lowercase terms to glossary term ids.
+
+    Like the term matcher, a term matches a glossary name first and a
+    singular or plural form otherwise. Terms without an exact match, such
+    as "large eggs", go to the fuzzy IngredientResolver when it is enabled.
+
+    Returns:
+        dict: Term mapped to a Glossary id, for the terms that match
+    """
+    from .models import Glossary
+    from .resolver import get_ingredient_resolver, get_resolver_settings
+
+    terms = {term for term in terms if term}
+    names, aliases = {}, {}
+    for chunk in _chunks(terms):
+        matches = (
+            Glossary.objects
+            .annotate(name_lower=Lower('name'), singular_lower=Lower('singular_name'), plural_lower=Lower('plural_name'))
+            .filter(Q(name_lower__in=chunk) | Q(singular_lower__in=chunk) | Q(plural_lower__in=chunk))
+            .order_by('id')
+            .values_list('id', 'name_lower', 'singular_lower', 'plural_lower')
+        )
+        for pk, name, singular, plural in matches:
+            names.setdefault(name, pk)
+            for alias in (singular, plural):
+                if alias:
+                    aliases.setdefault(alias, pk)
+    resolved = {term: names.get(term, aliases.get(term)) for term in terms if term in names or term in aliases}
+    if terms - resolved.keys() and get_resolver_settings()['ENABLED']:
+        resolved.update(get_ingredient_resolver().resolve_many(terms - resolved.keys()))
+    return resolved
+
+
+def build_ingredient_rows(recipe, parsed=None, glossary_ids=None):
+    """
+    Returns unsaved RecipeIngredient rows for a recipe's ingredients text.
+
+    Args:
+        recipe (Recipe): Recipe with ingredients_text loaded
+        parsed (list, optional): Result of parse_ingredients_text() to reuse
+        glossary_ids (dict, optional): Term to Glossary id map; looked up when not given
+    """
+    from .models import RecipeIngredient
+
+    if parsed is None:
+        parsed = parse_ingredients_text(recipe.ingredients_text)
+    if glossary_ids is None:
+        glossary_ids = glossary_ids_for({ingredient.term for ingredient in parsed})
+    return [
+        RecipeIngredient(
+            recipe_id=recipe.pk,
+            section=ingredient.section,
+            position=ingredient.position,
+            raw=ingredient.raw,
+            quantity=ingredient.quantity,
+            unit=ingredient.unit,
+            text=ingredient.text,
+            term=ingredient.term,
+            glossary_id=glossary_ids.get(ingredient.term),
+        )
+        for ingredient in parsed
+    ]
+
+
+def sync_recipe_ingredients(recipe):
+    """
+    Replace the RecipeIngredient rows of a saved recipe with a fresh parse of its text.
+
+    Returns:
+        list: The saved rows
+    """
+    from .models import RecipeIngredient
+
+    rows = build_ingredient_rows(recipe)
+    with transaction.atomic():
+        existing = RecipeIngredient.objects.filter(recipe_id=recipe.pk)
+        existing._raw_delete(existing.db)
+        rows = RecipeIngredient.objects.bulk_create(rows)
+    if hasattr(recipe, '_prefetched_objects_cache'):
+        recipe._prefetched_objects_cache.pop('ingredients', None)
+    return rows
+
+
+def _id_ranges(queryset, size):
+    # Keyset pagination, so resolving every row never loads the whole table
+    last = 0
+    while True:
+        ids = list(queryset.filter(id__gt=last).order_by('id').values_list('id', flat=True)[:size])
+        if not ids:
+            return
+        yield queryset.filter(id__gte=ids[0], id__lte=ids[-1])
+        last = ids[-1]
+
+
+def resolve_ingredients(recipe_ids=None, terms=None, mentioning=None, unresolved=False, batch_size=500, chunk_size=5000):
+    """
+    Point RecipeIngredient rows at the glossary term their term matches now.
+
+    Run after glossary terms are created, renamed or deleted, or after rows
+    were inserted in bulk without resolving them.
+
+    Args:
+        recipe_ids (iterable, optional): Only resolve the rows of these recipes
+        terms (iterable, optional): Only resolve rows with these lowercase terms
+        mentioning (iterable, optional): Only resolve rows whose term contains one of
+            these lowercase names, which a fuzzy match may now pick up or lose
+        unresolved (bool): Only resolve rows without a glossary term
+        batch_size (int): Rows updated per executemany call
+        chunk_size (int): Rows read at a time when resolving every row
+
+    Returns:
+        set: Ids of the recipes with rows that changed
+    """
+    from .models import RecipeIngredient
+
+    rows = RecipeIngredient.objects.exclude(term='')
+    if unresolved:
+        rows = rows.filter(glossary=None)
+    if recipe_ids is not None:
+        querysets = (rows.filter(recipe_id__in=chunk) for chunk in _chunks(set(recipe_ids)))
+    elif terms is not None:
+        querysets = (rows.filter(term__in=chunk) for chunk in _chunks(set(terms)))
+    elif mentioning is not None:
+        # One LIKE per name; very short names would match most rows
+        names = {name for name in mentioning if len(name) >= 3}
+        querysets = (
+            rows.filter(reduce(operator.or_, (Q(term__contains=name) for name in chunk)))
+            for chunk in _chunks(names, 50)
+        )
+    else:
+        querysets = _id_ranges(rows, chunk_size)
+
+    table = connection.ops.quote_name(RecipeIngredient._meta.db_table)
+    column = connection.ops.quote_name(RecipeIngredient._meta.get_field('glossary').column)
+    sql = f'UPDATE {table} SET {column} = %s WHERE id = %s'
+
+    changed_recipes = set()
+    for queryset in querysets:
+        current = list(queryset.values_list('id', 'recipe_id', 'term', 'glossary_id'))
+        glossary_ids = glossary_ids_for({term for _, _, term, _ in current})
+        changed = []
+        for pk, recipe_id, term, glossary_id in current:
+            resolved = glossary_ids.get(term)
+            if resolved != glossary_id:
+                changed.append((resolved, pk))
+                changed_recipes.add(recipe_id)
+        # executemany of one narrow UPDATE is much cheaper than bulk_update's CASE expressions
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(changed), batch_size):
+                cursor.executemany(sql, changed[start:start + batch_size])
+    return changed_recipes
@@ -1,11 +1,16 @@
 from django.core.management.base import BaseCommand
-from django.utils.text import slugify
-from recipes.models import Glossary, GlossaryCategory
+from recipes.importer import BulkImporter, iter_records
 
 class Command(BaseCommand):
     help = 'Add child Glossary Terms with their parent terms'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--file', type=str,
+                            help='JSON or JSON Lines file of terms to add instead of the built-in list')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of terms saved per transaction')
+
+    def handle(self, *args, **options):
         # Dictionary of child glossary terms with their parent terms and categories
         glossary_child_data = {
             # Flour child terms (Bakery Products)
@@ -101,47 +106,20 @@ class Command(BaseCommand):
             }
         }
 
-        # Track created and existing terms
-        created_count = 0
-        existing_count = 0
-
-        for name, data in glossary_child_data.items():
-            # Get the category
-            try:
-                category = GlossaryCategory.objects.get(category_name=data['category'])
-            except GlossaryCategory.DoesNotExist:
-                self.stdout.write(self.style.ERROR(f'Category not found: {data["category"]}'))
-                continue
-
-            # Get the parent term
-            try:
-                parent = Glossary.objects.get(name=data['parent'])
-            except Glossary.DoesNotExist:
-                self.stdout.write(self.style.ERROR(f'Parent term not found: {data["parent"]}'))
-                continue
+        if options['file']:
+            records = iter_records(options['file'])
+        else:
+            records = [{'name': name, **data} for name, data in glossary_child_data.items()]
 
-            # Try to get existing term or create a new one
-            obj, created = Glossary.objects.get_or_create(
-                name=name,
-                defaults={
-                    'slug': slugify(name),
-                    'description': data['description'],
-                    'singular_name': data['singular_name'],
-                    'plural_name': data['plural_name'],
-                    'category': category,
-                    'parent': parent
-                }
-            )
+        importer = BulkImporter(chunk_size=max(options['chunk_size'], 1))
+        importer.import_glossary(records)
+        importer.finish()
 
-            if created:
-                created_count += 1
-                self.stdout.write(self.style.SUCCESS(f'Created child glossary term: {name}'))
-            else:
-                existing_count += 1
-                self.stdout.write(self.style.NOTICE(f'Child glossary term already exists: {name}'))
+        for error in importer.errors:
+            self.stdout.write(self.style.ERROR(error))
 
         # Final summary
         self.stdout.write(self.style.SUCCESS(
             f'Finished adding child glossary terms. '
-            f'Created: {created_count}, Existing: {existing_count}'
+            f'Created: {importer.stats["glossary"]}, Existing: {importer.stats["glossary_existing"]}'
         ))
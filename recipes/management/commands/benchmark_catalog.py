@@ -0,0 +1,215 @@
+import json
+import platform
+import random
+import statistics
+import time
+import uuid
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from recipes.matcher import TermMatcher
+from recipes.models import Category, Glossary, Recipe, RecipeReview
+from recipes.nutrition import NutritionEngine
+from recipes.profiling import RequestProfile
+
+
+class Command(BaseCommand):
+    help = ('Time the hot paths (ingredient linking, nutrition, public views and admin changelists) on the '
+            'current catalog and write p50/p95 timings and query counts as JSON, to compare across releases')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=30,
+                            help='Measured runs per case')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Unmeasured runs per case, to fill caches and the term matcher')
+        parser.add_argument('--cases', nargs='+', default=None,
+                            help='Only run cases whose name starts with one of these prefixes, e.g. views admin')
+        parser.add_argument('--output', type=str, default=None,
+                            help='Write the results to this JSON file')
+        parser.add_argument('--compare', type=str, default=None,
+                            help='JSON results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=20,
+                            help='Percent slowdown of p50 or p95 reported as a regression')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def sample(self, queryset, field, count, rng):
+        values = list(queryset.order_by('id').values_list(field, flat=True))
+        if not values:
+            return []
+        return [rng.choice(values) for _ in range(count)]
+
+    def build_cases(self, count, rng, client, admin_client):
+        """
+        Returns (name, function) pairs; each function is called with the run number.
+        """
+        recipe_slugs = self.sample(Recipe.objects.all(), 'slug', count, rng)
+        if not recipe_slugs:
+            raise CommandError('There are no recipes, run generate_catalog first')
+        category_slugs = self.sample(Category.objects.all(), 'slug', count, rng)
+        term_slugs = self.sample(Glossary.objects.all(), 'slug', count, rng)
+        recipes = {
+            recipe.slug: recipe
+            for recipe in Recipe.objects.filter(slug__in=set(recipe_slugs)).only('id', 'slug', 'ingredients_text', 'servings')
+        }
+        words = [
+            word for name in Recipe.objects.filter(slug__in=set(recipe_slugs)).values_list('recipe_name', flat=True)
+            for word in (name or '').split() if len(word) > 3
+        ] or ['recipe']
+        pages = max(Recipe.objects.count() // 12, 1)
+
+        def get(path, use_client=client):
+            response = use_client.get(path)
+            if response.status_code != 200:
+                raise CommandError(f'{path} returned {response.status_code}')
+            return response
+
+        def recipe(number):
+            return recipes[recipe_slugs[number % len(recipe_slugs)]]
+
+        cases = [
+            ('ingredients.matcher_build', lambda number: TermMatcher.build()),
+            ('ingredients.render', lambda number: recipe(number).render_ingredients_with_sections()),
+            ('nutrition.compute', lambda number: NutritionEngine().nutrition_rows([recipe(number)])),
+            ('nutrition.stored', lambda number: recipe(number).get_detailed_nutritional_values()),
+            ('views.recipe_list', lambda number: get(f'{reverse("recipe_list")}?page={rng.randint(1, min(pages, 50))}')),
+            ('views.recipe_list_deep_page', lambda number: get(f'{reverse("recipe_list")}?page={pages}')),
+            ('views.recipe_detail', lambda number: get(recipe(number).get_absolute_url())),
+            ('views.category_list', lambda number: get(reverse('category_list'))),
+            ('views.glossary_list', lambda number: get(reverse('glossary_list'))),
+            ('views.search', lambda number: get(f'{reverse("search_results")}?q={words[number % len(words)]}')),
+            ('admin.recipe_changelist', lambda number: get(reverse('admin:recipes_recipe_changelist'), admin_client)),
+            ('admin.recipe_search', lambda number: get(
+                f'{reverse("admin:recipes_recipe_changelist")}?q={words[number % len(words)]}', admin_client)),
+            ('admin.glossary_changelist', lambda number: get(reverse('admin:recipes_glossary_changelist'), admin_client)),
+            ('admin.category_changelist', lambda number: get(reverse('admin:recipes_category_changelist'), admin_client)),
+            ('admin.review_changelist', lambda number: get(reverse('admin:recipes_recipereview_changelist'), admin_client)),
+            ('admin.glossary_nutrient_changelist', lambda number: get(
+                reverse('admin:recipes_glossarynutrient_changelist'), admin_client)),
+        ]
+        if category_slugs:
+            cases.append(('views.category_detail', lambda number: get(
+                reverse('category_detail', kwargs={'slug': category_slugs[number % len(category_slugs)]}))))
+        if term_slugs:
+            cases.append(('views.glossary_detail', lambda number: get(
+                reverse('glossary_detail', kwargs={'slug': term_slugs[number % len(term_slugs)]}))))
+        return cases
+
+    def measure(self, func, samples, warmup):
+        for number in range(warmup):
+            func(number)
+        timings, queries, sql_times = [], [], []
+        for number in range(samples):
+            profile = RequestProfile()
+            with connection.execute_wrapper(profile.execute_wrapper):
+                start = time.perf_counter()
+                func(warmup + number)
+                timings.append(time.perf_counter() - start)
+            queries.append(profile.queries)
+            sql_times.append(profile.sql_time)
+        return timings, queries, sql_times
+
+    @staticmethod
+    def percentile(values, fraction):
+        values = sorted(values)
+        return values[min(int(len(values) * fraction), len(values) - 1)]
+
+    def summarize(self, timings, queries, sql_times):
+        return {
+            'samples': len(timings),
+            'p50_ms': round(statistics.median(timings) * 1000, 3),
+            'p95_ms': round(self.percentile(timings, 0.95) * 1000, 3),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 3),
+            'max_ms': round(max(timings) * 1000, 3),
+            'queries_p50': statistics.median(queries),
+            'queries_max': max(queries),
+            'sql_ms_p50': round(statistics.median(sql_times) * 1000, 3),
+        }
+
+    def metadata(self, samples):
+        return {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'samples': samples,
+            'catalog': {
+                'recipes': Recipe.objects.count(),
+                'categories': Category.objects.count(),
+                'glossary': Glossary.objects.count(),
+                'reviews': RecipeReview.objects.count(),
+            },
+        }
+
+    def compare(self, results, path, threshold):
+        try:
+            with open(path) as file:
+                previous = json.load(file)['cases']
+        except (OSError, ValueError, KeyError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+        self.stdout.write(f'\nCompared with {path}')
+        self.stdout.write(f'{"case":<36} {"p50":>8} {"p95":>8} {"queries":>8}')
+        regressions = 0
+        for name, current in results.items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            changes = [
+                (current[key] - before[key]) / before[key] * 100 if before[key] else 0
+                for key in ('p50_ms', 'p95_ms')
+            ]
+            queries = current['queries_max'] - before['queries_max']
+            line = f'{name:<36} {changes[0]:>+7.1f}% {changes[1]:>+7.1f}% {queries:>+8}'
+            if max(changes) > threshold or queries > 0:
+                regressions += 1
+                self.stdout.write(self.style.WARNING(line))
+            else:
+                self.stdout.write(line)
+        return regressions
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        samples = max(options['samples'], 1)
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            # Every request renders; sampling would only add its own overhead
+            'RECIPES_CACHE': {**getattr(settings, 'RECIPES_CACHE', {}), 'PAGES': False},
+            'RECIPES_PROFILING': {**getattr(settings, 'RECIPES_PROFILING', {}), 'ENABLED': False},
+        }
+
+        User = get_user_model()
+        admin = User.objects.create_superuser(f'benchmark-{uuid.uuid4().hex[:12]}', password=None)
+        results = {}
+        try:
+            with override_settings(**overrides):
+                client, admin_client = Client(), Client()
+                admin_client.force_login(admin)
+                cases = self.build_cases(samples + options['warmup'], rng, client, admin_client)
+                if options['cases']:
+                    cases = [case for case in cases if case[0].startswith(tuple(options['cases']))]
+
+                self.stdout.write(f'{"case":<36} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8} {"sql ms":>8}')
+                for name, func in cases:
+                    results[name] = self.summarize(*self.measure(func, samples, max(options['warmup'], 0)))
+                    result = results[name]
+                    self.stdout.write(
+                        f'{name:<36} {result["p50_ms"]:>9.2f} {result["p95_ms"]:>9.2f} '
+                        f'{result["queries_p50"]:>8g} {result["sql_ms_p50"]:>8.2f}'
+                    )
+        finally:
+            admin.delete()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'meta': self.metadata(samples), 'cases': results}, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} results to {options["output"]}'))
+        if options['compare']:
+            regressions = self.compare(results, options['compare'], options['threshold'])
+            message = f'{regressions} regressions' if regressions else 'No regressions'
+            self.stdout.write((self.style.WARNING if regressions else self.style.SUCCESS)(message))
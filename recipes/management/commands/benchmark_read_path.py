@@ -0,0 +1,141 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+from recipes.models import Glossary, Recipe
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of the sync (WSGI) and async (ASGI) read views on the current database. '
+            'Requests go through the WSGI and ASGI handlers in this process; use a file database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Number of requests per mode')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='WSGI worker threads, and concurrent ASGI requests')
+        parser.add_argument('--samples', type=int, default=50,
+                            help='Number of recipes and glossary terms to request')
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi'], default='both')
+        parser.add_argument('--page-cache', action='store_true',
+                            help='Keep the anonymous page cache on (by default every request renders)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def build_urls(self, samples, count, seed):
+        rng = random.Random(seed)
+        recipes = list(Recipe.objects.order_by('?').values_list('slug', 'recipe_name')[:samples])
+        terms = list(Glossary.objects.order_by('?').values_list('slug', flat=True)[:samples])
+        if not recipes:
+            raise CommandError('There are no recipes to request, import some data first')
+
+        words = [word for _, name in recipes for word in (name or '').split() if len(word) > 3] or ['recipe']
+        makers = [
+            lambda: f'/recipe/{rng.choice(recipes)[0]}/',
+            lambda: f'/?page={rng.randint(1, 5)}',
+            lambda: f'/search/?q={rng.choice(words)}',
+        ]
+        if terms:
+            makers.append(lambda: f'/glossary/{rng.choice(terms)}/')
+        return [rng.choice(makers)() for _ in range(count)]
+
+    def urlconfs(self):
+        """
+        Returns (sync, async) URLconf modules built from the project URLconf.
+        """
+        async_urls = import_module('recipes.async_urls')
+        root = import_module(settings.ROOT_URLCONF)
+        sync_patterns = [
+            pattern for pattern in root.urlpatterns
+            if getattr(pattern, 'urlconf_name', None) is not async_urls
+        ]
+        sync_urlconf = types.ModuleType('benchmark_sync_urls')
+        sync_urlconf.urlpatterns = sync_patterns
+        async_urlconf = types.ModuleType('benchmark_async_urls')
+        async_urlconf.urlpatterns = [path('', include(async_urls))] + sync_patterns
+        return sync_urlconf, async_urlconf
+
+    def run_wsgi(self, urls, concurrency):
+        local = threading.local()
+
+        def fetch(url):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+            start = time.perf_counter()
+            response = client.get(url)
+            return time.perf_counter() - start, response.status_code
+
+        def close_connection(_):
+            connection.close()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(fetch, urls))
+            elapsed = time.perf_counter() - start
+            list(pool.map(close_connection, range(concurrency)))
+        return elapsed, results
+
+    def run_asgi(self, urls, concurrency):
+        async def main():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def fetch(url):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    return time.perf_counter() - start, response.status_code
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(fetch(url) for url in urls))
+            return time.perf_counter() - start, results
+
+        return asyncio.run(main())
+
+    def report(self, mode, elapsed, results):
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, status in results if status != 200)
+        p95 = latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+        self.stdout.write(
+            f'{mode:<5} {len(results):>6} {elapsed:>8.2f} {len(results) / elapsed:>8.1f} '
+            f'{statistics.median(latencies) * 1000:>8.1f} {p95 * 1000:>8.1f} {errors:>6}'
+        )
+        return len(results) / elapsed
+
+    def handle(self, *args, **options):
+        urls = self.build_urls(max(options['samples'], 1), max(options['requests'], 1), options['seed'])
+        concurrency = max(options['concurrency'], 1)
+        sync_urlconf, async_urlconf = self.urlconfs()
+
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if not options['page_cache']:
+            overrides['RECIPES_CACHE'] = {**getattr(settings, 'RECIPES_CACHE', {}), 'PAGES': False}
+
+        self.stdout.write(f'{len(urls)} requests per mode, concurrency {concurrency}')
+        self.stdout.write(f'{"mode":<5} {"reqs":>6} {"secs":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"errors":>6}')
+        throughput = {}
+        with override_settings(**overrides):
+            if options['mode'] in ('both', 'wsgi'):
+                with override_settings(ROOT_URLCONF=sync_urlconf):
+                    throughput['wsgi'] = self.report('wsgi', *self.run_wsgi(urls, concurrency))
+            if options['mode'] in ('both', 'asgi'):
+                with override_settings(ROOT_URLCONF=async_urlconf):
+                    throughput['asgi'] = self.report('asgi', *self.run_asgi(urls, concurrency))
+
+        if 'asgi' in throughput:
+            # The async views await their queries one by one, so only separate requests overlap
+            self.stdout.write('asgi: the queries of each request run one after another in the thread-sensitive worker')
+        if len(throughput) == 2:
+            self.stdout.write(self.style.SUCCESS(
+                f"ASGI/WSGI throughput ratio: {throughput['asgi'] / throughput['wsgi']:.2f}"
+            ))
@@ -0,0 +1,162 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from recipes.models import Recipe, RecipeReview
+
+
+# Operations of the simulated workload and their share of requests
+WORKLOAD = [
+    ('read', 0.70),
+    ('view', 0.20),
+    ('review', 0.10),
+]
+
+
+class Command(BaseCommand):
+    help = ('Measure "database is locked" errors under concurrent reads, view-count writes and review posts, '
+            'with the default SQLite settings and the production profile, on a copy of the database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16,
+                            help='Number of concurrent clients')
+        parser.add_argument('--seconds', type=float, default=10,
+                            help='Duration of each run')
+        parser.add_argument('--timeout', type=float, default=5,
+                            help='Seconds to wait for a lock before failing (the sqlite3 default is 5)')
+        parser.add_argument('--profiles', nargs='+', default=['default', 'production'],
+                            help='Profiles to compare')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def database_copy(self, directory):
+        source = connections['default'].settings_dict
+        if source['ENGINE'] not in ('django.db.backends.sqlite3', 'recipes.backends.sqlite3'):
+            raise CommandError('The default database is not SQLite')
+        if connections['default'].is_in_memory_db():
+            raise CommandError('The default database is in memory, use a file database')
+
+        # The backup API copies a consistent snapshot, including pages still in the WAL
+        path = os.path.join(directory, 'benchmark.sqlite3')
+        with sqlite3.connect(str(source['NAME'])) as original, sqlite3.connect(path) as copy:
+            original.backup(copy)
+        copy.close()
+        original.close()
+        return path
+
+    def configure(self, alias, path, profile, timeout):
+        transaction_mode = 'IMMEDIATE' if profile == 'production' else 'DEFERRED'
+        databases = connections.configure_settings({
+            'default': connections['default'].settings_dict,
+            alias: {
+                'ENGINE': 'recipes.backends.sqlite3',
+                'NAME': path,
+                'OPTIONS': {
+                    'profile': profile,
+                    'transaction_mode': transaction_mode,
+                    # Overrides the profile's busy_timeout so both profiles wait as long
+                    'pragmas': {'busy_timeout': int(timeout * 1000)},
+                },
+            },
+        })
+        connections.settings[alias] = databases[alias]
+        # Profiles change the journal mode, which persists in the file
+        if profile == 'default':
+            with sqlite3.connect(path) as conn:
+                conn.execute('PRAGMA journal_mode = DELETE')
+            conn.close()
+
+    def worker(self, alias, slugs, deadline, seed, stats, lock):
+        rng = random.Random(seed)
+        operations, weights = zip(*WORKLOAD)
+        local = Counter()
+        while time.monotonic() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            slug = rng.choice(slugs)
+            start = time.perf_counter()
+            try:
+                getattr(self, f'do_{operation}')(alias, slug, rng)
+                local[f'{operation}_ok'] += 1
+            except OperationalError as exc:
+                local[f'{operation}_locked' if 'locked' in str(exc) else f'{operation}_error'] += 1
+            local[f'{operation}_seconds'] += time.perf_counter() - start
+        connections[alias].close()
+        with lock:
+            stats.update(local)
+
+    def do_read(self, alias, slug, rng):
+        recipe = Recipe.objects.using(alias).get(slug=slug)
+        list(RecipeReview.objects.using(alias).filter(recipe=recipe, is_approved=True)[:10])
+        list(recipe.nutrition.using(alias).all())
+
+    def do_view(self, alias, slug, rng):
+        Recipe.objects.using(alias).filter(slug=slug).update(views_count=F('views_count') + 1)
+
+    def do_review(self, alias, slug, rng):
+        # Like a review post: read the recipe, then write inside one transaction
+        with transaction.atomic(using=alias):
+            recipe = Recipe.objects.using(alias).get(slug=slug)
+            rating = rng.randint(1, 5)
+            RecipeReview.objects.using(alias).bulk_create([RecipeReview(
+                recipe=recipe, name='Benchmark', email=f'{rng.getrandbits(64):x}@example.com',
+                rating=rating, is_approved=True,
+            )])
+            Recipe.objects.using(alias).filter(pk=recipe.pk).update(
+                review_count=F('review_count') + 1, rating_sum=F('rating_sum') + rating,
+            )
+
+    def run(self, alias, slugs, threads, seconds, seed):
+        stats = Counter()
+        lock = threading.Lock()
+        deadline = time.monotonic() + seconds
+        workers = [
+            threading.Thread(target=self.worker, args=(alias, slugs, deadline, seed + number, stats, lock))
+            for number in range(threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return stats
+
+    def report(self, profile, stats, seconds):
+        for operation, _ in WORKLOAD:
+            ok, locked, errors = (stats[f'{operation}_{kind}'] for kind in ('ok', 'locked', 'error'))
+            total = ok + locked + errors
+            rate = locked / total * 100 if total else 0
+            mean = stats[f'{operation}_seconds'] / total * 1000 if total else 0
+            self.stdout.write(
+                f'{profile:<11} {operation:<7} {total:>8} {total / seconds:>8.1f} {locked:>7} {rate:>7.2f}% {mean:>8.1f}'
+            )
+
+    def handle(self, *args, **options):
+        slugs = list(Recipe.objects.values_list('slug', flat=True)[:1000])
+        if not slugs:
+            raise CommandError('There are no recipes, import some data first')
+
+        threads = max(options['threads'], 1)
+        self.stdout.write(f'{threads} threads, {options["seconds"]:g}s per profile')
+        self.stdout.write(f'{"profile":<11} {"op":<7} {"count":>8} {"per sec":>8} {"locked":>7} {"rate":>8} {"mean ms":>8}')
+        directory = tempfile.mkdtemp(prefix='recipes-sqlite-benchmark-')
+        try:
+            for profile in options['profiles']:
+                path = self.database_copy(directory)
+                alias = f'benchmark_{profile}'
+                self.configure(alias, path, profile, options['timeout'])
+                try:
+                    stats = self.run(alias, slugs, threads, options['seconds'], options['seed'])
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+                self.report(profile, stats, options['seconds'])
+                for name in os.listdir(directory):
+                    os.remove(os.path.join(directory, name))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
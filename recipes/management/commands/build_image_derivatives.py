@@ -0,0 +1,55 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from recipes.images import get_registered_fields, render_derivatives, store_derivatives
+from recipes.models import ImageDerivative
+
+
+class Command(BaseCommand):
+    help = 'Create the resized WebP/JPEG copies of existing recipe and video images, in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: one per CPU core)')
+        parser.add_argument('--force', action='store_true',
+                            help='Also process images that already have derivatives')
+
+    def sources(self, force):
+        names = set()
+        for model, field_names in get_registered_fields().items():
+            for field_name in field_names:
+                names.update(
+                    model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                    .values_list(field_name, flat=True)
+                )
+        if not force:
+            names -= set(ImageDerivative.objects.values_list('source', flat=True))
+        return sorted(names)
+
+    def handle(self, *args, **options):
+        sources = self.sources(options['force'])
+        if not sources:
+            self.stdout.write(self.style.SUCCESS('All images already have derivatives'))
+            return
+
+        # Workers only resize and write files; rows are stored here, so no
+        # database connection may be shared with the forked processes
+        connections.close_all()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            futures = {pool.submit(render_derivatives, source): source for source in sources}
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    store_derivatives(source, future.result())
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{source}: {exc}')
+                    continue
+                done += 1
+                if done % 100 == 0:
+                    self.stdout.write(f'Processed {done}/{len(sources)} images')
+
+        self.stdout.write(self.style.SUCCESS(f'Created derivatives for {done} images ({failed} failed)'))
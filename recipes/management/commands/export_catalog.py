@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.catalog import SECTIONS, export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Export the recipe catalog to a compressed, checksummed JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Output file, e.g. catalog.jsonl.gz')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of rows fetched per database query')
+        parser.add_argument('--section', action='append',
+                            help='Only export this section; may be repeated')
+
+    def handle(self, *args, **options):
+        names = [name for name, _, _ in SECTIONS]
+        if options['section']:
+            unknown = set(options['section']) - set(names)
+            if unknown:
+                raise CommandError(f'Unknown section: {", ".join(sorted(unknown))}')
+
+        counts = export_catalog(options['path'], chunk_size=max(options['chunk_size'], 1),
+                                sections=options['section'])
+
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Exported catalog to {options["path"]}'))
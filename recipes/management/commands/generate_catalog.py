@@ -0,0 +1,77 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.importer import clear_catalog
+from recipes.synthetic import generate_catalog
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic catalog of recipes, category and glossary trees, nutrients and reviews, '
+            'to test how the site behaves at scale')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--categories', type=int, default=200)
+        parser.add_argument('--category-depth', type=int, default=4,
+                            help='Levels of the category trees')
+        parser.add_argument('--category-roots', type=int, default=8,
+                            help='Number of top-level categories')
+        parser.add_argument('--terms', type=int, default=2000,
+                            help='Number of glossary terms')
+        parser.add_argument('--glossary-depth', type=int, default=4,
+                            help='Levels of the glossary trees')
+        parser.add_argument('--glossary-roots', type=int, default=40,
+                            help='Number of top-level glossary terms')
+        parser.add_argument('--glossary-categories', type=int, default=20)
+        parser.add_argument('--nutrients', type=int, default=16)
+        parser.add_argument('--nutrients-per-term', type=int, default=8)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--ingredient-lines', type=int, default=14,
+                            help='Maximum number of ingredient lines per recipe')
+        parser.add_argument('--ingredient-sections', type=int, default=3,
+                            help='Maximum number of # sections per recipe')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of processes generating records (default: one per CPU core)')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of records generated and saved at a time')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows inserted per query')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete the existing catalog first')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_catalog()
+            self.stdout.write('Deleted the existing catalog')
+
+        start = time.perf_counter()
+        importer = generate_catalog(
+            recipes=max(options['recipes'], 0),
+            categories=max(options['categories'], 0),
+            category_depth=options['category_depth'],
+            category_roots=options['category_roots'],
+            terms=max(options['terms'], 0),
+            glossary_depth=options['glossary_depth'],
+            glossary_roots=options['glossary_roots'],
+            glossary_categories=max(options['glossary_categories'], 0),
+            nutrients=max(options['nutrients'], 0),
+            nutrients_per_term=max(options['nutrients_per_term'], 0),
+            reviews=max(options['reviews'], 0),
+            ingredient_lines=options['ingredient_lines'],
+            ingredient_sections=options['ingredient_sections'],
+            seed=options['seed'],
+            workers=options['workers'],
+            chunk_size=max(options['chunk_size'], 1),
+            batch_size=max(options['batch_size'], 1),
+            log=self.stdout.write,
+        )
+
+        for error in importer.errors[:20]:
+            self.stdout.write(self.style.WARNING(error))
+        if len(importer.errors) > 20:
+            self.stdout.write(self.style.WARNING(f'... and {len(importer.errors) - 20} more errors'))
+        for name, count in sorted(importer.stats.items()):
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Generated the catalog in {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from recipes.catalog import CatalogError, import_catalog, verify_catalog
+
+
+class Command(BaseCommand):
+    help = 'Replace the recipe catalog with one written by export_catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Catalog file written by export_catalog')
+        parser.add_argument('--resume', action='store_true',
+                            help='Continue an interrupted import instead of starting over')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of records saved per transaction')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows inserted per query')
+        parser.add_argument('--no-verify', action='store_true',
+                            help='Skip checking the section checksums before importing')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only check the section checksums')
+
+    def handle(self, *args, **options):
+        try:
+            if options['verify_only']:
+                for name, count in verify_catalog(options['path']).items():
+                    self.stdout.write(f'{name}: {count}')
+                self.stdout.write(self.style.SUCCESS('Catalog checksums are valid'))
+                return
+
+            importer = import_catalog(
+                options['path'],
+                chunk_size=max(options['chunk_size'], 1),
+                batch_size=max(options['batch_size'], 1),
+                resume=options['resume'],
+                verify=not options['no_verify'],
+                log=self.stdout.write,
+            )
+        except CatalogError as e:
+            raise CommandError(str(e))
+
+        for error in importer.errors:
+            self.stdout.write(self.style.WARNING(error))
+        for name, count in sorted(importer.stats.items()):
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Imported catalog from {options["path"]}'))
@@ -1,5 +1,5 @@
 from django.core.management.base import BaseCommand
-from recipes.models import Nutrient, Glossary, GlossaryNutrient
+from recipes.importer import BulkImporter
 
 class Command(BaseCommand):
     help = 'Populate initial nutritional data for glossary terms'
@@ -39,10 +39,8 @@ class Command(BaseCommand):
             {'name': 'Cholesterol', 'unit': 'mg'}
         ]
 
-        created_nutrients = {}
-        for nutrient_data in nutrients:
-            nutrient, created = Nutrient.objects.get_or_create(**nutrient_data)
-            created_nutrients[nutrient.name.lower()] = nutrient
+        importer = BulkImporter()
+        importer.import_nutrients(nutrients)
 
         # Nutritional data for some common ingredients
         ingredient_nutrition = [
@@ -116,25 +114,12 @@ class Command(BaseCommand):
         ]
 
         # Add nutritional data to glossary terms
-        for ingredient_data in ingredient_nutrition:
-            try:
-                glossary_term = Glossary.objects.get(name__iexact=ingredient_data['name'])
-                
-                # Remove existing nutritional data if any
-                GlossaryNutrient.objects.filter(glossary=glossary_term).delete()
-                
-                # Add new nutritional data
-                for nutrient_name, value in ingredient_data['nutrition'].items():
-                    nutrient = created_nutrients.get(nutrient_name.lower())
-                    if nutrient:
-                        GlossaryNutrient.objects.create(
-                            glossary=glossary_term,
-                            nutrient=nutrient,
-                            value=value
-                        )
-                
-                self.stdout.write(self.style.SUCCESS(f'Added nutrition data for {glossary_term.name}'))
-            except Glossary.DoesNotExist:
-                self.stdout.write(self.style.WARNING(f'Glossary term {ingredient_data["name"]} not found'))
+        importer.import_glossary_nutrients(ingredient_nutrition)
+        importer.finish()
 
+        for error in importer.errors:
+            self.stdout.write(self.style.WARNING(error))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Added nutrition data for {importer.stats["glossary_nutrition"]} glossary terms'))
         self.stdout.write(self.style.SUCCESS('Successfully populated nutritional data'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe, RecipeIngredientTerm
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the index of [bracketed] ingredient terms used by every recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of index rows inserted per query')
+
+    def handle(self, *args, **options):
+        batch_size = max(options['batch_size'], 1)
+        recipe_count = 0
+        rows = []
+
+        with transaction.atomic():
+            RecipeIngredientTerm.objects.all().delete()
+            for recipe in Recipe.objects.only('id', 'ingredients_text').iterator(chunk_size=batch_size):
+                recipe_count += 1
+                rows.extend(RecipeIngredientTerm(recipe_id=recipe.id, term=term) for term in recipe.get_ingredient_terms())
+            RecipeIngredientTerm.objects.bulk_create(rows, batch_size=batch_size)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(rows)} ingredient terms for {recipe_count} recipes'))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.importer import chunked, delete_all, insert_rows
+from recipes.ingredients import parse_ingredients_text, resolve_ingredients
+from recipes.models import Recipe, RecipeIngredient
+from recipes.nutrition import rebuild_catalog_nutrition
+
+LINE_FIELDS = ['recipe', 'section', 'position', 'raw', 'quantity', 'unit', 'text', 'term']
+
+
+class Command(BaseCommand):
+    help = ('Parse the ingredients text of every recipe into RecipeIngredient rows and resolve them to glossary '
+            'terms, e.g. after upgrading or after changing the parser')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of recipes parsed at a time')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of rows inserted or updated per query')
+        parser.add_argument('--nutrition', action='store_true',
+                            help='Also rebuild the stored nutrition of every recipe from the new rows')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        batch_size = max(options['batch_size'], 1)
+        recipe_count = line_count = 0
+
+        with transaction.atomic():
+            delete_all(RecipeIngredient)
+            recipes = Recipe.objects.order_by('id').only('id', 'ingredients_text').iterator(chunk_size=chunk_size)
+            for chunk in chunked(recipes, chunk_size):
+                rows = [
+                    (recipe.pk, line.section, line.position, line.raw, line.quantity, line.unit, line.text, line.term)
+                    for recipe in chunk for line in parse_ingredients_text(recipe.ingredients_text)
+                ]
+                insert_rows(RecipeIngredient, LINE_FIELDS, rows, batch_size)
+                recipe_count += len(chunk)
+                line_count += len(rows)
+            resolve_ingredients(batch_size=batch_size, chunk_size=chunk_size * 10)
+
+        resolved = RecipeIngredient.objects.exclude(glossary=None).count()
+        self.stdout.write(f'Parsed {line_count} ingredient lines of {recipe_count} recipes, {resolved} resolved to glossary terms')
+
+        if options['nutrition']:
+            rebuild_catalog_nutrition(chunk_size=chunk_size)
+            self.stdout.write('Rebuilt the stored nutrition')
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt the ingredient rows'))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.cache import invalidate
+from recipes.ingredients import glossary_ids_for
+from recipes.models import Glossary, RecipeIngredient
+from recipes.nutrition import rebuild_catalog_nutrition
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored nutrition totals of every recipe, or of the recipes using some glossary terms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('terms', nargs='*',
+                            help='Glossary term names or slugs, e.g. after correcting their nutrient values; '
+                                 'every recipe is rebuilt when none are given')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Number of recipes written per transaction')
+
+    def handle(self, *args, **options):
+        recipe_ids = None
+        if options['terms']:
+            glossary_ids = set(glossary_ids_for({term.strip().lower() for term in options['terms']}).values())
+            glossary_ids.update(Glossary.objects.filter(slug__in=options['terms']).values_list('id', flat=True))
+            if not glossary_ids:
+                raise CommandError(f'No glossary terms match {", ".join(options["terms"])}')
+            recipe_ids = set(RecipeIngredient.objects.filter(
+                glossary_id__in=glossary_ids).values_list('recipe_id', flat=True))
+
+        start = time.perf_counter()
+        rows = rebuild_catalog_nutrition(recipe_ids, chunk_size=max(options['chunk_size'], 1))
+        # Recipe pages and nutrient filters are cached under the glossary scope
+        invalidate('glossary')
+
+        recipes = 'every recipe' if recipe_ids is None else f'{len(recipe_ids)} recipes'
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt nutrition for {recipes} ({rows} rows) in {time.perf_counter() - start:.1f}s'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from recipes.recommender import rebuild_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-recipe recommendations of every recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Number of recipes stored per transaction')
+
+    def handle(self, *args, **options):
+        count = rebuild_recommendations(chunk_size=max(options['chunk_size'], 1))
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt recommendations for {count} recipes'))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.search import get_backend, get_documents
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for recipes, glossary terms and videos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append',
+                            help='Only rebuild this kind (recipe, glossary, video); may be repeated')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of objects indexed per batch')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not backend.indexed:
+            self.stdout.write(self.style.WARNING(f'{type(backend).__name__} does not use an index, nothing to rebuild'))
+            return
+
+        documents = get_documents()
+        if options['kind']:
+            unknown = set(options['kind']) - {document.kind for document in documents}
+            if unknown:
+                raise CommandError(f'Unknown kind: {", ".join(sorted(unknown))}')
+            documents = [document for document in documents if document.kind in options['kind']]
+
+        batch_size = max(options['batch_size'], 1)
+        for document in documents:
+            count = 0
+            with transaction.atomic():
+                backend.clear(document)
+                batch = []
+                for instance in document.get_queryset().iterator(chunk_size=batch_size):
+                    batch.append(instance)
+                    if len(batch) >= batch_size:
+                        backend.bulk_index(document, batch)
+                        count += len(batch)
+                        batch = []
+                backend.bulk_index(document, batch)
+                count += len(batch)
+            self.stdout.write(self.style.SUCCESS(f'Indexed {count} {document.kind} entries'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recount the stored review aggregates of every recipe and repair any drift'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            repaired = Recipe.recount_review_stats()
+
+        if repaired:
+            self.stdout.write(self.style.WARNING(f'Repaired review aggregates for {repaired} recipes'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Review aggregates are up to date'))
@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min
+from recipes.ingredients import resolve_ingredients
+from recipes.models import RecipeIngredient
+from recipes.resolver import get_ingredient_resolver
+
+
+class Command(BaseCommand):
+    help = ('List ingredient terms that resolve to no glossary term across the catalog, most frequent first, '
+            'with the closest glossary name as a suggestion')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Number of terms listed')
+        parser.add_argument('--min-count', type=int, default=1,
+                            help='Only list terms used by at least this many lines')
+        parser.add_argument('--resolve', action='store_true',
+                            help='Resolve unresolved lines again with the current glossary first')
+        parser.add_argument('--json', action='store_true',
+                            help='Write the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['resolve']:
+            changed = resolve_ingredients(unresolved=True)
+            self.stdout.write(f'Resolved lines of {len(changed)} recipes')
+
+        unresolved = RecipeIngredient.objects.filter(glossary=None).exclude(term='')
+        total = unresolved.count()
+        rows = (
+            unresolved.values('term')
+            .annotate(lines=Count('id'), recipes=Count('recipe', distinct=True), example=Min('raw'))
+            .filter(lines__gte=max(options['min_count'], 1))
+            .order_by('-lines', 'term')[:max(options['limit'], 0)]
+        )
+
+        resolver = get_ingredient_resolver()
+        report = []
+        for row in rows:
+            match = resolver.suggest(row['term'])
+            report.append({**row, 'suggestion': match[0] if match else None, 'distance': match[1] if match else None})
+
+        if options['json']:
+            self.stdout.write(json.dumps({'unresolved_lines': total, 'terms': report}, indent=2))
+            return
+
+        self.stdout.write(f'{"lines":>7} {"recipes":>8}  {"term":<40} suggestion')
+        for row in report:
+            suggestion = f'{row["suggestion"]} ({row["distance"]})' if row['suggestion'] else '-'
+            self.stdout.write(f'{row["lines"]:>7} {row["recipes"]:>8}  {row["term"][:40]:<40} {suggestion}')
+        self.stdout.write(self.style.SUCCESS(f'{total} ingredient lines resolve to no glossary term'))
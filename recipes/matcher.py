@@ -0,0 +1,112 @@
+import threading
+
+from django.urls import reverse
+
+from .cache import get_cache
+
+
+class TermMatcher:
+    """
+    In-memory index of glossary terms and recipe names used to link ingredients.
+
+    Keys are lowercase names. Glossary terms are also indexed under their
+    singular and plural forms, so "[eggs]" resolves to the "Egg" term.
+    """
+
+    def __init__(self, terms, recipes):
+        self.terms = terms
+        self.recipes = recipes
+
+    @classmethod
+    def build(cls):
+        """
+        Load every glossary term and recipe once and compile the lookup tables.
+
+        Returns:
+            TermMatcher: A matcher ready for lookups without further queries
+        """
+        from .models import Glossary, Recipe
+
+        terms = {}
+        aliases = {}
+        for term in Glossary.objects.select_related('parent'):
+            item = {
+                'original': term.name,
+                'singular': term.singular_name,
+                'plural': term.plural_name,
+                'url': term.get_parent_url_with_anchor(),
+                'type': 'term'
+            }
+            terms[term.name.lower()] = item
+            for alias in (term.singular_name, term.plural_name):
+                if alias:
+                    aliases.setdefault(alias.lower(), item)
+
+        # Exact names always win over singular/plural aliases
+        for key, item in aliases.items():
+            terms.setdefault(key, item)
+
+        recipes = {}
+        for recipe in Recipe.objects.exclude(recipe_name__isnull=True).only('id', 'recipe_name', 'slug'):
+            recipes[recipe.recipe_name.lower()] = {
+                'id': recipe.id,
+                'original': recipe.recipe_name,
+                'url': reverse('recipe_detail', args=[recipe.slug]),
+                'type': 'recipe'
+            }
+
+        return cls(terms, recipes)
+
+    def lookup(self, name, exclude_recipe=None):
+        """
+        Find the glossary term or recipe matching a name.
+
+        Args:
+            name (str): Term or recipe name, in any case
+            exclude_recipe (int): Recipe id that must not link to itself
+
+        Returns:
+            dict: Item data, or None when nothing matches
+        """
+        key = name.strip().lower()
+        recipe = self.recipes.get(key)
+        if recipe is not None and recipe['id'] != exclude_recipe:
+            return recipe
+        return self.terms.get(key)
+
+
+# Cache scope whose shared version tells every process when to rebuild
+VERSION_SCOPE = 'term_matcher'
+
+# (version, matcher) of this process
+_matcher = None
+_lock = threading.Lock()
+
+
+def get_term_matcher():
+    """
+    Returns the process-wide matcher, building it on first use.
+
+    The matcher is rebuilt when the shared version of its cache scope
+    changes, so a term saved in one process reaches the others once their
+    copy of the version expires, after VERSION_TIMEOUT seconds.
+    """
+    global _matcher
+    version = get_cache().get_version(VERSION_SCOPE)
+    current = _matcher
+    if current is None or current[0] != version:
+        with _lock:
+            if _matcher is None or _matcher[0] != version:
+                _matcher = (version, TermMatcher.build())
+            current = _matcher
+    return current[1]
+
+
+def invalidate_term_matcher():
+    """
+    Drop the cached matcher in every process so the next lookup rebuilds it.
+    """
+    global _matcher
+    with _lock:
+        _matcher = None
+    get_cache().invalidate(VERSION_SCOPE)
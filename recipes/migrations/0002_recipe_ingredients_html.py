@@ -0,0 +1,45 @@
+# Generated by Django 4.2.18 on 2026-10-17 21:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def index_ingredient_terms(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredientTerm = apps.get_model('recipes', 'RecipeIngredientTerm')
+
+    rows = []
+    for recipe in Recipe.objects.only('id', 'ingredients_text'):
+        terms = {term.strip().lower()[:200] for term in re.findall(r'\[(.*?)\]', recipe.ingredients_text)}
+        rows.extend(RecipeIngredientTerm(recipe_id=recipe.id, term=term) for term in terms if term)
+    RecipeIngredientTerm.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_html',
+            field=models.TextField(blank=True, default='', editable=False, help_text='Rendered ingredient list, regenerated when the recipe or its linked terms change'),
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredientTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(db_index=True, help_text='Lowercase term as written in brackets', max_length=200)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_terms', to='recipes.recipe')),
+            ],
+            options={
+                'verbose_name': 'Recipe Ingredient Term',
+                'verbose_name_plural': 'Recipe Ingredient Terms',
+                'unique_together': {('recipe', 'term')},
+            },
+        ),
+        migrations.RunPython(index_ingredient_terms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.18 on 2026-10-17 21:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_recipe_ingredients_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.FloatField(default=0, help_text='Total value for the whole recipe')),
+                ('per_serving', models.FloatField(blank=True, help_text='Total divided by servings', null=True)),
+                ('daily_value', models.FloatField(default=0, help_text='Percentage of the recommended daily value')),
+                ('nutrient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_totals', to='recipes.nutrient')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nutrition', to='recipes.recipe')),
+            ],
+            options={
+                'verbose_name': 'Recipe Nutrition',
+                'verbose_name_plural': 'Recipe Nutrition',
+                'indexes': [models.Index(fields=['nutrient', 'total'], name='recipes_rec_nutrien_9aec08_idx'), models.Index(fields=['nutrient', 'per_serving'], name='recipes_rec_nutrien_e51a69_idx')],
+                'unique_together': {('recipe', 'nutrient')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:40
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_search_index USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, title, body, "
+        "prefix='2 3 4', tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS recipes_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipenutrition'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
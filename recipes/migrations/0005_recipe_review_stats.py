@@ -0,0 +1,67 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:02
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_reviews(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeReview = apps.get_model('recipes', 'RecipeReview')
+
+    stats = {}
+    rows = RecipeReview.objects.filter(is_approved=True).values('recipe_id', 'rating').annotate(count=Count('id'))
+    for row in rows:
+        recipe_stats = stats.setdefault(row['recipe_id'], {'review_count': 0, 'rating_sum': 0})
+        recipe_stats['review_count'] += row['count']
+        recipe_stats['rating_sum'] += row['rating'] * row['count']
+        if 1 <= row['rating'] <= 5:
+            recipe_stats[f'rating_{row["rating"]}_count'] = row['count']
+
+    for recipe_id, recipe_stats in stats.items():
+        Recipe.objects.filter(pk=recipe_id).update(**recipe_stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_reviews, migrations.RunPython.noop),
+    ]
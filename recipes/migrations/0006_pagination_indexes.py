@@ -0,0 +1,25 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_review_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['tree_id', 'lft'], name='category_tree_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='glossary',
+            index=models.Index(fields=['tree_id', 'lft'], name='glossary_tree_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['created_at', 'id'], name='recipe_created_id_idx'),
+        ),
+    ]
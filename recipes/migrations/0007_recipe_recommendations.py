@@ -0,0 +1,31 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(help_text='Cosine similarity between the two recipes')),
+                ('rank', models.PositiveSmallIntegerField(help_text="Position in the recipe's list, starting at 1")),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='recipes.recipe')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='recipes.recipe')),
+            ],
+            options={
+                'verbose_name': 'Recipe Recommendation',
+                'verbose_name_plural': 'Recipe Recommendations',
+                'ordering': ['recipe', 'rank'],
+                'indexes': [models.Index(fields=['recipe', 'rank'], name='recipes_rec_recipe__c186d3_idx')],
+                'unique_together': {('recipe', 'recommended')},
+            },
+        ),
+    ]
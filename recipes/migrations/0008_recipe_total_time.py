@@ -0,0 +1,25 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:18
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_total_time(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(total_time=F('preparation_time') + F('cooking_time'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='total_time',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, help_text='Preparation plus cooking time, kept for filtering'),
+        ),
+        migrations.RunPython(fill_total_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_total_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, help_text='Storage name of the original image', max_length=255)),
+                ('digest', models.CharField(help_text='SHA-256 of the original image', max_length=64)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('format', models.CharField(help_text='webp or jpeg', max_length=10)),
+                ('name', models.CharField(help_text='Storage name of the derivative', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Image Derivative',
+                'verbose_name_plural': 'Image Derivatives',
+                'ordering': ['source', 'format', 'width'],
+                'unique_together': {('source', 'format', 'width')},
+            },
+        ),
+    ]
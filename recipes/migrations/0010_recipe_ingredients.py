@@ -0,0 +1,64 @@
+# Generated by Django 4.2.18 on 2026-10-17 22:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from recipes.ingredients import parse_ingredients_text
+
+
+def parse_ingredients(apps, schema_editor):
+    Glossary = apps.get_model('recipes', 'Glossary')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+
+    names, aliases = {}, {}
+    for pk, name, singular, plural in Glossary.objects.order_by('id').values_list('id', 'name', 'singular_name', 'plural_name'):
+        names.setdefault(name.lower(), pk)
+        for alias in (singular, plural):
+            if alias:
+                aliases.setdefault(alias.lower(), pk)
+
+    rows = []
+    for recipe in Recipe.objects.only('id', 'ingredients_text').iterator(chunk_size=1000):
+        for line in parse_ingredients_text(recipe.ingredients_text):
+            rows.append(RecipeIngredient(
+                recipe_id=recipe.id, section=line.section, position=line.position, raw=line.raw,
+                quantity=line.quantity, unit=line.unit, text=line.text, term=line.term,
+                glossary_id=names.get(line.term, aliases.get(line.term)),
+            ))
+        if len(rows) >= 5000:
+            RecipeIngredient.objects.bulk_create(rows, batch_size=500)
+            rows = []
+    RecipeIngredient.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(blank=True, default='', help_text='Heading of the # section, empty before the first heading', max_length=200)),
+                ('position', models.PositiveIntegerField(help_text='Order of the line in the recipe')),
+                ('raw', models.TextField(help_text='Line as written')),
+                ('quantity', models.FloatField(blank=True, help_text='Leading number of the line, if any', null=True)),
+                ('unit', models.CharField(blank=True, default='', help_text='Unit following the quantity, if recognized', max_length=30)),
+                ('text', models.TextField(help_text='Line without its quantity')),
+                ('term', models.CharField(blank=True, db_index=True, default='', help_text='Lowercase first [bracketed] term, or the whole text of a line without brackets', max_length=200)),
+                ('glossary', models.ForeignKey(blank=True, help_text='Glossary term the line resolves to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recipe_ingredients', to='recipes.glossary')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredients', to='recipes.recipe')),
+            ],
+            options={
+                'verbose_name': 'Recipe Ingredient',
+                'verbose_name_plural': 'Recipe Ingredients',
+                'ordering': ['recipe', 'position'],
+                'unique_together': {('recipe', 'position')},
+            },
+        ),
+        migrations.RunPython(parse_ingredients, migrations.RunPython.noop),
+    ]
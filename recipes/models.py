@@ -1 +1,760 @@
+from django.db import models
+from mptt.models import MPTTModel, TreeForeignKey
+from django.core.validators import MinValueValidator
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from django.utils.translation import gettext_lazy as _
+import logging
+import re
+from django.utils.html import format_html
+from django.contrib.auth.models import User
+from django.db.models import Count, F
+from .ingredients import TOKEN_RE, build_ingredient_rows, parse_ingredients_text
+from .matcher import get_term_matcher
+from .nutrition import NutritionEngine, daily_value_percentages, rebuild_recipe_nutrition
+from .profiling import traced
 
+
+logger = logging.getLogger(__name__)
+
+STATUS = (
+    (0, "Draft"),
+    (1, "Publish")
+)
+
+
+class Category(MPTTModel):
+    name = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=200, unique=True)
+    parent = TreeForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+
+    class MPTTMeta:
+        order_insertion_by = ['name']
+
+    class Meta:
+        verbose_name_plural = 'categories'
+        indexes = [
+            models.Index(fields=['tree_id', 'lft'], name='category_tree_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return reverse('category_detail', kwargs={'slug': self.slug})
+
+
+class GlossaryCategory(models.Model):
+    category_name = models.CharField(max_length=300, unique=True, null=True)
+    slug = models.SlugField(max_length=350, unique=True, null=True, blank=True)
+    description = models.TextField(null=True, blank=True)
+    created_on = models.DateTimeField(default=timezone.now)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Glossary Category'
+        verbose_name_plural = ' Glossary Categories'
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        if not self.slug:
+            self.slug = slugify(f"{self.category_name}")
+        super(GlossaryCategory, self).save(*args, **kwargs)
+
+    def get_url(self):
+        return reverse('glosarry_category', args=[self.slug])
+
+    def __str__(self):
+        return self.category_name
+
+
+class Nutrient(models.Model):
+    """Model to store nutritional information for glossary terms"""
+
+    NUTRIENT_TYPES = [
+        ('macro', 'Macronutrient'),
+        ('micro', 'Micronutrient'),
+        ('vitamin', 'Vitamin'),
+        ('mineral', 'Mineral'),
+        ('other', 'Other'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True, help_text="Name of the nutrient (e.g., 'Calories', 'Fat')")
+    unit = models.CharField(max_length=20, help_text="Unit of measurement (e.g., 'kcal', 'g', 'mg', 'mcg')")
+    nutrient_type = models.CharField(max_length=10, choices=NUTRIENT_TYPES, default='other', help_text="Type of nutrient")
+
+    class Meta:
+        verbose_name = 'Nutrient'
+        verbose_name_plural = 'Nutrients'
+    def __str__(self):
+        return self.name
+
+class Glossary(MPTTModel):
+    name = models.CharField(max_length=200)
+    singular_name = models.CharField(max_length=200, help_text="The singular form of the term (e.g., 'egg')", default='')
+    plural_name = models.CharField(max_length=200, help_text="The plural form of the term (e.g., 'eggs')", default='')
+    slug = models.SlugField(max_length=200, unique=True)
+    description = models.TextField()
+    category = models.ForeignKey(GlossaryCategory, on_delete=models.SET_NULL, null=True, blank=True)
+    parent = TreeForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Add nutrients relationship
+    nutrients = models.ManyToManyField(Nutrient, through='GlossaryNutrient', related_name='glossary_items')
+
+    def save(self, *args, **kwargs):
+        if not self.singular_name:
+            self.singular_name = self.name
+        if not self.plural_name:
+            self.plural_name = self.name + 's'
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        """
+        Returns the absolute URL for the glossary term.
+
+        Returns:
+            str: URL to the glossary term detail page
+        """
+
+        return reverse('glossary_detail', kwargs={'slug': self.slug})
+
+    def get_term_forms(self):
+        """
+        Returns the lowercase name, singular and plural forms used to write this term in recipes.
+
+        Returns:
+            set: Lowercase forms of the term
+        """
+        return {form.strip().lower() for form in (self.name, self.singular_name, self.plural_name) if form}
+
+    def get_parent_url_with_anchor(self):
+        """
+        Returns the absolute URL of the parent term with anchor to this term.
+
+        Returns:
+             str: URL to parent glossary term's detail page with anchor to this term.
+        """
+        if self.parent:
+            return f"{reverse('glossary_detail', kwargs={'slug': self.parent.slug})}#ing_{self.id}"
+        return self.get_absolute_url()
+
+    class MPTTMeta:
+        order_insertion_by = ['name']
+
+    class Meta:
+        verbose_name = 'Glossary Term'
+        verbose_name_plural = 'Glossary Terms'
+        indexes = [
+            models.Index(fields=['tree_id', 'lft'], name='glossary_tree_idx'),
+        ]
+
+class GlossaryNutrient(models.Model):
+    """Through model to manage nutrition values for each glossary item per 100g"""
+    glossary = models.ForeignKey(Glossary, on_delete=models.CASCADE)
+    nutrient = models.ForeignKey(Nutrient, on_delete=models.CASCADE)
+    value = models.FloatField(default=0, help_text="Value per 100g")
+
+    class Meta:
+        unique_together = ['glossary', 'nutrient']
+        verbose_name = 'Glossary Nutrient'
+        verbose_name_plural = 'Glossary Nutrients'
+
+    def __str__(self):
+        return f"{self.glossary.name} - {self.nutrient.name}"
+
+
+class Recipe(models.Model):
+    recipe_name = models.CharField(max_length=400, null=True, verbose_name=_("Recipe Name (English)"))
+    slug = models.SlugField(max_length=450, unique=True, null=True, blank=True, verbose_name=_("Slug (English)"))
+    title = models.CharField(max_length=400, null=True)
+    description = models.TextField()
+    ingredients_text = models.TextField(
+        help_text="Enter ingredients with quantities. Terms in [brackets] will be linked to glossary.", default='')
+    ingredients_html = models.TextField(blank=True, default='', editable=False,
+                                        help_text="Rendered ingredient list, regenerated when the recipe or its linked terms change")
+    instructions = models.TextField()
+    preparation_time = models.PositiveIntegerField(help_text="Time in minutes")
+    cooking_time = models.PositiveIntegerField(help_text="Time in minutes")
+    total_time = models.PositiveIntegerField(default=0, editable=False, db_index=True,
+                                             help_text="Preparation plus cooking time, kept for filtering")
+    servings = models.PositiveIntegerField()
+    image = models.ImageField(upload_to='recipes/', null=True, blank=True)
+    categories = models.ManyToManyField(Category, related_name='recipes')
+    related_terms = models.ManyToManyField(Glossary, blank=True, related_name='recipes')
+
+    DIFFICULTY_CHOICES = [
+        ('easy', 'Easy'),
+        ('medium', 'Medium'),
+        ('hard', 'Hard'),
+    ]
+    difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES, default='medium')
+    related_recipes = models.ManyToManyField('self', blank=True, related_name='related_to', symmetrical=False)
+    code = models.CharField(max_length=300, unique=True, null=True, blank=True, verbose_name=_("Recipe Code"))
+    views_count = models.PositiveIntegerField(default=0, null=True, blank=True, verbose_name=_("Views Count"))
+
+    # Approved review aggregates, kept up to date by review signals
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    status = models.IntegerField(choices=STATUS, default=0)
+
+    def save(self, *args, **kwargs):
+        self.total_time = self.calculate_total_time()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'preparation_time', 'cooking_time'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'total_time'}
+        elif update_fields is None and not self._state.adding and self.pk is not None:
+            # Signals re-render the stored HTML with update(); an instance loaded before must not write it back
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'ingredients_html' and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+    def calculate_total_time(self):
+        return (self.preparation_time or 0) + (self.cooking_time or 0)
+
+    def _create_link(self, item):
+        """
+        Creates the HTML link based on the item type.
+        """
+        if item['type'] == 'recipe':
+            return format_html('<a href="{}" class="recipe-link" data-bs-toggle="tooltip" title="View recipe">{}</a>', item['url'], item['original'])
+        else:
+            return format_html('<a href="{}" class="glossary-link" data-bs-toggle="tooltip" title="Click to view definition">{}</a>', item['url'], item['original'])
+
+    def _process_ingredient_part(self, part, matcher):
+        """Processes an ingredient part for term and recipe linking."""
+
+        term_matches = re.findall(r'\[(.*?)\]', part)
+        if not term_matches:
+            # Check if the entire part matches a term or recipe
+            item = matcher.lookup(part, exclude_recipe=self.id)
+            if item:
+                return self._create_link(item)
+            return part
+
+        # Process terms in brackets
+        processed_part = part
+        for term in term_matches:
+            item = matcher.lookup(term, exclude_recipe=self.id)
+            if item:
+                linked_term = self._create_link(item)
+                processed_part = processed_part.replace(f'[{term}]', linked_term)
+
+        return processed_part
+
+    def get_linked_ingredients(self):
+        """Convert ingredients text with [term] into HTML links to glossary terms or recipes."""
+
+        text = self.ingredients_text
+        matcher = get_term_matcher()
+
+        # Split text into lines
+        lines = text.split('\n')
+        processed_lines = []
+        for line in lines:
+            if not line.strip():
+                continue
+
+            or_parts = [part.strip() for part in line.split(' or ')]
+            processed_or_parts = [self._process_ingredient_part(part, matcher) for part in or_parts]
+            processed_line = ' or '.join(processed_or_parts)
+            processed_lines.append(format_html('<li class="list-group-item">{}</li>', processed_line))
+
+        # Wrap the processed lines in a list
+        return format_html('<ul class="list-group ingredients-list">{}</ul>', ''.join(processed_lines))
+
+    def get_ingredient_rows(self):
+        """
+        Returns the parsed ingredient lines of the recipe, in order.
+
+        Saved recipes read their RecipeIngredient rows; unsaved recipes, and
+        recipes saved before the rows existed, are parsed in memory.
+        """
+        if self.pk is not None:
+            rows = list(self.ingredients.all())
+            if rows or not self.ingredients_text:
+                return rows
+        return build_ingredient_rows(self)
+
+    def parse_ingredients(self):
+        """
+        Group the ingredient lines into sections with optional headings.
+
+        Returns:
+            list: Dicts with the section 'name' (None before the first
+                heading) and its 'ingredients' rows
+        """
+        sections = []
+        for row in self.get_ingredient_rows():
+            name = row.section or None
+            if not sections or sections[-1]['name'] != name:
+                sections.append({'name': name, 'ingredients': []})
+            sections[-1]['ingredients'].append(row)
+        return sections
+
+    def get_ingredient_terms(self):
+        """
+        Returns the lowercase terms written in [brackets] in the ingredients text.
+        """
+        return {term for ingredient in parse_ingredients_text(self.ingredients_text) for term in ingredient.terms}
+
+    @traced('recipe.ingredients')
+    def get_ingredients_with_sections(self):
+        """
+        Get the stored ingredient HTML, rendering it on first use.
+        """
+        if not self.ingredients_html and self.ingredients_text:
+            self.refresh_ingredients_html()
+        return self.ingredients_html
+
+    def refresh_ingredients_html(self):
+        """
+        Re-render the ingredient HTML and store it without touching updated_at.
+        """
+        self.ingredients_html = self.render_ingredients_with_sections()
+        Recipe.objects.filter(pk=self.pk).update(ingredients_html=self.ingredients_html)
+
+    @traced('recipe.render_ingredients')
+    def render_ingredients_with_sections(self):
+        """
+        Get ingredients with HTML formatting and section headings.
+        """
+        sections = self.parse_ingredients()
+        matcher = get_term_matcher()
+
+        processed_sections = []
+        for section in sections:
+            if section['name'] is None:
+                ingredients_html = '<ul class="list-group ingredients-list">'
+                for ingredient in section['ingredients']:
+                    processed_ingredient = self._get_linked_ingredient_single(ingredient, matcher)
+                    ingredients_html += str(processed_ingredient)
+                ingredients_html += '</ul>'
+                processed_sections.append(ingredients_html)
+            else:
+                section_html = '<div class="ingredient-section">'
+                section_html += f'<h5 class="ingredient-section-heading">{section["name"]}</h5>'
+
+                ingredients_html = '<ul class="list-group ingredients-list">'
+                for ingredient in section['ingredients']:
+                    processed_ingredient = self._get_linked_ingredient_single(ingredient, matcher)
+                    ingredients_html += str(processed_ingredient)
+                ingredients_html += '</ul>'
+
+                section_html += ingredients_html
+                section_html += '</div>'
+                processed_sections.append(section_html)
+
+        return ''.join(processed_sections)
+
+    def _get_linked_ingredient_single(self, ingredient, matcher=None):
+        """Render a single RecipeIngredient row with term linking and pluralization."""
+
+        if matcher is None:
+            matcher = get_term_matcher()
+
+        logger.debug('Processing ingredient: %s', ingredient.raw)
+
+        quantity_str = ingredient.quantity_text or "1"
+        quantity = ingredient.quantity if ingredient.quantity is not None else 1
+        processed_parts = [quantity_str]
+
+        # Split the ingredient text into parts, preserving terms in brackets
+        for part in TOKEN_RE.findall(ingredient.text):
+            part = part.strip()
+            if part.startswith('[') and part.endswith(']'):
+                term_name = part[1:-1].strip()
+                lower_term = term_name.lower()
+
+                logger.debug('Checking term: %s', lower_term)
+
+                item = matcher.lookup(lower_term, exclude_recipe=self.id)
+                if item:
+                    if item['type'] == 'recipe':
+                        part = f'<a href="{item["url"]}">{item["original"]}</a>'
+                    else:
+                        # Use the pluralized term based on quantity
+                        pluralized_term = self._get_pluralized_term(item, quantity)
+                        glossary_url = item['url']
+                        part = f'<a href="{glossary_url}">{pluralized_term}</a>'
+
+            processed_parts.append(part)
+
+        logger.debug('Processed parts: %s', processed_parts)
+
+        # Join the processed parts back together
+        processed_ingredient = ' '.join(processed_parts)
+        return f'<li class="list-group-item">{processed_ingredient}</li>'
+
+    def _get_pluralized_term(self, item, quantity):
+        """
+        Returns the singular or plural name of a glossary term based on quantity.
+
+        Args:
+            item (dict): Dictionary containing term information
+            quantity (float): The quantity of the ingredient
+
+        Returns:
+            str: Singular or plural name of the term
+        """
+        if not item:
+            return None
+
+        # If plural name is not provided, generate it
+        if not item.get('plural'):
+            if quantity > 1:
+                if item['singular'].endswith('y'):
+                    return item['singular'][:-1] + 'ies'
+                elif item['singular'].endswith('s'):
+                    return item['singular'] + 'es'
+                else:
+                    return item['singular'] + 's'
+            return item['singular']
+
+        # Use the stored plural name
+        if quantity > 1:
+            return item['plural']
+        return item['singular']
+
+    @traced('recipe.nutrition')
+    def get_nutritional_values(self, engine=None):
+        """Calculate and return nutritional values per serving and per plate."""
+
+        if engine is None:
+            engine = NutritionEngine()
+        nutrition = engine.stored_totals(self)
+
+        # Calculate per serving
+        per_serving = {key: value / self.servings for key, value in nutrition.items()}
+
+        return per_serving
+
+    @traced('recipe.nutrition_detail')
+    def get_detailed_nutritional_values(self, engine=None):
+        """Calculate and return all nutritional values for the recipe and the daily values."""
+
+        if engine is None:
+            engine = NutritionEngine()
+        total_nutrition = engine.stored_totals(self)
+
+        return {
+            'total': total_nutrition,
+            'daily_values': daily_value_percentages(total_nutrition)
+        }
+
+    def rebuild_nutrition(self):
+        """
+        Recalculate the stored RecipeNutrition rows of this recipe.
+        """
+        rebuild_recipe_nutrition([self])
+
+
+    def averageReview(self):
+        avg = 0
+        if self.review_count:
+            avg = self.rating_sum / self.review_count
+        return avg
+
+    def countReview(self):
+        return self.review_count
+
+    def get_star_counts(self):
+        """
+        Returns the number of approved reviews for each star rating.
+        """
+        return {star: getattr(self, f'rating_{star}_count') for star in range(5, 0, -1)}
+
+    def get_star_percentages(self):
+        """
+        Returns the share of approved reviews for each star rating, in percent.
+        """
+        return {
+            star: (count / self.review_count * 100) if self.review_count > 0 else 0
+            for star, count in self.get_star_counts().items()
+        }
+
+    def update_review_stats(self, count=0, rating_sum=0, stars=None):
+        """
+        Atomically add to the stored review aggregates.
+
+        Args:
+            count (int): Change in the number of approved reviews
+            rating_sum (int): Change in the sum of approved ratings
+            stars (dict): Change in review count keyed by star rating
+        """
+        changes = {'review_count': F('review_count') + count, 'rating_sum': F('rating_sum') + rating_sum}
+        for star, change in (stars or {}).items():
+            changes[f'rating_{star}_count'] = F(f'rating_{star}_count') + change
+        Recipe.objects.filter(pk=self.pk).update(**changes)
+
+    @classmethod
+    def recount_review_stats(cls, recipe_ids=None):
+        """
+        Recalculate stored review aggregates from the approved reviews.
+
+        Args:
+            recipe_ids (iterable, optional): Recipes to recount, or None for all
+
+        Returns:
+            int: Number of recipes whose stored aggregates were wrong
+        """
+        recipes = cls.objects.all()
+        reviews = RecipeReview.objects.filter(is_approved=True)
+        if recipe_ids is not None:
+            recipe_ids = list(recipe_ids)
+            recipes = recipes.filter(pk__in=recipe_ids)
+            reviews = reviews.filter(recipe_id__in=recipe_ids)
+
+        stats = {}
+        for row in reviews.values('recipe_id', 'rating').annotate(count=Count('id')):
+            recipe_stats = stats.setdefault(row['recipe_id'], {'review_count': 0, 'rating_sum': 0})
+            recipe_stats['review_count'] += row['count']
+            recipe_stats['rating_sum'] += row['rating'] * row['count']
+            if 1 <= row['rating'] <= 5:
+                recipe_stats[f'rating_{row["rating"]}_count'] = row['count']
+
+        fields = ['review_count', 'rating_sum'] + [f'rating_{star}_count' for star in range(1, 6)]
+        changed = []
+        for recipe in recipes.only('id', *fields):
+            expected = stats.get(recipe.pk, {})
+            if any(getattr(recipe, field) != expected.get(field, 0) for field in fields):
+                for field in fields:
+                    setattr(recipe, field, expected.get(field, 0))
+                changed.append(recipe)
+        cls.objects.bulk_update(changed, fields, batch_size=500)
+        return len(changed)
+
+    @staticmethod
+    def _related_limit(limit):
+        from .recommender import get_recommender_settings
+
+        return get_recommender_settings()['TOP_K'] if limit is None else limit
+
+    def _recommended_recipes(self, picked):
+        """
+        Precomputed recommendations for this recipe, best first, without the picked ids.
+        """
+        return (
+            Recipe.objects.filter(recommended_in__recipe=self)
+            .exclude(pk__in=picked)
+            .order_by('recommended_in__rank')
+        )
+
+    @traced('recipe.related')
+    def get_related_recipes(self, limit=None):
+        """
+        Returns hand-picked related recipes followed by precomputed recommendations.
+
+        Args:
+            limit (int, optional): Maximum number of recipes, TOP_K by default
+        """
+        limit = self._related_limit(limit)
+        related = list(self.related_recipes.all()[:limit])
+        if len(related) < limit:
+            recommended = self._recommended_recipes([recipe.pk for recipe in related])
+            related += list(recommended[:limit - len(related)])
+        return related
+
+    @traced('recipe.related')
+    async def aget_related_recipes(self, limit=None):
+        """
+        Async version of get_related_recipes(), sharing its querysets.
+        """
+        limit = self._related_limit(limit)
+        related = [recipe async for recipe in self.related_recipes.all()[:limit]]
+        if len(related) < limit:
+            recommended = self._recommended_recipes([recipe.pk for recipe in related])
+            related += [recipe async for recipe in recommended[:limit - len(related)]]
+        return related
+
+
+    def get_absolute_url(self):
+        return reverse('recipe_detail', args=[self.slug])
+
+    def get_calories_detail_url(self):
+        return reverse('recipe_calories_detail', args=[self.slug])
+
+
+    def __str__(self):
+        return self.recipe_name
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='recipe_created_id_idx'),
+        ]
+
+
+class RecipeNutrition(models.Model):
+    """Stored nutrition totals per recipe and nutrient, rebuilt when ingredients or values change"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='nutrition')
+    nutrient = models.ForeignKey(Nutrient, on_delete=models.CASCADE, related_name='recipe_totals')
+    total = models.FloatField(default=0, help_text="Total value for the whole recipe")
+    per_serving = models.FloatField(null=True, blank=True, help_text="Total divided by servings")
+    daily_value = models.FloatField(default=0, help_text="Percentage of the recommended daily value")
+
+    class Meta:
+        unique_together = ['recipe', 'nutrient']
+        indexes = [
+            models.Index(fields=['nutrient', 'total']),
+            models.Index(fields=['nutrient', 'per_serving']),
+        ]
+        verbose_name = 'Recipe Nutrition'
+        verbose_name_plural = 'Recipe Nutrition'
+
+    def __str__(self):
+        return f"{self.recipe} - {self.nutrient.name}"
+
+
+class RecipeIngredientTerm(models.Model):
+    """Reverse index of the [bracketed] terms used in each recipe's ingredients"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredient_terms')
+    term = models.CharField(max_length=200, db_index=True, help_text="Lowercase term as written in brackets")
+
+    class Meta:
+        unique_together = ['recipe', 'term']
+        verbose_name = 'Recipe Ingredient Term'
+        verbose_name_plural = 'Recipe Ingredient Terms'
+
+    def __str__(self):
+        return f"{self.recipe} - {self.term}"
+
+
+class RecipeIngredient(models.Model):
+    """One ingredient line of a recipe, parsed from its ingredients text when the recipe is saved"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredients')
+    section = models.CharField(max_length=200, blank=True, default='',
+                               help_text="Heading of the # section, empty before the first heading")
+    position = models.PositiveIntegerField(help_text="Order of the line in the recipe")
+    raw = models.TextField(help_text="Line as written")
+    quantity = models.FloatField(null=True, blank=True, help_text="Leading number of the line, if any")
+    unit = models.CharField(max_length=30, blank=True, default='', help_text="Unit following the quantity, if recognized")
+    text = models.TextField(help_text="Line without its quantity")
+    term = models.CharField(max_length=200, blank=True, default='', db_index=True,
+                            help_text="Lowercase first [bracketed] term, or the whole text of a line without brackets")
+    glossary = models.ForeignKey(Glossary, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='recipe_ingredients', help_text="Glossary term the line resolves to")
+
+    class Meta:
+        ordering = ['recipe', 'position']
+        unique_together = ['recipe', 'position']
+        verbose_name = 'Recipe Ingredient'
+        verbose_name_plural = 'Recipe Ingredients'
+
+    def __str__(self):
+        return f"{self.recipe} - {self.raw}"
+
+    @property
+    def quantity_text(self):
+        """
+        The quantity as written, e.g. '1.50', or '' when the line has none.
+        """
+        if self.quantity is None:
+            return ''
+        return self.raw[:len(self.raw) - len(self.text)].strip()
+
+
+class RecipeRecommendation(models.Model):
+    """Precomputed nearest neighbours of each recipe by shared terms and categories"""
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recommended_in')
+    score = models.FloatField(help_text="Cosine similarity between the two recipes")
+    rank = models.PositiveSmallIntegerField(help_text="Position in the recipe's list, starting at 1")
+
+    class Meta:
+        unique_together = ['recipe', 'recommended']
+        indexes = [
+            models.Index(fields=['recipe', 'rank']),
+        ]
+        ordering = ['recipe', 'rank']
+        verbose_name = 'Recipe Recommendation'
+        verbose_name_plural = 'Recipe Recommendations'
+
+    def __str__(self):
+        return f"{self.recipe} - {self.recommended}"
+
+
+class ImageDerivative(models.Model):
+    """Resized copy of an uploaded image, named after a hash of the original's content"""
+    source = models.CharField(max_length=255, db_index=True, help_text="Storage name of the original image")
+    digest = models.CharField(max_length=64, help_text="SHA-256 of the original image")
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    format = models.CharField(max_length=10, help_text="webp or jpeg")
+    name = models.CharField(max_length=255, help_text="Storage name of the derivative")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['source', 'format', 'width']
+        ordering = ['source', 'format', 'width']
+        verbose_name = 'Image Derivative'
+        verbose_name_plural = 'Image Derivatives'
+
+    def __str__(self):
+        return f"{self.source} - {self.width}w {self.format}"
+
+
+class RecipeReview(models.Model):
+    RATING = [(i, str(i)) for i in range(1, 6)]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='reviews')
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+
+    # Guest reviewer fields
+    name = models.CharField(max_length=100, blank=True, null=True,
+                            help_text="Name of the reviewer if not logged in")
+    email = models.EmailField(blank=True, null=True,
+                              help_text="Email of the reviewer if not logged in")
+
+    rating = models.IntegerField(choices=RATING, default=5)
+    review_text = models.TextField(blank=True, null=True)
+    ip = models.CharField(max_length=20, blank=True)
+    is_approved = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('recipe', 'user'), ('recipe', 'email')]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Review for {self.recipe.recipe_name} by {self.get_reviewer_name()}"
+
+    def get_reviewer_name(self):
+        """
+        Return the name of the reviewer, prioritizing username or provided name
+        """
+        if self.user:
+            return self.user.username
+        return self.name or 'Anonymous'
+
+class ReviewReply(models.Model):
+    review = models.ForeignKey(RecipeReview, on_delete=models.CASCADE, related_name='replies')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    reply_text = models.TextField()
+    ip = models.CharField(max_length=20, blank=True)
+    is_approved = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Reply to review of {self.review.recipe.recipe_name}"
+
+    class Meta:
+        ordering = ['created_at']
@@ -0,0 +1,353 @@
+from array import array
+
+from django.db import connection, transaction
+
+from .ingredients import LOOKUP_CHUNK_SIZE, glossary_ids_for, parse_ingredients_text
+
+
+DAILY_VALUES = {
+    'calories': 2000,
+    'fat': 78,
+    'saturates': 20,
+    'carbs': 275,
+    'sugars': 50,
+    'fiber': 28,
+    'protein': 50,
+    'salt': 6,
+    'cholesterol': 300,
+    'vitamin a': 900,
+    'vitamin c': 90,
+    'vitamin d': 20,
+    'vitamin e': 15,
+    'vitamin k': 120,
+    'vitamin b6': 1.7,
+    'vitamin b12': 2.4,
+    'calcium': 1300,
+    'iron': 18,
+    'magnesium': 420,
+    'phosphorus': 1250,
+    'potassium': 4700,
+    'sodium': 2300,
+    'zinc': 11,
+}
+
+def daily_value_percentages(total_nutrition):
+    """
+    Returns the percentage of the recommended daily value for each nutrient.
+    """
+    return {
+        key: (value / DAILY_VALUES[key]) * 100 if key in DAILY_VALUES else 0
+        for key, value in total_nutrition.items()
+    }
+
+
+class NutritionEngine:
+    """
+    Sums glossary nutrient values for recipes with a fixed number of queries.
+
+    Nutrient totals are kept in an array indexed by the position of each
+    Nutrient id. Ingredient lines come from the RecipeIngredient rows, which
+    already point at their glossary term, so a batch needs one query for
+    the rows and one for the nutrient values.
+    """
+
+    def __init__(self, nutrients=None):
+        from .models import Nutrient
+
+        if nutrients is None:
+            nutrients = Nutrient.objects.all()
+        self.nutrients = list(nutrients)
+        self.index = {nutrient.id: i for i, nutrient in enumerate(self.nutrients)}
+        self.names = [nutrient.name.lower() for nutrient in self.nutrients]
+
+    def empty_vector(self):
+        return array('d', bytes(8 * len(self.nutrients)))
+
+    def load_values(self, glossary_ids):
+        """
+        Fetch the nutrient values of glossary terms.
+
+        Args:
+            glossary_ids (set): Glossary ids
+
+        Returns:
+            dict: Glossary id mapped to a list of (vector index, value per 100g)
+        """
+        from .models import GlossaryNutrient
+
+        glossary_ids = sorted(glossary_ids)
+        values = {}
+        for start in range(0, len(glossary_ids), LOOKUP_CHUNK_SIZE):
+            rows = GlossaryNutrient.objects.filter(
+                glossary_id__in=glossary_ids[start:start + LOOKUP_CHUNK_SIZE]
+            ).values_list('glossary_id', 'nutrient_id', 'value')
+            for glossary_id, nutrient_id, value in rows:
+                if nutrient_id in self.index:
+                    values.setdefault(glossary_id, []).append((self.index[nutrient_id], value))
+        return values
+
+    def ingredient_quantities(self, recipes):
+        """
+        Returns the (glossary id, quantity) pairs of each recipe's ingredient lines.
+
+        Quantities come from the stored RecipeIngredient rows; lines without
+        a leading number count as a quantity of 1. Recipes without rows yet
+        are parsed from their ingredients_text.
+
+        Args:
+            recipes (list): Recipe instances
+
+        Returns:
+            dict: Recipe pk mapped to a list of (glossary id, quantity) tuples
+        """
+        from .models import RecipeIngredient
+
+        quantities = {recipe.pk: [] for recipe in recipes}
+        saved = sorted(recipe.pk for recipe in recipes if recipe.pk is not None)
+        with_rows = set()
+        for start in range(0, len(saved), LOOKUP_CHUNK_SIZE):
+            rows = RecipeIngredient.objects.filter(
+                recipe_id__in=saved[start:start + LOOKUP_CHUNK_SIZE]
+            ).values_list('recipe_id', 'glossary_id', 'quantity')
+            for recipe_id, glossary_id, quantity in rows:
+                with_rows.add(recipe_id)
+                if glossary_id is not None:
+                    quantities[recipe_id].append((glossary_id, 1 if quantity is None else quantity))
+
+        parsed = {
+            recipe.pk: parse_ingredients_text(recipe.ingredients_text)
+            for recipe in recipes if recipe.pk not in with_rows and recipe.ingredients_text
+        }
+        if parsed:
+            glossary_ids = glossary_ids_for({ingredient.term for lines in parsed.values() for ingredient in lines})
+            for pk, lines in parsed.items():
+                quantities[pk] = [
+                    (glossary_ids[ingredient.term], 1 if ingredient.quantity is None else ingredient.quantity)
+                    for ingredient in lines if ingredient.term in glossary_ids
+                ]
+        return quantities
+
+    def totals(self, recipes):
+        """
+        Calculate the total nutrient vector of several recipes.
+
+        Args:
+            recipes (iterable): Recipe instances
+
+        Returns:
+            dict: Recipe pk mapped to its total nutrient vector
+        """
+        quantities = self.ingredient_quantities(list(recipes))
+        term_values = self.load_values({glossary_id for pairs in quantities.values() for glossary_id, _ in pairs})
+
+        totals = {}
+        for pk, pairs in quantities.items():
+            vector = self.empty_vector()
+            for glossary_id, quantity in pairs:
+                for i, value in term_values.get(glossary_id, ()):
+                    vector[i] += (value / 100) * quantity
+            totals[pk] = vector
+        return totals
+
+    def as_dict(self, vector):
+        """
+        Convert a nutrient vector to a dict keyed by lowercase nutrient name.
+        """
+        return {name: value if value else 0 for name, value in zip(self.names, vector)}
+
+    def recipe_totals(self, recipe):
+        """
+        Returns the total nutrition of a single recipe keyed by nutrient name.
+        """
+        return self.as_dict(self.totals([recipe])[recipe.pk])
+
+    def nutrition_rows(self, recipes):
+        """
+        Calculate the RecipeNutrition rows of several recipes.
+
+        Args:
+            recipes (iterable): Recipe instances with ingredients_text and servings loaded
+
+        Returns:
+            list: (recipe_id, nutrient_id, total, per_serving, daily_value) tuples
+        """
+        recipes = list(recipes)
+        totals = self.totals(recipes)
+        rows = []
+        for recipe in recipes:
+            vector = totals[recipe.pk]
+            for nutrient, name, value in zip(self.nutrients, self.names, vector):
+                per_serving = value / recipe.servings if recipe.servings else None
+                daily_value = (value / DAILY_VALUES[name]) * 100 if name in DAILY_VALUES else 0
+                rows.append((recipe.pk, nutrient.id, value, per_serving, daily_value))
+        return rows
+
+    def stored_totals(self, recipe):
+        """
+        Read the stored total nutrition of a recipe, calculating it when incomplete.
+
+        Nothing is written here: rows are stored by the recipe save signal and
+        the rebuild_nutrition command, so page views never write.
+
+        Returns:
+            dict: Total value keyed by lowercase nutrient name
+        """
+        from .models import RecipeNutrition
+
+        if recipe.pk is None:
+            return self.recipe_totals(recipe)
+
+        stored = dict(RecipeNutrition.objects.filter(recipe=recipe).values_list('nutrient_id', 'total'))
+        if stored.keys() != self.index.keys():
+            # Missing rows, or nutrients added since the last rebuild
+            return self.recipe_totals(recipe)
+
+        vector = self.empty_vector()
+        for nutrient_id, total in stored.items():
+            vector[self.index[nutrient_id]] = total
+        return self.as_dict(vector)
+
+
+def store_nutrition_rows(rows, recipe_ids=None, batch_size=1000):
+    """
+    Replace stored RecipeNutrition rows with freshly calculated ones.
+
+    Args:
+        rows (list): Tuples returned by NutritionEngine.nutrition_rows
+        recipe_ids (list): Recipes whose rows are replaced, or None for all recipes
+        batch_size (int): Rows sent per executemany call
+    """
+    from .models import RecipeNutrition
+
+    table = connection.ops.quote_name(RecipeNutrition._meta.db_table)
+    columns = ', '.join(
+        connection.ops.quote_name(RecipeNutrition._meta.get_field(name).column)
+        for name in ('recipe', 'nutrient', 'total', 'per_serving', 'daily_value')
+    )
+    sql = f'INSERT INTO {table} ({columns}) VALUES (%s, %s, %s, %s, %s)'
+
+    with transaction.atomic():
+        existing = RecipeNutrition.objects.all()
+        if recipe_ids is not None:
+            existing = existing.filter(recipe_id__in=recipe_ids)
+        existing.delete()
+        # Plain executemany, building model instances dominates for large rebuilds
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                cursor.executemany(sql, rows[start:start + batch_size])
+
+
+def rebuild_recipe_nutrition(recipes, engine=None):
+    """
+    Recalculate and store the nutrition of the given recipes.
+
+    Args:
+        recipes (iterable): Recipe instances or a Recipe queryset
+        engine (NutritionEngine, optional): Engine to reuse
+    """
+    if engine is None:
+        engine = NutritionEngine()
+    recipes = [recipe for recipe in recipes if recipe.pk is not None]
+    if not recipes:
+        return
+    store_nutrition_rows(engine.nutrition_rows(recipes), [recipe.pk for recipe in recipes])
+
+
+def _recipe_id_chunks(recipe_ids, chunk_size):
+    """
+    Yield (SQL condition on a recipe id column, its params, ORM lookups) for each chunk of recipes.
+
+    Given ids go in IN lists small enough for SQLite's variable limit; every
+    recipe is walked in consecutive id ranges instead.
+    """
+    from .models import Recipe
+
+    if recipe_ids is not None:
+        recipe_ids = sorted(set(recipe_ids))
+        for start in range(0, len(recipe_ids), LOOKUP_CHUNK_SIZE):
+            chunk = recipe_ids[start:start + LOOKUP_CHUNK_SIZE]
+            yield f'IN ({", ".join(["%s"] * len(chunk))})', chunk, {'id__in': chunk}
+        return
+    last = 0
+    while True:
+        chunk = list(Recipe.objects.filter(id__gt=last).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not chunk:
+            return
+        yield 'BETWEEN %s AND %s', [chunk[0], chunk[-1]], {'id__range': (chunk[0], chunk[-1])}
+        last = chunk[-1]
+
+
+def rebuild_catalog_nutrition(recipe_ids=None, chunk_size=2000):
+    """
+    Recalculate and store the nutrition of many recipes inside the database.
+
+    Recipe totals are the product of a sparse recipe x glossary matrix of
+    ingredient quantities (the RecipeIngredient rows) and a glossary x
+    nutrient matrix of values per 100g (the GlossaryNutrient rows). The
+    database computes that product as a join and GROUP BY and writes the
+    RecipeNutrition rows with one INSERT ... SELECT per chunk, so no recipe
+    or row passes through Python. Results match NutritionEngine.nutrition_rows.
+
+    Recipes with ingredients text but no RecipeIngredient rows yet, e.g.
+    loaded from a fixture, are parsed first.
+
+    Args:
+        recipe_ids (iterable, optional): Recipes to rebuild; every recipe when not given
+        chunk_size (int): Recipes written per transaction when rebuilding every
+            recipe, keeping write locks short
+
+    Returns:
+        int: Number of RecipeNutrition rows written
+    """
+    from .ingredients import sync_recipe_ingredients
+    from .models import GlossaryNutrient, Nutrient, Recipe, RecipeIngredient, RecipeNutrition
+
+    def table(model):
+        return connection.ops.quote_name(model._meta.db_table)
+
+    def column(model, name):
+        return connection.ops.quote_name(model._meta.get_field(name).column)
+
+    # Daily value percentage as a factor per nutrient, matched by name like nutrition_rows()
+    factors = [
+        (pk, 100 / DAILY_VALUES[name.lower()])
+        for pk, name in Nutrient.objects.values_list('id', 'name') if name.lower() in DAILY_VALUES
+    ]
+    nutrient_id = f'n.{column(Nutrient, "id")}'
+    daily_factor = f'CASE {nutrient_id} {"WHEN %s THEN %s " * len(factors)}ELSE 0 END' if factors else '0'
+    factor_params = [value for factor in factors for value in factor]
+
+    columns = ', '.join(column(RecipeNutrition, name) for name in ('recipe', 'nutrient', 'total', 'per_serving', 'daily_value'))
+    ri_recipe, ri_glossary, ri_quantity = (column(RecipeIngredient, name) for name in ('recipe', 'glossary', 'quantity'))
+    gn_glossary, gn_nutrient, gn_value = (column(GlossaryNutrient, name) for name in ('glossary', 'nutrient', 'value'))
+    recipe_id, servings = (f'r.{column(Recipe, name)}' for name in ('id', 'servings'))
+
+    written = 0
+    for condition, params, lookups in _recipe_id_chunks(recipe_ids, chunk_size):
+        sql = f"""
+            INSERT INTO {table(RecipeNutrition)} ({columns})
+            SELECT {recipe_id}, {nutrient_id}, COALESCE(t.total, 0),
+                   CASE WHEN {servings} > 0 THEN COALESCE(t.total, 0) / {servings} END,
+                   COALESCE(t.total, 0) * {daily_factor}
+            FROM {table(Recipe)} r
+            CROSS JOIN {table(Nutrient)} n
+            LEFT JOIN (
+                SELECT ri.{ri_recipe} AS recipe_id, gn.{gn_nutrient} AS nutrient_id,
+                       SUM(gn.{gn_value} / 100 * COALESCE(ri.{ri_quantity}, 1)) AS total
+                FROM {table(RecipeIngredient)} ri
+                INNER JOIN {table(GlossaryNutrient)} gn ON gn.{gn_glossary} = ri.{ri_glossary}
+                WHERE ri.{ri_recipe} {condition}
+                GROUP BY ri.{ri_recipe}, gn.{gn_nutrient}
+            ) t ON t.recipe_id = {recipe_id} AND t.nutrient_id = {nutrient_id}
+            WHERE {recipe_id} {condition}
+        """
+        unparsed = Recipe.objects.filter(**lookups).exclude(ingredients_text='').filter(ingredients__isnull=True)
+        with transaction.atomic():
+            for recipe in unparsed.only('id', 'ingredients_text'):
+                sync_recipe_ingredients(recipe)
+            existing = RecipeNutrition.objects.filter(**{f'recipe__{key}': value for key, value in lookups.items()})
+            existing._raw_delete(existing.db)
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [*factor_params, *params, *params])
+                written += cursor.rowcount
+    return written
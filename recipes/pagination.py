@@ -0,0 +1,189 @@
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .cache import get_cache
+
+
+def get_pagination_settings():
+    """
+    Returns the RECIPES_PAGINATION settings merged with their defaults.
+    """
+    options = {
+        'MODE': 'page',
+        'COUNT_CACHE_TIMEOUT': 300,
+    }
+    options.update(getattr(settings, 'RECIPES_PAGINATION', {}))
+    return options
+
+
+def use_cursor_pagination(request):
+    """
+    Cursor pagination is used when configured, or when the request already carries a cursor.
+    """
+    return get_pagination_settings()['MODE'] == 'cursor' or 'cursor' in request.GET
+
+
+def cached_count(queryset, scopes=()):
+    """
+    Count a queryset, caching the result for COUNT_CACHE_TIMEOUT seconds.
+
+    Args:
+        queryset (QuerySet): Queryset to count
+        scopes (iterable): Cache scopes whose invalidation should drop the count
+
+    Returns:
+        int: Number of rows
+    """
+    cache = get_cache()
+    sql, params = queryset.query.sql_with_params()
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    key = cache.make_key('count', scopes, digest)
+    return cache.get_or_set(key, queryset.count, get_pagination_settings()['COUNT_CACHE_TIMEOUT'])
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator whose total count is served from the page cache tiers.
+    """
+
+    def __init__(self, object_list, per_page, scopes=(), **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.scopes = scopes
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.scopes)
+
+
+class CursorPage:
+    """
+    One page of keyset-paginated results.
+
+    Iterates like a Paginator page and exposes opaque cursors for the
+    neighbouring pages instead of page numbers.
+    """
+
+    def __init__(self, object_list, next_cursor, previous_cursor, paginator):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.paginator = paginator
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset paginator that seeks on the ordering columns instead of using OFFSET.
+
+    Every page costs one indexed range query, however deep it is. The
+    ordering must be unique, so end it with the primary key, and it should
+    match a composite index.
+
+    Args:
+        queryset (QuerySet): Queryset to paginate
+        per_page (int): Number of objects per page
+        ordering (tuple): Field names, '-' prefixed for descending order
+        scopes (tuple): Cache scopes used for the optional total count
+    """
+
+    def __init__(self, queryset, per_page, ordering, scopes=()):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+        self.scopes = scopes
+
+    @cached_property
+    def count(self):
+        """
+        Total number of objects, cached between requests. Only computed when used.
+        """
+        return cached_count(self.queryset, self.scopes)
+
+    def _fields(self):
+        return [(name.lstrip('-'), name.startswith('-')) for name in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = []
+        for name, _ in self._fields():
+            field = self.queryset.model._meta.get_field(name)
+            values.append(field.value_to_string(obj))
+        payload = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """
+        Returns (direction, values), or (None, None) for a missing or malformed cursor.
+        """
+        if not cursor:
+            return None, None
+        try:
+            payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, raw_values = json.loads(payload)
+            if direction not in ('next', 'previous') or len(raw_values) != len(self.ordering):
+                return None, None
+            values = [
+                self.queryset.model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self._fields(), raw_values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            return None, None
+        return direction, values
+
+    def _seek(self, values, forward):
+        """
+        Build the filter for rows after (or before) the cursor in ordering terms.
+        """
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), values):
+            after = descending == forward
+            lookup = f'{name}__lt' if after else f'{name}__gt'
+            condition |= Q(**equal, **{lookup: value})
+            equal[name] = value
+        return condition
+
+    def get_page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor)
+
+        if direction == 'previous':
+            reverse_ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+            rows = list(self.queryset.filter(self._seek(values, forward=False)).order_by(*reverse_ordering)[:self.per_page + 1])
+            has_more = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next, has_previous = True, has_more
+        else:
+            queryset = self.queryset.order_by(*self.ordering)
+            if direction == 'next':
+                queryset = queryset.filter(self._seek(values, forward=True))
+            rows = list(queryset[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = direction == 'next'
+
+        next_cursor = self.encode_cursor(rows[-1], 'next') if rows and has_next else None
+        previous_cursor = self.encode_cursor(rows[0], 'previous') if rows and has_previous else None
+        return CursorPage(rows, next_cursor, previous_cursor, self)
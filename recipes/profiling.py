@@ -0,0 +1,456 @@
+"""
+Per-request profiling: wall time, SQL and named spans for a sample of requests.
+
+ProfilingMiddleware times a sampled request and wraps every database
+connection to count its queries, their time and how often the same
+statement shape repeats. Code on the request path reports into spans:
+
+    with span('nutrition.totals'):
+        ...
+
+    @traced('recipe.ingredients')
+    def get_ingredients_with_sections(self):
+        ...
+
+Spans and queries cost one context variable lookup when the request is not
+sampled. Totals are kept per route in this process and exported as JSON or
+Prometheus text by profiling_stats_view. Requests over their route's query
+budget, with repeated statements or slower than SLOW_MS are logged with
+their worst queries and spans, and the last ones are kept as reports.
+"""
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds of the request duration histogram
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*%s\s*,)*\s*%s\s*\)', re.IGNORECASE)
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE_RE = re.compile(r'\s+')
+
+_current = ContextVar('recipes_profile', default=None)
+
+
+def get_profiling_settings():
+    """
+    Returns the RECIPES_PROFILING settings merged with their defaults.
+    """
+    options = {
+        'ENABLED': True,
+        'SAMPLE_RATE': 0.1,
+        'QUERY_BUDGET': 50,
+        'ROUTE_BUDGETS': {},
+        'DUPLICATE_THRESHOLD': 3,
+        'SLOW_MS': 500,
+        'REPORTS': 50,
+        # Addresses that may read profiling_stats_view without a staff login. Behind a
+        # reverse proxy every request has the proxy's REMOTE_ADDR, so none by default.
+        'ALLOWED_IPS': [],
+    }
+    options.update(getattr(settings, 'RECIPES_PROFILING', {}))
+    return options
+
+
+def fingerprint(sql):
+    """
+    Returns the shape of a SQL statement, without its literals or the length of its IN lists.
+    """
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    sql = _LITERAL_RE.sub('?', sql)
+    return _SPACE_RE.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """
+    Measurements of one sampled request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0
+        self.queries = 0
+        self.sql_time = 0
+        self.fingerprints = Counter()
+        self.fingerprint_time = Counter()
+        self.spans = Counter()
+        self.span_calls = Counter()
+        # Async views may query from several threads at once
+        self._lock = threading.Lock()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            shape = fingerprint(sql)
+            with self._lock:
+                self.queries += 1
+                self.sql_time += elapsed
+                self.fingerprints[shape] += 1
+                self.fingerprint_time[shape] += elapsed
+
+    def add_span(self, name, elapsed):
+        with self._lock:
+            self.spans[name] += elapsed
+            self.span_calls[name] += 1
+
+    def duplicates(self, threshold):
+        """
+        Returns the statement shapes run at least threshold times, most frequent first.
+        """
+        return [(shape, count) for shape, count in self.fingerprints.most_common() if count >= threshold]
+
+
+class span:
+    """
+    Time a block of code into the current request profile.
+    """
+
+    __slots__ = ('name', 'profile', 'started')
+
+    def __init__(self, name):
+        self.name = name
+        self.profile = None
+
+    def __enter__(self):
+        self.profile = _current.get()
+        if self.profile is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile is not None:
+            self.profile.add_span(self.name, time.perf_counter() - self.started)
+            self.profile = None
+
+
+def traced(name):
+    """
+    Decorator recording every call of a function as a span.
+
+    Args:
+        name (str): Span name, e.g. 'recipe.ingredients'
+    """
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                profile = _current.get()
+                if profile is None:
+                    return await func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    profile.add_span(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.add_span(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class ProfileRegistry:
+    """
+    Per-route totals of the sampled requests of this process, and the latest slow-path reports.
+    """
+
+    def __init__(self, reports=50):
+        self._lock = threading.Lock()
+        self.routes = {}
+        self.spans = {}
+        self.reports = deque(maxlen=reports)
+
+    def _route(self, route):
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = {
+                'requests': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'queries': 0,
+                'max_queries': 0,
+                'sql_seconds': 0.0,
+                'duplicate_queries': 0,
+                'over_budget': 0,
+                'buckets': [0] * len(DURATION_BUCKETS),
+            }
+        return stats
+
+    def record(self, route, profile, duplicates, over_budget):
+        with self._lock:
+            stats = self._route(route)
+            stats['requests'] += 1
+            stats['seconds'] += profile.duration
+            stats['max_seconds'] = max(stats['max_seconds'], profile.duration)
+            stats['queries'] += profile.queries
+            stats['max_queries'] = max(stats['max_queries'], profile.queries)
+            stats['sql_seconds'] += profile.sql_time
+            stats['duplicate_queries'] += sum(count - 1 for _, count in duplicates)
+            stats['over_budget'] += int(over_budget)
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if profile.duration <= bound:
+                    stats['buckets'][index] += 1
+                    break
+            for name, seconds in profile.spans.items():
+                span_stats = self.spans.setdefault(name, {'calls': 0, 'seconds': 0.0})
+                span_stats['calls'] += profile.span_calls[name]
+                span_stats['seconds'] += seconds
+
+    def add_report(self, report):
+        with self._lock:
+            self.reports.append(report)
+
+    def as_dict(self):
+        with self._lock:
+            routes = {}
+            for route, stats in sorted(self.routes.items()):
+                requests = stats['requests']
+                routes[route] = {
+                    'requests': requests,
+                    'mean_ms': stats['seconds'] / requests * 1000,
+                    'max_ms': stats['max_seconds'] * 1000,
+                    'mean_queries': stats['queries'] / requests,
+                    'max_queries': stats['max_queries'],
+                    'mean_sql_ms': stats['sql_seconds'] / requests * 1000,
+                    'duplicate_queries': stats['duplicate_queries'],
+                    'over_budget': stats['over_budget'],
+                }
+            spans = {
+                name: {'calls': stats['calls'], 'mean_ms': stats['seconds'] / stats['calls'] * 1000}
+                for name, stats in sorted(self.spans.items())
+            }
+            return {'routes': routes, 'spans': spans, 'reports': list(self.reports)}
+
+    def as_prometheus(self):
+        """
+        Returns the totals in the Prometheus text exposition format.
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape_label(label)}"' for key, label in labels)
+                lines.append(f'{name}{{{label_text}}} {value:g}' if label_text else f'{name} {value:g}')
+
+        with self._lock:
+            routes = sorted(self.routes.items())
+            spans = sorted(self.spans.items())
+
+            lines.append('# HELP recipes_request_duration_seconds Wall time of sampled requests.')
+            lines.append('# TYPE recipes_request_duration_seconds histogram')
+            for route, stats in routes:
+                label = f'route="{_escape_label(route)}"'
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                    cumulative += count
+                    lines.append(f'recipes_request_duration_seconds_bucket{{{label},le="{bound:g}"}} {cumulative}')
+                lines.append(f'recipes_request_duration_seconds_bucket{{{label},le="+Inf"}} {stats["requests"]}')
+                lines.append(f'recipes_request_duration_seconds_sum{{{label}}} {stats["seconds"]:g}')
+                lines.append(f'recipes_request_duration_seconds_count{{{label}}} {stats["requests"]}')
+
+            metric('recipes_sql_queries_total', 'counter', 'SQL queries of sampled requests.',
+                   [((('route', route),), stats['queries']) for route, stats in routes])
+            metric('recipes_sql_seconds_total', 'counter', 'SQL time of sampled requests.',
+                   [((('route', route),), stats['sql_seconds']) for route, stats in routes])
+            metric('recipes_duplicate_queries_total', 'counter', 'Repeated statements of sampled requests.',
+                   [((('route', route),), stats['duplicate_queries']) for route, stats in routes])
+            metric('recipes_query_budget_exceeded_total', 'counter', 'Sampled requests over their query budget.',
+                   [((('route', route),), stats['over_budget']) for route, stats in routes])
+            metric('recipes_span_calls_total', 'counter', 'Calls of profiled code paths.',
+                   [((('span', name),), stats['calls']) for name, stats in spans])
+            metric('recipes_span_seconds_total', 'counter', 'Time spent in profiled code paths.',
+                   [((('span', name),), stats['seconds']) for name, stats in spans])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the process-wide ProfileRegistry.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ProfileRegistry(reports=get_profiling_settings()['REPORTS'])
+    return _registry
+
+
+def route_name(request):
+    """
+    Returns the URL name of the view that handled the request, or its route pattern.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match.route or '<unnamed>'
+
+
+def query_budget(route, options):
+    return options['ROUTE_BUDGETS'].get(route, options['QUERY_BUDGET'])
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """
+    Database execute wrapper reporting queries into the current request profile, if any.
+    """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile.execute_wrapper(execute, sql, params, many, context)
+
+
+def install_execute_wrapper(connection, **kwargs):
+    """
+    Add execute_wrapper to a database connection, once.
+
+    Connected to connection_created because each thread has its own
+    connections, including the threads that run the ORM calls of async views.
+    It goes first in the list, so it is not the one popped by the
+    connection.execute_wrapper() context manager.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+def is_local_request(request):
+    """
+    Whether the request comes from an address in ALLOWED_IPS, allowed to read the profiling endpoint without logging in.
+    """
+    return request.META.get('REMOTE_ADDR') in get_profiling_settings()['ALLOWED_IPS']
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of requests and flag the slow paths.
+
+    Put it right after the static files middleware, so the time includes
+    the session and authentication middleware but static files are not
+    sampled. Only active when RECIPES_PROFILING['ENABLED'] is set. Runs
+    without a thread switch under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.options = get_profiling_settings()
+        if not self.options['ENABLED'] or self.options['SAMPLE_RATE'] <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.registry = get_registry()
+        connection_created.connect(install_execute_wrapper, dispatch_uid='recipes.profiling')
+        for connection in connections.all(initialized_only=True):
+            install_execute_wrapper(connection)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if random.random() >= self.options['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        with self.profiling(profile):
+            response = self.get_response(request)
+        self.finish(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.options['SAMPLE_RATE']:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        with self.profiling(profile):
+            response = await self.get_response(request)
+        self.finish(request, response, profile)
+        return response
+
+    @contextmanager
+    def profiling(self, profile):
+        # The profile follows the context into sync_to_async threads, unlike database connections
+        token = _current.set(profile)
+        try:
+            yield
+        finally:
+            _current.reset(token)
+        profile.duration = time.perf_counter() - profile.started
+
+    def finish(self, request, response, profile):
+        route = route_name(request)
+        budget = query_budget(route, self.options)
+        duplicates = profile.duplicates(self.options['DUPLICATE_THRESHOLD'])
+        over_budget = budget is not None and profile.queries > budget
+        slow = profile.duration * 1000 >= self.options['SLOW_MS']
+        self.registry.record(route, profile, duplicates, over_budget)
+
+        if over_budget or duplicates or slow:
+            report = self.build_report(request, response, route, budget, profile, duplicates)
+            self.registry.add_report(report)
+            logger.warning(
+                '%s %s (%s): %.1f ms, %d queries (budget %s), %d repeated statements',
+                request.method, request.path, route, report['ms'], profile.queries, budget, len(duplicates),
+                extra={'profile': report},
+            )
+        else:
+            logger.debug('%s %s (%s): %.1f ms, %d queries',
+                         request.method, request.path, route, profile.duration * 1000, profile.queries)
+
+    def build_report(self, request, response, route, budget, profile, duplicates):
+        return {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'ms': profile.duration * 1000,
+            'queries': profile.queries,
+            'budget': budget,
+            'sql_ms': profile.sql_time * 1000,
+            'duplicates': [
+                {'sql': shape, 'count': count, 'ms': profile.fingerprint_time[shape] * 1000}
+                for shape, count in duplicates[:10]
+            ],
+            'slowest_queries': [
+                {'sql': shape, 'count': profile.fingerprints[shape], 'ms': seconds * 1000}
+                for shape, seconds in profile.fingerprint_time.most_common(5)
+            ],
+            'spans': {name: seconds * 1000 for name, seconds in profile.spans.most_common()},
+        }
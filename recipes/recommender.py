@@ -0,0 +1,328 @@
+import heapq
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from .importer import chunked
+
+
+# SQLite allows a limited number of query parameters
+IN_BATCH_SIZE = 500
+
+
+def get_recommender_settings():
+    """
+    Returns the RECIPES_RECOMMENDER settings merged with their defaults.
+    """
+    options = {
+        'TOP_K': 6,
+        'MIN_SCORE': 0.05,
+        'MAX_POSTINGS': 1000,
+        'WEIGHTS': {'term': 1.0, 'ingredient': 1.0, 'category': 0.5},
+        'REFRESH_ON_SAVE': True,
+    }
+    options.update(getattr(settings, 'RECIPES_RECOMMENDER', {}))
+    return options
+
+
+def _feature_sources():
+    from .models import Recipe, RecipeIngredientTerm
+
+    # Feature kind, through rows and the column holding the feature value
+    return [
+        ('term', Recipe.related_terms.through.objects.all(), 'glossary_id'),
+        ('ingredient', RecipeIngredientTerm.objects.all(), 'term'),
+        ('category', Recipe.categories.through.objects.all(), 'category_id'),
+    ]
+
+
+def load_features(recipe_ids=None):
+    """
+    Load the feature set of recipes.
+
+    Features are (kind, value) tuples for related terms, [bracketed]
+    ingredient terms and categories.
+
+    Args:
+        recipe_ids (iterable, optional): Recipes to load, or None for all
+
+    Returns:
+        dict: Recipe id mapped to its set of features
+    """
+    features = defaultdict(set)
+    for kind, rows, column in _feature_sources():
+        if recipe_ids is None:
+            batches = [rows.values_list('recipe_id', column).iterator(chunk_size=5000)]
+        else:
+            batches = (
+                rows.filter(recipe_id__in=batch).values_list('recipe_id', column)
+                for batch in chunked(recipe_ids, IN_BATCH_SIZE)
+            )
+        for batch in batches:
+            for recipe_id, value in batch:
+                features[recipe_id].add((kind, value))
+    return features
+
+
+def document_frequencies(features):
+    """
+    Count the recipes having each feature, in the database.
+
+    Args:
+        features (iterable): (kind, value) tuples
+
+    Returns:
+        dict: Feature mapped to its number of recipes
+    """
+    by_kind = defaultdict(list)
+    for kind, value in features:
+        by_kind[kind].append(value)
+
+    frequencies = {}
+    for kind, rows, column in _feature_sources():
+        for batch in chunked(by_kind.get(kind, ()), IN_BATCH_SIZE):
+            counts = rows.filter(**{f'{column}__in': batch}).values(column).annotate(recipes=Count('recipe_id'))
+            for row in counts:
+                frequencies[(kind, row[column])] = row['recipes']
+    return frequencies
+
+
+def recipes_sharing(features, exclude=()):
+    """
+    Returns the ids of recipes having any of the given features.
+    """
+    by_kind = defaultdict(list)
+    for kind, value in features:
+        by_kind[kind].append(value)
+
+    recipe_ids = set()
+    for kind, rows, column in _feature_sources():
+        for batch in chunked(by_kind.get(kind, ()), IN_BATCH_SIZE):
+            recipe_ids.update(rows.filter(**{f'{column}__in': batch}).values_list('recipe_id', flat=True))
+    return recipe_ids - set(exclude)
+
+
+class SimilarityIndex:
+    """
+    Sparse TF-IDF vectors of recipes with an inverted index for finding neighbours.
+
+    Each feature is weighted by its kind and by how rare it is, and vectors
+    are normalised so the dot product of two recipes is their cosine
+    similarity. Only recipes sharing a feature are ever compared. Features
+    found in more than MAX_POSTINGS recipes, such as broad categories, add
+    to the score of candidates but are not used to find them.
+
+    Args:
+        features (dict): Recipe id mapped to its set of features
+        frequencies (dict): Feature mapped to its number of recipes
+        recipe_count (int): Total number of recipes
+    """
+
+    def __init__(self, features, frequencies, recipe_count, weights=None, max_postings=None):
+        options = get_recommender_settings()
+        self.features = features
+        self.frequencies = frequencies
+        self.recipe_count = max(recipe_count, 1)
+        self.weights = weights or options['WEIGHTS']
+        self.max_postings = max_postings or options['MAX_POSTINGS']
+        self.postings = defaultdict(list)
+        for recipe_id, recipe_features in features.items():
+            for feature in recipe_features:
+                self.postings[feature].append(recipe_id)
+        self._vectors = {}
+
+    @classmethod
+    def build(cls):
+        """
+        Index every recipe, for a full rebuild.
+        """
+        from .models import Recipe
+
+        features = load_features()
+        frequencies = defaultdict(int)
+        for recipe_features in features.values():
+            for feature in recipe_features:
+                frequencies[feature] += 1
+        return cls(features, frequencies, Recipe.objects.count())
+
+    @classmethod
+    def for_recipes(cls, recipe_ids):
+        """
+        Index the given recipes and every recipe they could be similar to.
+
+        Document frequencies come from the database, so scores match a full rebuild.
+        """
+        from .models import Recipe
+
+        options = get_recommender_settings()
+        features = load_features(recipe_ids)
+        own_features = {feature for recipe_features in features.values() for feature in recipe_features}
+        frequencies = document_frequencies(own_features)
+        rare = [feature for feature in own_features if frequencies.get(feature, 0) <= options['MAX_POSTINGS']]
+
+        candidates = recipes_sharing(rare, exclude=features)
+        features.update(load_features(candidates))
+        missing = {
+            feature
+            for recipe_features in features.values()
+            for feature in recipe_features
+            if feature not in frequencies
+        }
+        frequencies.update(document_frequencies(missing))
+        return cls(features, frequencies, Recipe.objects.count())
+
+    def vector(self, recipe_id):
+        """
+        Returns the unit-length weight of each feature of a recipe.
+        """
+        vector = self._vectors.get(recipe_id)
+        if vector is None:
+            vector = {}
+            for feature in self.features.get(recipe_id, ()):
+                idf = math.log(1 + self.recipe_count / max(self.frequencies.get(feature, 1), 1))
+                vector[feature] = self.weights.get(feature[0], 1.0) * idf
+            norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+            if norm:
+                vector = {feature: weight / norm for feature, weight in vector.items()}
+            self._vectors[recipe_id] = vector
+        return vector
+
+    def scores(self, recipe_id):
+        """
+        Returns the cosine similarity of a recipe with every candidate sharing a feature.
+        """
+        vector = self.vector(recipe_id)
+        scores = defaultdict(float)
+        common = []
+        for feature, weight in vector.items():
+            if self.frequencies.get(feature, 0) > self.max_postings:
+                common.append((feature, weight))
+                continue
+            for other in self.postings.get(feature, ()):
+                if other != recipe_id:
+                    scores[other] += weight * self.vector(other)[feature]
+
+        if not scores and common:
+            # Only broad features: compare with a bounded sample of the rarest one
+            feature = min(common, key=lambda item: self.frequencies.get(item[0], 0))[0]
+            for other in self.postings.get(feature, ())[:self.max_postings]:
+                if other != recipe_id:
+                    scores[other] = 0.0
+
+        for feature, weight in common:
+            for other in scores:
+                other_weight = self.vector(other).get(feature)
+                if other_weight:
+                    scores[other] += weight * other_weight
+        return scores
+
+    def neighbours(self, recipe_id, top_k=None, min_score=None):
+        """
+        Returns up to top_k (recipe id, score) pairs, most similar first.
+        """
+        options = get_recommender_settings()
+        top_k = options['TOP_K'] if top_k is None else top_k
+        min_score = options['MIN_SCORE'] if min_score is None else min_score
+        scores = self.scores(recipe_id)
+        best = heapq.nlargest(
+            top_k,
+            ((score, -other) for other, score in scores.items() if score >= min_score),
+        )
+        return [(-negative_id, score) for score, negative_id in best]
+
+
+def store_recommendations(neighbours, batch_size=500):
+    """
+    Replace the stored recommendations of the given recipes.
+
+    Args:
+        neighbours (dict): Recipe id mapped to its (recipe id, score) list
+        batch_size (int): Rows sent per executemany call
+    """
+    from .importer import insert_rows
+    from .models import RecipeRecommendation
+
+    rows = [
+        (recipe_id, recommended_id, score, rank)
+        for recipe_id, recipe_neighbours in neighbours.items()
+        for rank, (recommended_id, score) in enumerate(recipe_neighbours, start=1)
+    ]
+    with transaction.atomic():
+        for batch in chunked(neighbours, IN_BATCH_SIZE):
+            existing = RecipeRecommendation.objects.filter(recipe_id__in=batch)
+            existing._raw_delete(existing.db)
+        insert_rows(RecipeRecommendation, ['recipe', 'recommended', 'score', 'rank'], rows, batch_size)
+
+
+def rebuild_recommendations(chunk_size=1000):
+    """
+    Recompute the recommendations of every recipe.
+
+    Returns:
+        int: Number of recipes processed
+    """
+    from .cache import invalidate
+    from .models import Recipe, RecipeRecommendation
+
+    index = SimilarityIndex.build()
+    recipe_ids = list(Recipe.objects.order_by('id').values_list('id', flat=True))
+    with transaction.atomic():
+        # Recipes without any features have no rows left over either
+        existing = RecipeRecommendation.objects.all()
+        existing._raw_delete(existing.db)
+    for chunk in chunked(recipe_ids, chunk_size):
+        store_recommendations({recipe_id: index.neighbours(recipe_id) for recipe_id in chunk})
+    invalidate('recommendations')
+    return len(recipe_ids)
+
+
+def refresh_recommendations(recipe_ids):
+    """
+    Recompute the recommendations affected by changes to some recipes.
+
+    Refreshes the changed recipes, the recipes currently recommending them,
+    and recipes whose list the changed recipes now make it into.
+
+    Args:
+        recipe_ids (iterable): Ids of recipes whose terms or categories changed
+    """
+    from .cache import invalidate
+    from .models import Recipe, RecipeRecommendation
+
+    options = get_recommender_settings()
+    changed = set(Recipe.objects.filter(id__in=list(recipe_ids)).values_list('id', flat=True))
+    listing = set(
+        RecipeRecommendation.objects.filter(recommended_id__in=changed).values_list('recipe_id', flat=True)
+    )
+    refresh = changed | listing
+    if not refresh:
+        return
+
+    index = SimilarityIndex.for_recipes(refresh)
+    neighbours = {recipe_id: index.neighbours(recipe_id) for recipe_id in refresh}
+
+    # Other recipes gain a changed recipe when it beats the last entry of their list
+    gains = defaultdict(float)
+    for recipe_id in changed:
+        for other, score in index.scores(recipe_id).items():
+            if other not in refresh and score >= options['MIN_SCORE']:
+                gains[other] = max(gains[other], score)
+    lists = {
+        row['recipe_id']: row
+        for row in RecipeRecommendation.objects.filter(recipe_id__in=list(gains))
+        .values('recipe_id').annotate(entries=Count('id'), lowest=Min('score'))
+    }
+    gained = [
+        other for other, score in gains.items()
+        if other not in lists or lists[other]['entries'] < options['TOP_K'] or score > lists[other]['lowest']
+    ]
+    if gained:
+        other_index = SimilarityIndex.for_recipes(gained)
+        neighbours.update({recipe_id: other_index.neighbours(recipe_id) for recipe_id in gained})
+
+    store_recommendations(neighbours)
+    slugs = Recipe.objects.filter(id__in=list(neighbours)).values_list('slug', flat=True)
+    invalidate(*[f'recipe:{slug}' for slug in slugs])
@@ -0,0 +1,300 @@
+"""
+Fuzzy resolution of ingredient names to glossary terms.
+
+Ingredient lines name their glossary term exactly when it is written in
+[brackets], but plain lines such as "2 large eggs" or "chopped onions, to
+taste" do not. The resolver strips quantities and units, tries every
+contiguous run of the remaining words against the glossary names and their
+singular and plural forms, and then, leaving out preparation words, looks
+for close spellings through a character trigram index, accepting a candidate
+only within a small edit distance.
+
+A fuzzily matched term without nutrient values of its own resolves to its
+nearest MPTT ancestor that has them, so "smoked paprika" still counts as
+"paprika" when only the parent term has values.
+"""
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+from .cache import get_cache
+from .ingredients import UNITS
+
+
+# Preparation and size words left out of fuzzy matching; exact matches keep them, as in "whole milk"
+DESCRIPTORS = {
+    'a', 'an', 'and', 'the', 'of', 'for', 'to', 'taste', 'or', 'about', 'approx', 'plus', 'some', 'few',
+    'large', 'medium', 'small', 'big', 'extra', 'whole', 'half', 'halved', 'quartered',
+    'fresh', 'freshly', 'dried', 'frozen', 'raw', 'cooked', 'ripe', 'canned', 'tinned', 'packed',
+    'chopped', 'diced', 'minced', 'sliced', 'grated', 'shredded', 'crushed', 'ground', 'peeled',
+    'finely', 'roughly', 'thinly', 'coarsely', 'lightly', 'beaten', 'melted', 'softened', 'sifted',
+    'boneless', 'skinless', 'optional', 'divided', 'room', 'temperature', 'cold', 'warm', 'hot',
+}
+
+WORD_RE = re.compile(r'[a-z][a-z\'-]*')
+PARENTHESES_RE = re.compile(r'\([^)]*\)')
+
+
+def get_resolver_settings():
+    """
+    Returns the RECIPES_RESOLVER settings merged with their defaults.
+    """
+    options = {
+        'ENABLED': True,
+        # Edit distance accepted for long names; names under 10 characters allow 1, under 5 none
+        'MAX_DISTANCE': 2,
+        # Share of a name's trigrams a candidate must have before its edit distance is checked
+        'MIN_SIMILARITY': 0.5,
+        'CANDIDATES': 8,
+        'CACHE_SIZE': 20000,
+    }
+    options.update(getattr(settings, 'RECIPES_RESOLVER', {}))
+    return options
+
+
+def normalize(text):
+    """
+    Reduce an ingredient string to the words that can name a glossary term, without quantities or units.
+
+    Returns:
+        list: Lowercase words, in order
+    """
+    text = PARENTHESES_RE.sub(' ', text.lower().replace('[', ' ').replace(']', ' '))
+    # "onions, chopped", "butter or margarine" and "salt and pepper" name their ingredient first
+    text = re.split(r',| or | and ', text)[0]
+    return [
+        word.strip("'-") for word in WORD_RE.findall(text)
+        if word.rstrip('.') not in UNITS and len(word.strip("'-")) > 1
+    ]
+
+
+def trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_distance(a, b, limit):
+    """
+    Levenshtein distance between two strings, or limit + 1 once it is known to exceed limit.
+
+    Only the band of cells within limit of the diagonal is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [over] * (len(b) + 1)
+        current[0] = i if i <= limit else over
+        char_a = a[i - 1]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+        if min(current[low - 1:high + 1]) > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+class IngredientResolver:
+    """
+    In-memory index of glossary names for resolving free-text ingredient names.
+
+    Keys are lowercase names, singular and plural forms; exact names win over
+    forms as in the TermMatcher. Results are kept in an LRU cache, so the many
+    lines repeating the same ingredient are resolved once.
+    """
+
+    def __init__(self, keys, parents, with_values, options=None):
+        self.options = options or get_resolver_settings()
+        self.keys = keys
+        self.parents = parents
+        self.with_values = with_values
+        self.names = list(keys)
+        self.grams = [trigrams(name) for name in self.names]
+        self.index = {}
+        for position, grams in enumerate(self.grams):
+            for gram in grams:
+                self.index.setdefault(gram, []).append(position)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls):
+        """
+        Load every glossary term once and compile the trigram index.
+
+        Returns:
+            IngredientResolver: A resolver ready for lookups without further queries
+        """
+        from .models import Glossary, GlossaryNutrient
+
+        keys, aliases, parents = {}, {}, {}
+        for pk, parent_id, name, singular, plural in Glossary.objects.order_by('id').values_list(
+                'id', 'parent_id', 'name', 'singular_name', 'plural_name'):
+            parents[pk] = parent_id
+            keys.setdefault(name.strip().lower(), pk)
+            for alias in (singular, plural):
+                if alias:
+                    aliases.setdefault(alias.strip().lower(), pk)
+        for key, pk in aliases.items():
+            keys.setdefault(key, pk)
+        with_values = set(GlossaryNutrient.objects.values_list('glossary_id', flat=True).distinct())
+        return cls(keys, parents, with_values)
+
+    def _limit(self, name):
+        return min(self.options['MAX_DISTANCE'], len(name) // 5)
+
+    def closest(self, name, limit=None):
+        """
+        Find the glossary name spelled most like the given one.
+
+        Args:
+            name (str): Normalized lowercase name
+            limit (int, optional): Largest edit distance accepted; defaults by name length
+
+        Returns:
+            tuple: (glossary key, distance), or None when no candidate is close enough
+        """
+        if limit is None:
+            limit = self._limit(name)
+        if limit <= 0:
+            return None
+        grams = trigrams(name)
+        needed = math.ceil(len(grams) * self.options['MIN_SIMILARITY'])
+        # A name sharing `needed` trigrams has one among the len - needed + 1 rarest,
+        # so common trigrams never have their long postings scanned
+        rarest = sorted(grams, key=lambda gram: len(self.index.get(gram, ())))[:len(grams) - needed + 1]
+        candidates = {position for gram in rarest for position in self.index.get(gram, ())}
+        counts = Counter({position: len(grams & self.grams[position]) for position in candidates})
+        best = None
+        for position, shared in counts.most_common(self.options['CANDIDATES']):
+            if shared < needed:
+                break
+            key = self.names[position]
+            distance = bounded_distance(name, key, limit)
+            if distance <= limit and (best is None or distance < best[1]):
+                best = (key, distance)
+        return best
+
+    def _with_values(self, pk):
+        # Walk up the tree to the nearest term that has nutrient values
+        seen = set()
+        current = pk
+        while current is not None and current not in seen:
+            if current in self.with_values:
+                return current
+            seen.add(current)
+            current = self.parents.get(current)
+        return pk
+
+    @staticmethod
+    def _spans(words):
+        # Longer runs of words first; among equal lengths the last, the head noun in English
+        return [
+            ' '.join(words[start:start + length])
+            for length in range(len(words), 0, -1)
+            for start in range(len(words) - length, -1, -1)
+        ]
+
+    def _resolve(self, text):
+        words = normalize(text)
+        for span in self._spans(words):
+            if span in self.keys:
+                pk = self.keys[span]
+                return pk if span == text else self._with_values(pk)
+        for span in self._spans([word for word in words if word not in DESCRIPTORS]):
+            match = self.closest(span)
+            if match is not None:
+                return self._with_values(self.keys[match[0]])
+        return None
+
+    def suggest(self, text):
+        """
+        Find the glossary name closest to an unresolved ingredient, for editors.
+
+        Accepts an edit distance of a third of the name, more than resolve() does.
+
+        Returns:
+            tuple: (glossary name, distance), or None
+        """
+        words = ' '.join(word for word in normalize(text) if word not in DESCRIPTORS)
+        return self.closest(words, limit=max(len(words) // 3, 1)) if words else None
+
+    def resolve(self, text):
+        """
+        Resolve an ingredient name to a glossary term id.
+
+        Args:
+            text (str): Ingredient term or line, e.g. "2 large eggs"
+
+        Returns:
+            int: Glossary id, or None when nothing is close enough
+        """
+        key = text.strip().lower()
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        pk = self._resolve(key)
+        with self._lock:
+            self._cache[key] = pk
+            if len(self._cache) > self.options['CACHE_SIZE']:
+                self._cache.popitem(last=False)
+        return pk
+
+    def resolve_many(self, texts):
+        """
+        Returns:
+            dict: Text mapped to a Glossary id, for the texts that resolve
+        """
+        resolved = {}
+        for text in texts:
+            pk = self.resolve(text)
+            if pk is not None:
+                resolved[text] = pk
+        return resolved
+
+
+# Cache scope whose shared version tells every process when to rebuild
+VERSION_SCOPE = 'ingredient_resolver'
+
+# (version, resolver) of this process
+_resolver = None
+_lock = threading.Lock()
+
+
+def get_ingredient_resolver():
+    """
+    Returns the process-wide resolver, building it on first use.
+
+    Like the term matcher, it is rebuilt when the shared version of its
+    cache scope changes, so every process resolves against the same terms.
+    """
+    global _resolver
+    version = get_cache().get_version(VERSION_SCOPE)
+    current = _resolver
+    if current is None or current[0] != version:
+        with _lock:
+            if _resolver is None or _resolver[0] != version:
+                _resolver = (version, IngredientResolver.build())
+            current = _resolver
+    return current[1]
+
+
+def invalidate_ingredient_resolver():
+    """
+    Drop the cached resolver in every process so the next lookup rebuilds it.
+    """
+    global _resolver
+    with _lock:
+        _resolver = None
+    get_cache().invalidate(VERSION_SCOPE)
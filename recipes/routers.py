@@ -0,0 +1,29 @@
+from django.db import connections
+
+
+class ReadReplicaRouter:
+    """
+    Send reads to the 'replica' database alias and everything else to 'default'.
+
+    The replica is a read-only connection to the same SQLite file, so reads
+    never hold a connection that could take the write lock. Reads made
+    while 'default' is inside a transaction stay on 'default' so they see
+    its uncommitted writes.
+    """
+
+    replica = 'replica'
+
+    def db_for_read(self, model, **hints):
+        if self.replica not in connections.settings or connections['default'].in_atomic_block:
+            return 'default'
+        return self.replica
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,359 @@
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+from django.utils.module_loading import import_string
+
+
+SEARCH_TABLE = 'recipes_search_index'
+KIND_BITS = 4
+
+_documents = {}
+_backend = None
+
+
+class SearchDocument:
+    """
+    Describes how instances of a model are stored in the search index.
+
+    Rows are keyed by object_id << KIND_BITS | code, so each kind needs a
+    small, stable code.
+    """
+
+    def __init__(self, model, kind, code, title, body, search_fields):
+        self.model = model
+        self.kind = kind
+        self.code = code
+        self.title = title
+        self.body = body
+        self.search_fields = search_fields
+
+    def row_id(self, object_id):
+        return (object_id << KIND_BITS) | self.code
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+
+def register(model, kind, code, title, body, search_fields):
+    """
+    Add a model to the search index and keep it in sync with signals.
+
+    Args:
+        model (Model): Model class to index
+        kind (str): Short name used in results and the ?type= filter
+        code (int): Stable number below 2 ** KIND_BITS identifying the kind
+        title (callable): Returns the ranked title text of an instance
+        body (callable): Returns the remaining searchable text of an instance
+        search_fields (list): Fields used by backends without an index
+    """
+    document = SearchDocument(model, kind, code, title, body, search_fields)
+    _documents[kind] = document
+    post_save.connect(_index_instance, sender=model, dispatch_uid=f'search_index_{kind}')
+    post_delete.connect(_remove_instance, sender=model, dispatch_uid=f'search_remove_{kind}')
+    return document
+
+
+def get_documents():
+    return list(_documents.values())
+
+
+def document_for_model(model):
+    for document in _documents.values():
+        if document.model is model:
+            return document
+    return None
+
+
+def _index_instance(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_backend().index(document_for_model(sender), instance)
+
+
+def _remove_instance(sender, instance, **kwargs):
+    get_backend().remove(document_for_model(sender), instance.pk)
+
+
+def register_default_documents():
+    """
+    Register recipes, glossary terms and, when the videos app is installed, videos.
+    """
+    from .ingredients import parse_ingredients_text
+    from .models import Glossary, Recipe
+
+    register(
+        Recipe, 'recipe', 1,
+        title=lambda recipe: recipe.recipe_name or recipe.title or '',
+        body=lambda recipe: ' '.join([
+            recipe.title or '',
+            recipe.description,
+            # Parsed like the stored RecipeIngredient rows, which may not be rewritten yet on post_save
+            ' '.join(line.text for line in parse_ingredients_text(recipe.ingredients_text)).replace('[', ' ').replace(']', ' '),
+        ]),
+        search_fields=['recipe_name', 'title', 'description', 'ingredients_text'],
+    )
+    register(
+        Glossary, 'glossary', 2,
+        title=lambda term: term.name,
+        body=lambda term: ' '.join([term.singular_name, term.plural_name, term.description]),
+        search_fields=['name', 'singular_name', 'plural_name', 'description'],
+    )
+
+    if apps.is_installed('videos'):
+        try:
+            video_model = apps.get_model('videos', 'YTVideo')
+        except LookupError:
+            return
+        field_names = {field.name for field in video_model._meta.get_fields()}
+        if 'video_name' not in field_names:
+            return
+        register(
+            video_model, 'video', 3,
+            title=lambda video: video.video_name or '',
+            body=lambda video: getattr(video, 'video_type', '') or '',
+            search_fields=[name for name in ('video_name', 'video_type') if name in field_names],
+        )
+
+
+class BaseSearchBackend:
+    """
+    Interface for search backends.
+    """
+
+    #: Whether search() results come from a maintained index
+    indexed = False
+
+    def index(self, document, instance):
+        pass
+
+    def bulk_index(self, document, instances):
+        for instance in instances:
+            self.index(document, instance)
+
+    def remove(self, document, object_id):
+        pass
+
+    def clear(self, document=None):
+        pass
+
+    def search(self, query, documents, offset=0, limit=None):
+        """
+        Find matching objects ordered by relevance.
+
+        Returns:
+            list: (document, object_id) tuples
+        """
+        raise NotImplementedError
+
+    def count(self, query, documents):
+        raise NotImplementedError
+
+    def object_ids(self, query, document):
+        """
+        Returns all matching ids of one document kind, as a list or a subquery for pk__in,
+        or None to let callers fall back to icontains.
+        """
+        return None
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Unindexed fallback that runs icontains queries, for databases without FTS5.
+    """
+
+    def _matches(self, query, documents):
+        words = query.split()
+        matches = []
+        for document in documents:
+            queryset = document.get_queryset()
+            for word in words:
+                condition = Q()
+                for field in document.search_fields:
+                    condition |= Q(**{f'{field}__icontains': word})
+                queryset = queryset.filter(condition)
+            matches.extend((document, pk) for pk in queryset.values_list('pk', flat=True))
+        return matches
+
+    def search(self, query, documents, offset=0, limit=None):
+        matches = self._matches(query, documents)
+        end = None if limit is None else offset + limit
+        return matches[offset:end]
+
+    def count(self, query, documents):
+        return len(self._matches(query, documents))
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    Search backend using an SQLite FTS5 table ranked by bm25.
+    """
+
+    indexed = True
+    # bm25 weights for the kind, object_id, title and body columns
+    rank = f'bm25({SEARCH_TABLE}, 0.0, 0.0, 10.0, 1.0)'
+
+    def index(self, document, instance):
+        self.bulk_index(document, [instance])
+
+    def bulk_index(self, document, instances):
+        rows = [
+            (document.row_id(instance.pk), document.kind, instance.pk, document.title(instance), document.body(instance))
+            for instance in instances
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            # Objects without any text could never match, so they get no row
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, kind, object_id, title, body) VALUES (%s, %s, %s, %s, %s)',
+                [row for row in rows if row[3].strip() or row[4].strip()],
+            )
+
+    def remove(self, document, object_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [document.row_id(object_id)])
+
+    def clear(self, document=None):
+        with connection.cursor() as cursor:
+            if document is None:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            else:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE kind = %s', [document.kind])
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Turn user input into an FTS5 query where every word is a quoted prefix.
+        """
+        words = re.findall(r'\w+', query.lower())
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def _where(self, documents):
+        codes = ', '.join(str(document.code) for document in documents)
+        return f'{SEARCH_TABLE} MATCH %s AND (rowid & {(1 << KIND_BITS) - 1}) IN ({codes})'
+
+    def search(self, query, documents, offset=0, limit=None):
+        expression = self.match_expression(query)
+        if not expression or not documents:
+            return []
+        by_code = {document.code: document for document in documents}
+        sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {self._where(documents)} ORDER BY {self.rank}'
+        params = [expression]
+        if limit is not None:
+            sql += ' LIMIT %s OFFSET %s'
+            params += [limit, offset]
+        elif offset:
+            sql += ' LIMIT -1 OFFSET %s'
+            params.append(offset)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        mask = (1 << KIND_BITS) - 1
+        return [(by_code[rowid & mask], rowid >> KIND_BITS) for rowid, in rows]
+
+    def count(self, query, documents):
+        expression = self.match_expression(query)
+        if not expression or not documents:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE} WHERE {self._where(documents)}', [expression])
+            return cursor.fetchone()[0]
+
+    def object_ids(self, query, document):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        # A subquery, so a search matching most of the catalog does not send every id back as a parameter
+        return RawSQL(f'SELECT rowid >> {KIND_BITS} FROM {SEARCH_TABLE} WHERE {self._where([document])}', [expression])
+
+
+def get_backend():
+    """
+    Returns the configured search backend.
+
+    RECIPES_SEARCH_BACKEND may name a backend class; by default SQLite uses
+    FTS5 and other databases fall back to icontains queries.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'RECIPES_SEARCH_BACKEND', None)
+        if path:
+            backend_class = import_string(path)
+        elif connection.vendor == 'sqlite':
+            backend_class = SQLiteFTSBackend
+        else:
+            backend_class = DatabaseSearchBackend
+        _backend = backend_class()
+    return _backend
+
+
+def search_ids(model, query):
+    """
+    Returns the ids of matching objects of a model, as a list or a subquery for pk__in,
+    or None when the backend has no index.
+    """
+    document = document_for_model(model)
+    if document is None:
+        return None
+    return get_backend().object_ids(query, document)
+
+
+class SearchResults:
+    """
+    Lazy, sliceable search results so they can be passed to Paginator.
+
+    Each item is a dict with the kind, the object and its URL, in rank order.
+    """
+
+    def __init__(self, query, kinds=None):
+        self.query = query
+        documents = get_documents()
+        if kinds:
+            documents = [document for document in documents if document.kind in kinds]
+        self.documents = documents
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = get_backend().count(self.query, self.documents) if self.query else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = None if index.stop is None else max(index.stop - offset, 0)
+        if not self.query or limit == 0:
+            return []
+        hits = get_backend().search(self.query, self.documents, offset=offset, limit=limit)
+        return self._hydrate(hits)
+
+    def _hydrate(self, hits):
+        ids = {}
+        for document, object_id in hits:
+            ids.setdefault(document.kind, []).append(object_id)
+        objects = {
+            kind: _documents[kind].get_queryset().in_bulk(object_ids)
+            for kind, object_ids in ids.items()
+        }
+
+        results = []
+        for document, object_id in hits:
+            instance = objects[document.kind].get(object_id)
+            if instance is None:
+                continue
+            results.append({
+                'kind': document.kind,
+                'object': instance,
+                'title': document.title(instance),
+                'url': instance.get_absolute_url() if hasattr(instance, 'get_absolute_url') else '',
+            })
+        return results
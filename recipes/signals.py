@@ -0,0 +1,449 @@
+import threading
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from mptt.signals import node_moved
+
+from .models import (
+    Category, Glossary, GlossaryCategory, GlossaryNutrient, Nutrient, Recipe, RecipeIngredient, RecipeIngredientTerm,
+    RecipeReview, ReviewReply,
+)
+from .cache import invalidate
+from .ingredients import resolve_ingredients, sync_recipe_ingredients
+from .matcher import invalidate_term_matcher
+from .nutrition import rebuild_catalog_nutrition
+from .resolver import invalidate_ingredient_resolver
+
+
+GLOSSARY_LINK_FIELDS = ['name', 'slug', 'singular_name', 'plural_name', 'parent_id']
+RECIPE_LINK_FIELDS = ['recipe_name', 'slug']
+
+_pending_nutrition = threading.local()
+_pending_recommendations = threading.local()
+
+
+def _reset_term_matcher():
+    invalidate_term_matcher()
+    # Also drop anything rebuilt from pre-commit data by another thread
+    transaction.on_commit(invalidate_term_matcher)
+
+
+def _reset_ingredient_resolver():
+    invalidate_ingredient_resolver()
+    transaction.on_commit(invalidate_ingredient_resolver)
+
+
+def _glossary_terms(values):
+    return {
+        values[field].strip().lower()
+        for field in ('name', 'singular_name', 'plural_name')
+        if values.get(field)
+    }
+
+
+def refresh_ingredients_for_terms(terms, recipe_ids=(), exclude=None):
+    """
+    Re-render the stored ingredient HTML of recipes affected by a term change,
+    and drop their cached pages once the transaction commits.
+
+    Args:
+        terms (set): Lowercase bracketed terms whose links may have changed
+        recipe_ids (iterable): Extra recipe ids to refresh, e.g. from related_terms
+        exclude (int): Recipe id to skip
+    """
+    if not terms and not recipe_ids:
+        return
+    recipes = Recipe.objects.filter(
+        Q(ingredient_terms__term__in=terms) | Q(id__in=list(recipe_ids))
+    ).distinct()
+    if exclude is not None:
+        recipes = recipes.exclude(id=exclude)
+    slugs = []
+    for recipe in recipes:
+        recipe.refresh_ingredients_html()
+        slugs.append(recipe.slug)
+    _invalidate_on_commit([f'recipe:{slug}' for slug in slugs if slug])
+
+
+def update_ingredient_terms(recipe):
+    """
+    Sync the RecipeIngredientTerm rows of a recipe with its ingredients text.
+    """
+    terms = recipe.get_ingredient_terms()
+    existing = set(recipe.ingredient_terms.values_list('term', flat=True))
+    if existing - terms:
+        recipe.ingredient_terms.filter(term__in=existing - terms).delete()
+    RecipeIngredientTerm.objects.bulk_create(
+        [RecipeIngredientTerm(recipe=recipe, term=term) for term in terms - existing]
+    )
+
+
+def recipes_using(glossary_ids):
+    """
+    Returns the ids of recipes with an ingredient line resolved to any of the given glossary terms.
+    """
+    return set(RecipeIngredient.objects.filter(glossary_id__in=list(glossary_ids)).values_list('recipe_id', flat=True))
+
+
+def rebuild_resolved_nutrition(recipe_ids):
+    """
+    Rebuild stored nutrition of recipes whose ingredient lines now resolve differently.
+    """
+    if recipe_ids:
+        rebuild_catalog_nutrition(recipe_ids)
+
+
+def _schedule_nutrition_rebuild(glossary_id):
+    # Batch the many GlossaryNutrient rows saved by one admin form into one rebuild
+    pending = getattr(_pending_nutrition, 'glossary_ids', None)
+    if pending is None:
+        pending = _pending_nutrition.glossary_ids = set()
+    pending.add(glossary_id)
+    transaction.on_commit(_flush_nutrition_rebuild)
+
+
+def _flush_nutrition_rebuild():
+    glossary_ids = getattr(_pending_nutrition, 'glossary_ids', None)
+    if not glossary_ids:
+        return
+    _pending_nutrition.glossary_ids = set()
+    # Fuzzy matches fall back to the nearest term with values, which may now be one of these
+    terms = set()
+    for values in Glossary.objects.filter(id__in=glossary_ids).values('name', 'singular_name', 'plural_name'):
+        terms |= _glossary_terms(values)
+    # A common term such as egg is used by much of the catalog
+    rebuild_resolved_nutrition(recipes_using(glossary_ids) | resolve_ingredients(mentioning=terms))
+
+
+@receiver(pre_save, sender=Glossary)
+def snapshot_glossary(sender, instance, **kwargs):
+    instance._link_snapshot = None
+    if instance.pk:
+        instance._link_snapshot = Glossary.objects.filter(pk=instance.pk).values(*GLOSSARY_LINK_FIELDS).first()
+
+
+@receiver(post_save, sender=Glossary)
+def refresh_glossary_links(sender, instance, created, raw=False, **kwargs):
+    """
+    Re-render recipes linking to a glossary term whose name, slug, forms or parent changed.
+    """
+    if raw:
+        _reset_term_matcher()
+        _reset_ingredient_resolver()
+        return
+    old = getattr(instance, '_link_snapshot', None)
+    new = {field: getattr(instance, field) for field in GLOSSARY_LINK_FIELDS}
+    if not created and old == new:
+        return
+
+    _reset_term_matcher()
+    _reset_ingredient_resolver()
+
+    terms = _glossary_terms(new)
+    if old:
+        terms |= _glossary_terms(old)
+    if old and old['slug'] != new['slug']:
+        # Child terms link to an anchor on their parent's page
+        for child in instance.get_children().values('name', 'singular_name', 'plural_name'):
+            terms |= _glossary_terms(child)
+
+    recipe_ids = instance.recipes.values_list('id', flat=True)
+    refresh_ingredients_for_terms(terms, recipe_ids)
+
+    # Ingredient lines resolve to a term by its name and forms, or fuzzily to lines
+    # mentioning them; lines resolved to the term before may no longer match
+    recipe_ids = resolve_ingredients(terms=terms) | resolve_ingredients(mentioning=terms)
+    recipe_ids |= resolve_ingredients(recipe_ids=set(instance.recipe_ingredients.values_list('recipe_id', flat=True)))
+    rebuild_resolved_nutrition(recipe_ids)
+
+
+@receiver(pre_delete, sender=Glossary)
+def snapshot_glossary_recipes(sender, instance, **kwargs):
+    instance._linked_recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    instance._ingredient_recipe_ids = set(instance.recipe_ingredients.values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Glossary)
+def refresh_deleted_glossary_links(sender, instance, **kwargs):
+    _reset_term_matcher()
+    _reset_ingredient_resolver()
+    terms = _glossary_terms({field: getattr(instance, field) for field in GLOSSARY_LINK_FIELDS})
+    refresh_ingredients_for_terms(terms, getattr(instance, '_linked_recipe_ids', ()))
+    # The deleted term's lines were set to NULL; another term may match them now
+    recipe_ids = getattr(instance, '_ingredient_recipe_ids', set())
+    resolve_ingredients(recipe_ids=recipe_ids)
+    rebuild_resolved_nutrition(recipe_ids | resolve_ingredients(terms=terms))
+
+
+@receiver(pre_save, sender=Recipe)
+def snapshot_recipe(sender, instance, **kwargs):
+    instance._link_snapshot = None
+    if instance.pk:
+        instance._link_snapshot = Recipe.objects.filter(pk=instance.pk).values(
+            'ingredients_text', 'servings', *RECIPE_LINK_FIELDS).first()
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_recipe_ingredients(sender, instance, created, raw=False, **kwargs):
+    """
+    Re-index and re-render a recipe's ingredients, and update recipes that link to it.
+    """
+    if raw:
+        _reset_term_matcher()
+        return
+    old = getattr(instance, '_link_snapshot', None)
+    name_changed = old is None or any(old[field] != getattr(instance, field) for field in RECIPE_LINK_FIELDS)
+    if name_changed:
+        _reset_term_matcher()
+
+    if old is None or old['ingredients_text'] != instance.ingredients_text:
+        sync_recipe_ingredients(instance)
+        update_ingredient_terms(instance)
+        instance.refresh_ingredients_html()
+        instance.rebuild_nutrition()
+        _schedule_recommendation_refresh([instance.pk])
+    elif old['servings'] != instance.servings:
+        instance.rebuild_nutrition()
+
+    if name_changed:
+        terms = {instance.recipe_name.strip().lower()} if instance.recipe_name else set()
+        if old and old['recipe_name']:
+            terms.add(old['recipe_name'].strip().lower())
+        refresh_ingredients_for_terms(terms, exclude=instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_deleted_recipe_links(sender, instance, **kwargs):
+    _reset_term_matcher()
+    if instance.recipe_name:
+        refresh_ingredients_for_terms({instance.recipe_name.strip().lower()})
+
+
+@receiver(post_save, sender=GlossaryNutrient)
+@receiver(post_delete, sender=GlossaryNutrient)
+def rebuild_glossary_nutrition(sender, instance, raw=False, **kwargs):
+    """
+    Rebuild stored nutrition of the recipes using a term whose nutrient values changed.
+    """
+    if raw:
+        return
+    # Fuzzy matches fall back to the nearest term with nutrient values
+    _reset_ingredient_resolver()
+    _schedule_nutrition_rebuild(instance.glossary_id)
+
+
+# Review aggregates
+
+def _review_contribution(recipe_id, rating, is_approved):
+    if not recipe_id or not is_approved:
+        return None
+    return recipe_id, rating
+
+
+def _apply_review_change(old, new):
+    if old == new:
+        return
+    for contribution, sign in ((old, -1), (new, 1)):
+        if contribution is None:
+            continue
+        recipe_id, rating = contribution
+        stars = {rating: sign} if 1 <= rating <= 5 else {}
+        Recipe(pk=recipe_id).update_review_stats(count=sign, rating_sum=sign * rating, stars=stars)
+
+
+@receiver(pre_save, sender=RecipeReview)
+@receiver(pre_delete, sender=RecipeReview)
+def snapshot_review(sender, instance, **kwargs):
+    # Read the stored row: the instance may be stale after a queryset update()
+    instance._stats_snapshot = None
+    if instance.pk:
+        old = RecipeReview.objects.filter(pk=instance.pk).values('recipe_id', 'rating', 'is_approved').first()
+        if old:
+            instance._stats_snapshot = _review_contribution(old['recipe_id'], old['rating'], old['is_approved'])
+
+
+@receiver(post_save, sender=RecipeReview)
+def update_review_stats(sender, instance, raw=False, **kwargs):
+    """
+    Move an approved review's rating into, out of, or between recipe aggregates.
+    """
+    if raw:
+        return
+    new = _review_contribution(instance.recipe_id, instance.rating, instance.is_approved)
+    _apply_review_change(getattr(instance, '_stats_snapshot', None), new)
+
+
+@receiver(post_delete, sender=RecipeReview)
+def remove_review_stats(sender, instance, **kwargs):
+    _apply_review_change(getattr(instance, '_stats_snapshot', None), None)
+
+
+# Recommendations
+
+def _schedule_recommendation_refresh(recipe_ids):
+    from .recommender import get_recommender_settings
+
+    if not get_recommender_settings()['REFRESH_ON_SAVE']:
+        return
+    # An admin save changes fields and several M2M relations; refresh once per transaction
+    pending = getattr(_pending_recommendations, 'recipe_ids', None)
+    if pending is None:
+        pending = _pending_recommendations.recipe_ids = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(_flush_recommendation_refresh)
+
+
+def _flush_recommendation_refresh():
+    from .recommender import refresh_recommendations
+
+    recipe_ids = getattr(_pending_recommendations, 'recipe_ids', None)
+    if not recipe_ids:
+        return
+    _pending_recommendations.recipe_ids = set()
+    refresh_recommendations(recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+@receiver(m2m_changed, sender=Recipe.related_terms.through)
+def refresh_recipe_recommendations(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Refresh recommendations of recipes whose categories or related terms changed.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        _schedule_recommendation_refresh([instance.pk])
+    elif pk_set:
+        _schedule_recommendation_refresh(pk_set)
+    else:
+        _schedule_recommendation_refresh(instance.recipes.values_list('id', flat=True))
+
+
+# Page cache invalidation
+
+def _invalidate_on_commit(scopes):
+    scopes = [scope for scope in scopes if scope]
+    if scopes:
+        transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def _category_scopes(categories):
+    # Category pages list their whole subtree, so ancestors show the recipe too
+    ancestors = Category.objects.get_queryset_ancestors(categories, include_self=True)
+    return [f'category:{slug}' for slug in ancestors.values_list('slug', flat=True)]
+
+
+def _recipe_scopes(recipe):
+    scopes = ['recipes', f'recipe:{recipe.slug}']
+    old = getattr(recipe, '_link_snapshot', None)
+    if old and old['slug'] != recipe.slug:
+        scopes.append(f'recipe:{old["slug"]}')
+    if recipe.pk:
+        # Pages listing this recipe: recipes relating to or recommending it, and its categories
+        scopes += [f'recipe:{slug}' for slug in recipe.related_to.values_list('slug', flat=True)]
+        scopes += [f'recipe:{slug}' for slug in
+                   Recipe.objects.filter(recommendations__recommended=recipe).values_list('slug', flat=True)]
+        scopes += _category_scopes(recipe.categories.all())
+    return scopes
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_pages(sender, instance, **kwargs):
+    _invalidate_on_commit(_recipe_scopes(instance))
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_deleted_recipe_pages(sender, instance, **kwargs):
+    # Collected before delete, while the M2M rows still exist
+    _invalidate_on_commit(_recipe_scopes(instance) + ['category_counts'])
+
+
+@receiver(m2m_changed, sender=Recipe.categories.through)
+def invalidate_recipe_category_pages(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        slugs = Recipe.objects.filter(pk__in=pk_set).values_list('slug', flat=True) if pk_set else \
+            instance.recipes.values_list('slug', flat=True)
+        scopes = ['recipes'] + _category_scopes(Category.objects.filter(pk=instance.pk)) + \
+            [f'recipe:{slug}' for slug in slugs]
+    else:
+        categories = Category.objects.filter(pk__in=pk_set) if pk_set else instance.categories.all()
+        scopes = ['recipes', f'recipe:{instance.slug}'] + _category_scopes(categories)
+    _invalidate_on_commit(scopes + ['category_counts'])
+
+
+@receiver(m2m_changed, sender=Recipe.related_recipes.through)
+@receiver(m2m_changed, sender=Recipe.related_terms.through)
+def invalidate_recipe_relation_pages(sender, instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Recipe):
+        _invalidate_on_commit([f'recipe:{instance.slug}'])
+
+
+@receiver(pre_save, sender=Category)
+def snapshot_category(sender, instance, **kwargs):
+    instance._old_slug = None
+    if instance.pk:
+        instance._old_slug = Category.objects.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    old_slug = getattr(instance, '_old_slug', None)
+    _invalidate_on_commit([
+        'categories',
+        f'category:{instance.slug}',
+        f'category:{old_slug}' if old_slug and old_slug != instance.slug else None,
+    ])
+
+
+@receiver(node_moved, sender=Category)
+def invalidate_moved_category_pages(sender, instance, **kwargs):
+    # Moving a node renumbers lft/rght across its tree, so every subtree listing may change
+    _invalidate_on_commit(['categories'])
+
+
+@receiver(node_moved, sender=Glossary)
+def invalidate_moved_glossary_pages(sender, instance, **kwargs):
+    _invalidate_on_commit(['glossary'])
+
+
+@receiver(post_save, sender=Glossary)
+@receiver(post_delete, sender=Glossary)
+def invalidate_glossary_pages(sender, instance, **kwargs):
+    scopes = ['glossary', f'glossary:{instance.slug}']
+    old = getattr(instance, '_link_snapshot', None)
+    if old and old['slug'] != instance.slug:
+        scopes.append(f'glossary:{old["slug"]}')
+    if instance.parent_id:
+        # Child terms are listed on their parent's page
+        scopes += [f'glossary:{slug}' for slug in Glossary.objects.filter(pk=instance.parent_id).values_list('slug', flat=True)]
+    _invalidate_on_commit(scopes)
+
+
+@receiver(post_save, sender=GlossaryCategory)
+@receiver(post_delete, sender=GlossaryCategory)
+@receiver(post_save, sender=GlossaryNutrient)
+@receiver(post_delete, sender=GlossaryNutrient)
+@receiver(post_save, sender=Nutrient)
+@receiver(post_delete, sender=Nutrient)
+def invalidate_glossary_data_pages(sender, **kwargs):
+    _invalidate_on_commit(['glossary'])
+
+
+@receiver(post_save, sender=RecipeReview)
+@receiver(post_delete, sender=RecipeReview)
+def invalidate_review_pages(sender, instance, **kwargs):
+    slugs = Recipe.objects.filter(pk=instance.recipe_id).values_list('slug', flat=True)
+    # Listings show the stored rating aggregates too
+    _invalidate_on_commit(['recipes'] + [f'recipe:{slug}' for slug in slugs])
+
+
+@receiver(post_save, sender=ReviewReply)
+@receiver(post_delete, sender=ReviewReply)
+def invalidate_reply_pages(sender, instance, **kwargs):
+    slugs = RecipeReview.objects.filter(pk=instance.review_id).values_list('recipe__slug', flat=True)
+    _invalidate_on_commit([f'recipe:{slug}' for slug in slugs])
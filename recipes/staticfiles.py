@@ -0,0 +1,343 @@
+import gzip
+import mimetypes
+import os
+import posixpath
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are only made when the package is installed
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.otf', '.eot',
+}
+# Encodings in order of preference, with the suffix of their precompressed files
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_static_settings():
+    """
+    Returns the RECIPES_STATIC settings merged with their defaults.
+    """
+    options = {
+        'SERVE': not settings.DEBUG,
+        'SERVE_MEDIA': True,
+        'MAX_AGE': 60,
+        'IMMUTABLE_MAX_AGE': 365 * 24 * 60 * 60,
+        'SENDFILE_HEADER': None,
+        'SENDFILE_PREFIX': '/internal/',
+    }
+    options.update(getattr(settings, 'RECIPES_STATIC', {}))
+    return options
+
+
+def compress_file(path):
+    """
+    Write .gz and, when brotli is installed, .br copies of a file next to it.
+
+    Copies that would not save at least 5% are skipped, so the file is sent as is.
+
+    Returns:
+        list: Paths of the files written
+    """
+    with open(path, 'rb') as original:
+        content = original.read()
+
+    variants = [('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', lambda data: brotli.compress(data, quality=11)))
+
+    written = []
+    for suffix, compress in variants:
+        compressed = compress(content)
+        if len(compressed) < len(content) * 0.95:
+            with open(path + suffix, 'wb') as output:
+                output.write(compressed)
+            written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage that also precompresses the collected files.
+
+    collectstatic writes content-hashed copies of every file and a manifest
+    mapping the original names to them, then gzip (and brotli) variants of
+    the text assets, so nothing is compressed while serving.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = []
+        for name, hashed_name, result in super().post_process(paths, dry_run, **options):
+            processed.append((name, hashed_name))
+            yield name, hashed_name, result
+        if dry_run:
+            return
+
+        for name, hashed_name in processed:
+            for file_name in (name, hashed_name):
+                if isinstance(file_name, str) and os.path.splitext(file_name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                    path = self.path(file_name)
+                    if os.path.exists(path):
+                        compress_file(path)
+
+
+class StaticFile:
+    """
+    A file that can be served, with its precompressed variants.
+    """
+
+    def __init__(self, path, immutable=False):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.last_modified = http_date(stat.st_mtime)
+        self.etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.immutable = immutable
+        self.variants = [
+            (encoding, path + suffix, os.path.getsize(path + suffix))
+            for encoding, suffix in ENCODINGS
+            if os.path.exists(path + suffix)
+        ]
+
+    def select(self, accept_encoding):
+        """
+        Returns (encoding, path, size) of the preferred variant the client accepts.
+        """
+        accepted = {
+            token.split(';')[0].strip().lower()
+            for token in accept_encoding.split(',')
+            if not token.strip().endswith(';q=0')
+        }
+        for encoding, path, size in self.variants:
+            if encoding in accepted:
+                return encoding, path, size
+        return None, self.path, self.size
+
+
+def _iter_range(path, start, length, block_size=64 * 1024):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def parse_range(header, size):
+    """
+    Returns the (start, end) byte positions of a single-range Range header,
+    None to send the whole file, or False when it cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not size:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+class StaticFilesMiddleware:
+    """
+    Serve collected static files and media uploads before the rest of the stack.
+
+    Static files are indexed once at startup. Manifest-hashed names get
+    far-future immutable Cache-Control headers, precompressed .br/.gz
+    variants are chosen from Accept-Encoding, and bodies are sent with
+    FileResponse, which lets the WSGI server use sendfile(). With
+    SENDFILE_HEADER ('X-Accel-Redirect' or 'X-Sendfile'), the front web
+    server sends the file instead and the worker is released at once.
+    Media files support Range requests for large uploads.
+
+    Only active when RECIPES_STATIC['SERVE'] is set, by default when DEBUG is off.
+    Put it right after SecurityMiddleware. Under ASGI other requests pass
+    through without a thread switch and files are opened in a worker thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.options = get_static_settings()
+        if not self.options['SERVE']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.static_prefix = self._prefix(settings.STATIC_URL)
+        self.media_prefix = self._prefix(settings.MEDIA_URL) if self.options['SERVE_MEDIA'] else None
+        self.files = self.index_static_files()
+
+    @staticmethod
+    def _prefix(url):
+        return '/' + url.strip('/') + '/' if url and '://' not in url else None
+
+    def index_static_files(self):
+        """
+        Returns the URL path of every collected static file mapped to its StaticFile.
+        """
+        root = settings.STATIC_ROOT
+        if not root or not self.static_prefix or not os.path.isdir(root):
+            return {}
+
+        try:
+            storage = CompressedManifestStaticFilesStorage()
+        except ValueError:
+            # Unreadable manifest: serve everything with the short max-age
+            storage = None
+        hashed = set(storage.hashed_files.values()) if storage else set()
+        manifest_name = storage.manifest_name if storage else ManifestStaticFilesStorage.manifest_name
+        compressed_suffixes = tuple(suffix for _, suffix in ENCODINGS)
+
+        files = {}
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(compressed_suffixes) or name == manifest_name:
+                    continue
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, root).replace(os.sep, '/')
+                files[self.static_prefix + relative] = StaticFile(path, immutable=relative in hashed)
+        return files
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if request.method in ('GET', 'HEAD'):
+            response = self.serve_path(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method in ('GET', 'HEAD') and self.may_serve(request.path_info):
+            response = await sync_to_async(self.serve_path, thread_sensitive=False)(request)
+            if response is not None:
+                return response
+        return await self.get_response(request)
+
+    def may_serve(self, path):
+        """
+        Whether the path is a static file or may be a media file, without touching the file system.
+        """
+        return path in self.files or bool(self.media_prefix and path.startswith(self.media_prefix))
+
+    def serve_path(self, request):
+        """
+        Returns the response for the file at the request path, or None when there is no such file.
+        """
+        static_file = self.find_file(request.path_info)
+        return self.serve(request, static_file) if static_file is not None else None
+
+    def find_file(self, path):
+        static_file = self.files.get(path)
+        if static_file is not None:
+            return static_file
+        if self.media_prefix and path.startswith(self.media_prefix):
+            relative = posixpath.normpath(path[len(self.media_prefix):]).lstrip('/')
+            try:
+                full_path = safe_join(settings.MEDIA_ROOT, relative)
+            except Exception:
+                return None
+            if os.path.isfile(full_path):
+                # Derivatives are named after their content and never change
+                derivatives = self._derivatives_directory()
+                return StaticFile(full_path, immutable=relative.startswith(derivatives))
+        return None
+
+    @staticmethod
+    def _derivatives_directory():
+        from .images import get_image_settings
+
+        return get_image_settings()['DIRECTORY'].strip('/') + '/'
+
+    def cache_control(self, static_file):
+        if static_file.immutable:
+            return f"public, max-age={self.options['IMMUTABLE_MAX_AGE']}, immutable"
+        return f"public, max-age={self.options['MAX_AGE']}"
+
+    def serve(self, request, static_file):
+        encoding, path, size = static_file.select(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        # Each encoding is a different representation and needs its own ETag
+        etag = f'{static_file.etag[:-1]}-{encoding}"' if encoding else static_file.etag
+        headers = {
+            'Cache-Control': self.cache_control(static_file),
+            'ETag': etag,
+            'Last-Modified': static_file.last_modified,
+            'Accept-Ranges': 'bytes',
+        }
+        if static_file.variants:
+            headers['Vary'] = 'Accept-Encoding'
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*'):
+            response = HttpResponseNotModified()
+            for name, value in headers.items():
+                response[name] = value
+            return response
+
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header:
+            byte_range = parse_range(range_header, static_file.size)
+            if byte_range is False:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{static_file.size}'
+                return response
+            if byte_range is not None:
+                headers['ETag'] = static_file.etag
+                return self.serve_range(request, static_file, byte_range, headers)
+
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        sendfile_header = self.options['SENDFILE_HEADER']
+        if sendfile_header:
+            response = HttpResponse(content_type=static_file.content_type)
+            response[sendfile_header] = self.sendfile_location(path, sendfile_header)
+        elif request.method == 'HEAD':
+            response = HttpResponse(content_type=static_file.content_type)
+            response['Content-Length'] = size
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=static_file.content_type)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def serve_range(self, request, static_file, byte_range, headers):
+        start, end = byte_range
+        length = end - start + 1
+        body = [] if request.method == 'HEAD' else _iter_range(static_file.path, start, length)
+        response = StreamingHttpResponse(body, status=206, content_type=static_file.content_type)
+        for name, value in headers.items():
+            response[name] = value
+        response['Content-Range'] = f'bytes {start}-{end}/{static_file.size}'
+        response['Content-Length'] = length
+        return response
+
+    def sendfile_location(self, path, header):
+        if header.lower() == 'x-accel-redirect':
+            # nginx maps an internal location onto the project directory
+            relative = os.path.relpath(path, settings.BASE_DIR).replace(os.sep, '/')
+            return self.options['SENDFILE_PREFIX'].rstrip('/') + '/' + relative
+        return path
@@ -0,0 +1,309 @@
+"""
+Synthetic catalogs of any size, for finding scaling problems before real data does.
+
+Every record is a pure function of the seed and its position, so records
+are generated in worker processes, chunk by chunk, while the main process
+saves them with BulkImporter. The same options and seed always give the
+same catalog, whatever the number of workers.
+"""
+import math
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+
+from .importer import BulkImporter
+
+
+ADJECTIVES = [
+    'smoked', 'roasted', 'fresh', 'dried', 'ground', 'toasted', 'pickled', 'wild', 'sweet', 'spicy',
+    'golden', 'green', 'red', 'black', 'white', 'baby', 'young', 'aged', 'salted', 'crushed',
+    'whole', 'sliced', 'frozen', 'candied', 'creamy', 'crispy', 'sour', 'mild', 'hot', 'bitter',
+]
+FOODS = [
+    'paprika', 'garlic', 'onion', 'tomato', 'pepper', 'carrot', 'potato', 'lentil', 'chickpea', 'rice',
+    'barley', 'oat', 'almond', 'walnut', 'hazelnut', 'apple', 'pear', 'plum', 'cherry', 'lemon',
+    'lime', 'orange', 'ginger', 'cumin', 'fennel', 'basil', 'mint', 'parsley', 'thyme', 'sage',
+    'spinach', 'cabbage', 'leek', 'celery', 'mushroom', 'cheese', 'yogurt', 'butter', 'cream', 'egg',
+    'chicken', 'beef', 'lamb', 'salmon', 'cod', 'shrimp', 'tofu', 'bean', 'pea', 'corn',
+]
+DISHES = ['stew', 'soup', 'salad', 'pie', 'curry', 'risotto', 'bake', 'tart', 'roast', 'gratin', 'pilaf', 'skewers']
+SECTIONS = ['For the sauce', 'For the filling', 'For the dough', 'For the topping', 'For the marinade', 'To serve']
+PREPARATIONS = ['', '', 'finely chopped', 'sliced', 'to taste', 'at room temperature', 'drained', 'grated']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+NUTRIENTS = [
+    ('Calories', 'kcal', 'macro'), ('Protein', 'g', 'macro'), ('Carbohydrates', 'g', 'macro'),
+    ('Fat', 'g', 'macro'), ('Saturates', 'g', 'macro'), ('Sugars', 'g', 'macro'), ('Fiber', 'g', 'macro'),
+    ('Salt', 'g', 'other'), ('Vitamin A', 'mcg', 'vitamin'), ('Vitamin C', 'mg', 'vitamin'),
+    ('Vitamin D', 'mcg', 'vitamin'), ('Calcium', 'mg', 'mineral'), ('Iron', 'mg', 'mineral'),
+    ('Potassium', 'mg', 'mineral'), ('Sodium', 'mg', 'mineral'), ('Cholesterol', 'mg', 'other'),
+]
+
+
+def _rng(seed, kind, start):
+    # String seeds are hashed with SHA-512, so they do not depend on PYTHONHASHSEED
+    return random.Random(f'{seed}:{kind}:{start}')
+
+
+def tree_parent(index, count, roots, depth):
+    """
+    Returns the index of a node's parent in a tree of count nodes, or None for a root.
+
+    Nodes are laid out breadth first under roots top-level nodes, with the
+    branching factor that makes the tree about depth levels deep.
+    """
+    if index < roots or depth <= 1:
+        return None
+    branching = max(2, math.ceil((count / roots) ** (1 / max(depth - 1, 1))))
+    return (index - roots) // branching
+
+
+def term_name(index):
+    combos = len(ADJECTIVES) * len(FOODS)
+    name = f'{ADJECTIVES[index % len(ADJECTIVES)]} {FOODS[(index // len(ADJECTIVES)) % len(FOODS)]}'
+    return name if index < combos else f'{name} {index // combos + 1}'
+
+
+def category_slug(index):
+    return f'synthetic-category-{index}'
+
+
+def term_slug(index):
+    return f'synthetic-term-{index}'
+
+
+def recipe_slug(index):
+    return f'synthetic-recipe-{index}'
+
+
+def nutrient_list(count):
+    """
+    Returns count nutrient records, the common ones first.
+    """
+    nutrients = [{'name': name, 'unit': unit, 'nutrient_type': kind} for name, unit, kind in NUTRIENTS[:count]]
+    nutrients += [
+        {'name': f'Trace element {number}', 'unit': 'mcg', 'nutrient_type': 'micro'}
+        for number in range(1, count - len(nutrients) + 1)
+    ]
+    return nutrients
+
+
+def make_categories(span, seed, count, roots, depth):
+    start, stop = span
+    rng = _rng(seed, 'categories', start)
+    records = []
+    for index in range(start, stop):
+        parent = tree_parent(index, count, roots, depth)
+        records.append({
+            'name': f'{rng.choice(ADJECTIVES).title()} {rng.choice(DISHES)} {index}',
+            'slug': category_slug(index),
+            'parent': category_slug(parent) if parent is not None else None,
+        })
+    return records
+
+
+def make_terms(span, seed, count, roots, depth, glossary_categories):
+    start, stop = span
+    rng = _rng(seed, 'terms', start)
+    records = []
+    for index in range(start, stop):
+        name = term_name(index)
+        parent = tree_parent(index, count, roots, depth)
+        records.append({
+            'name': name,
+            'singular_name': name,
+            'plural_name': name + 's',
+            'slug': term_slug(index),
+            'description': f'{name.capitalize()}, a synthetic ingredient used for load testing.',
+            'category': f'Synthetic group {rng.randrange(glossary_categories)}' if glossary_categories else None,
+            'parent': term_slug(parent) if parent is not None else None,
+        })
+    return records
+
+
+def make_term_nutrition(span, seed, nutrients, per_term):
+    start, stop = span
+    rng = _rng(seed, 'nutrition', start)
+    names = [nutrient['name'] for nutrient in nutrients]
+    return [
+        {
+            'name': term_name(index),
+            'slug': term_slug(index),
+            'nutrition': {name: round(rng.uniform(0, 100), 2) for name in rng.sample(names, min(per_term, len(names)))},
+        }
+        for index in range(start, stop)
+    ]
+
+
+def make_ingredients_text(rng, terms, lines, sections):
+    """
+    Returns ingredient text with bracketed glossary terms, spread over # sections.
+    """
+    groups = [[] for _ in range(max(sections, 1))]
+    for number in range(lines):
+        term = term_name(rng.randrange(terms))
+        quantity = rng.choice(['', '1', '2', '3', '0.5', '1.5', '250', '400'])
+        written = f'[{term}s]' if quantity and float(quantity) > 1 and rng.random() < 0.3 else f'[{term}]'
+        preparation = rng.choice(PREPARATIONS)
+        line = ' '.join(part for part in (quantity, written, preparation) if part)
+        if rng.random() < 0.1:
+            line = f'salt and {rng.choice(FOODS)} to taste'
+        groups[number % len(groups)].append(line)
+
+    text = []
+    for number, group in enumerate(groups):
+        if number or sections > 1:
+            text.append(f'# {SECTIONS[number % len(SECTIONS)]}')
+        text.extend(group)
+        text.append('')
+    return '\n'.join(text).strip()
+
+
+def make_recipes(span, seed, terms, categories, lines, sections):
+    start, stop = span
+    rng = _rng(seed, 'recipes', start)
+    records = []
+    for index in range(start, stop):
+        name = f'{rng.choice(ADJECTIVES).title()} {rng.choice(FOODS)} {rng.choice(DISHES)} {index}'
+        section_count = rng.randint(1, sections) if sections > 1 else 1
+        ingredients_text = make_ingredients_text(rng, terms, rng.randint(max(lines // 2, 1), lines), section_count)
+        records.append({
+            'recipe_name': name,
+            'title': name,
+            'slug': recipe_slug(index),
+            'description': f'A synthetic {name.lower()} with {rng.randint(3, 12)} steps.',
+            'ingredients_text': ingredients_text,
+            'instructions': '\n'.join(f'Step {step}: mix, cook and season.' for step in range(1, rng.randint(3, 8))),
+            'preparation_time': rng.randint(5, 60),
+            'cooking_time': rng.randint(0, 180),
+            'servings': rng.randint(1, 8),
+            'difficulty': rng.choice(DIFFICULTIES),
+            'status': 1,
+            'views_count': rng.randint(0, 10000),
+            'categories': [category_slug(rng.randrange(categories)) for _ in range(rng.randint(1, 3))] if categories else [],
+            'related_terms': [term_slug(rng.randrange(terms)) for _ in range(rng.randint(0, 3))] if terms else [],
+            'related_recipes': [recipe_slug(other) for other in rng.sample(range(stop), min(rng.randint(0, 2), stop))
+                                if other != index],
+        })
+    return records
+
+
+def make_reviews(span, seed, recipes):
+    start, stop = span
+    rng = _rng(seed, 'reviews', start)
+    return [
+        {
+            'recipe': recipe_slug(rng.randrange(recipes)),
+            'user': None,
+            'name': f'Reviewer {index}',
+            'email': f'reviewer{index}@example.com',
+            'rating': rng.choices([1, 2, 3, 4, 5], [1, 1, 3, 6, 8])[0],
+            'review_text': f'Review number {index}.',
+            'is_approved': rng.random() < 0.9,
+        }
+        for index in range(start, stop)
+    ]
+
+
+def spans(count, chunk_size):
+    return [(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+
+def generate_in_pool(pool, make, total, chunk_size, window, **kwargs):
+    """
+    Yield the records of make() for range(total), generated chunk by chunk in a process pool.
+
+    At most window chunks are generated ahead of the consumer, which keeps
+    memory flat when generating is faster than saving.
+    """
+    pending = deque()
+    for span in spans(total, chunk_size):
+        pending.append(pool.submit(make, span, **kwargs))
+        if len(pending) >= window:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def _collect_links(records, links):
+    for record in records:
+        if record['related_recipes']:
+            links.append({'slug': record['slug'], 'related_recipes': record['related_recipes']})
+        yield record
+
+
+def generate_catalog(recipes=1000, categories=50, category_depth=3, category_roots=5,
+                     terms=500, glossary_depth=3, glossary_roots=20, glossary_categories=10,
+                     nutrients=16, nutrients_per_term=8, reviews=5000, ingredient_lines=12,
+                     ingredient_sections=3, seed=0, workers=1, chunk_size=1000, batch_size=500, log=None):
+    """
+    Generate a synthetic catalog and save it with BulkImporter.
+
+    Records that already exist are skipped by slug, so running it again with
+    the same options only adds what is missing.
+
+    Args:
+        recipes (int): Number of recipes
+        categories (int): Number of recipe categories
+        category_depth (int): Levels of the category trees
+        category_roots (int): Number of top-level categories
+        terms (int): Number of glossary terms
+        glossary_depth (int): Levels of the glossary trees
+        glossary_roots (int): Number of top-level glossary terms
+        glossary_categories (int): Number of glossary categories
+        nutrients (int): Number of nutrients
+        nutrients_per_term (int): Nutrient values given to each glossary term
+        reviews (int): Number of reviews, spread randomly over the recipes
+        ingredient_lines (int): Maximum number of ingredient lines per recipe
+        ingredient_sections (int): Maximum number of # sections per recipe
+        seed (int): Seed of the random generators
+        workers (int): Number of processes generating records
+        chunk_size (int): Number of records generated and saved at a time
+        batch_size (int): Number of rows per INSERT statement
+        log (callable, optional): Called with progress messages
+
+    Returns:
+        BulkImporter: The importer, with its stats and errors
+    """
+    log = log or (lambda message: None)
+    importer = BulkImporter(chunk_size=chunk_size, batch_size=batch_size)
+    nutrient_records = nutrient_list(nutrients)
+    category_roots = max(min(category_roots, categories), 1)
+    glossary_roots = max(min(glossary_roots, terms), 1)
+
+    # Workers never touch the database; none of its connections may be shared with them
+    connections.close_all()
+    workers = max(workers, 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def generate(make, total, **kwargs):
+            return generate_in_pool(pool, make, total, chunk_size, workers * 2, seed=seed, **kwargs)
+
+        log(f'Generating {categories} categories')
+        importer.import_categories(generate(make_categories, categories, count=categories,
+                                            roots=category_roots, depth=category_depth))
+        importer.import_glossary_categories(
+            {'category_name': f'Synthetic group {number}', 'description': 'Synthetic glossary category'}
+            for number in range(glossary_categories)
+        )
+        log(f'Generating {terms} glossary terms')
+        importer.import_glossary(generate(make_terms, terms, count=terms, roots=glossary_roots,
+                                          depth=glossary_depth, glossary_categories=glossary_categories))
+        importer.import_nutrients(nutrient_records)
+        importer.import_glossary_nutrients(generate(make_term_nutrition, terms, nutrients=nutrient_records,
+                                                    per_term=nutrients_per_term))
+
+        log(f'Generating {recipes} recipes')
+        recipe_options = {'terms': max(terms, 1), 'categories': categories,
+                          'lines': max(ingredient_lines, 1), 'sections': max(ingredient_sections, 1)}
+        # Links are saved once every recipe they point to exists
+        links = []
+        importer.import_recipes(_collect_links(generate(make_recipes, recipes, **recipe_options), links))
+        importer.import_recipe_links(links)
+        if recipes:
+            log(f'Generating {reviews} reviews')
+            importer.import_reviews(generate(make_reviews, reviews, recipes=recipes))
+
+    log('Rebuilding trees, nutrition, recommendations and review stats')
+    importer.finish()
+    return importer
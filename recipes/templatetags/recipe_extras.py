@@ -1,4 +1,8 @@
 from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from recipes import images
 
 register = template.Library()
 
@@ -49,3 +53,54 @@ def divide(value, arg):
         return float(value) / float(arg)
     except (ValueError, TypeError, ZeroDivisionError):
         return 0
+
+@register.filter
+def srcset(image, image_format='jpeg'):
+    """
+    Returns the srcset value listing the resized copies of an image.
+
+    Args:
+        image (FieldFile): Image field value, e.g. recipe.image
+        image_format (str): 'webp' or 'jpeg'
+
+    Returns:
+        str: "url 320w, url 640w, ...", empty until the copies exist
+    """
+    return images.srcset(image, image_format)
+
+@register.simple_tag
+def responsive_image(image, sizes='100vw', alt='', css_class=''):
+    """
+    Renders a <picture> with WebP and JPEG sources for an image.
+
+    Falls back to the original upload while its resized copies are being made.
+
+    Args:
+        image (FieldFile): Image field value, e.g. recipe.image
+        sizes (str): The sizes attribute, e.g. "(min-width: 768px) 33vw, 100vw"
+        alt (str): Alternative text
+        css_class (str): Class of the <img> element
+
+    Returns:
+        str: Safe HTML, or '' when there is no image
+    """
+    if not image:
+        return ''
+    derivatives = images.get_derivatives(image.name)
+    jpeg = [row for row in derivatives if row['format'] == 'jpeg']
+    fallback = image.url
+    if jpeg:
+        fallback = default_storage.url(jpeg[-1]['name'])
+    sources = format_html_join(
+        '', '<source type="image/{}" srcset="{}" sizes="{}">',
+        (
+            (image_format, value, sizes)
+            for image_format in ('webp', 'jpeg')
+            for value in [images.srcset(image, image_format)]
+            if value
+        ),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async"></picture>',
+        sources, fallback, alt, css_class,
+    )
@@ -1,3 +1,974 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .admin import RecipeAdmin
+from .cache import CSRF_PLACEHOLDER, TieredCache, cache_anonymous_page, get_cache
+from .catalog import CatalogError, export_catalog, import_catalog
+from .counters import ViewCountBuffer
+from .forms import RecipeFilterForm
+from .importer import BulkImporter, iter_records
+from .ingredients import parse_ingredients_text
+from .pagination import CachedCountPaginator, CursorPaginator
+from .matcher import VERSION_SCOPE, get_term_matcher, invalidate_term_matcher
+from .models import (
+    Category, Glossary, GlossaryNutrient, Nutrient, Recipe, RecipeIngredient, RecipeNutrition, RecipeRecommendation,
+    RecipeReview,
+)
+from .nutrition import NutritionEngine, rebuild_catalog_nutrition
+from .recommender import rebuild_recommendations
+from .resolver import (
+    VERSION_SCOPE as RESOLVER_SCOPE, IngredientResolver, bounded_distance, get_ingredient_resolver,
+    invalidate_ingredient_resolver,
+)
+from .search import SearchResults, search_ids
+from .views import category_detail_view, recipe_card_queryset
 
 # Create your tests here.
+
+def make_recipe(name, ingredients_text='', **fields):
+    slug = name.lower().replace(' ', '-')
+    values = {
+        'recipe_name': name, 'slug': slug, 'description': '', 'ingredients_text': ingredients_text,
+        'instructions': 'Cook.', 'preparation_time': 5, 'cooking_time': 10, 'servings': 2,
+    }
+    values.update(fields)
+    return Recipe.objects.create(**values)
+
+
+def make_term(name, **fields):
+    values = {'name': name, 'singular_name': name.lower(), 'slug': name.lower().replace(' ', '-'), 'description': ''}
+    values.update(fields)
+    return Glossary.objects.create(**values)
+
+
+class GlossaryTestCase(TestCase):
+    """
+    Drops the in-memory term matcher and resolver after each test, as rolled back terms stay in them.
+    """
+
+    def tearDown(self):
+        invalidate_term_matcher()
+        invalidate_ingredient_resolver()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class TermMatcherTests(GlossaryTestCase):
+    """
+    The term matcher links names to terms and recipes, and is rebuilt when any process invalidates it.
+    """
+
+    def test_lookup_prefers_names_and_recipes(self):
+        greens = make_term('Greens', plural_name='greens')
+        make_term('Green', plural_name='greens')
+        make_term('Egg', plural_name='eggs')
+        recipe = make_recipe('Egg salad')
+        matcher = get_term_matcher()
+
+        self.assertEqual(matcher.lookup(' GREENS ')['url'], greens.get_parent_url_with_anchor())
+        self.assertEqual(matcher.lookup('eggs')['original'], 'Egg')
+        self.assertEqual(matcher.lookup('egg salad')['type'], 'recipe')
+        self.assertIsNone(matcher.lookup('egg salad', exclude_recipe=recipe.pk))
+        self.assertIsNone(matcher.lookup('flour'))
+
+    def test_matcher_follows_the_shared_version(self):
+        egg = make_term('Egg')
+        matcher = get_term_matcher()
+        self.assertIs(get_term_matcher(), matcher)
+
+        # A rename saved by another process: this one only sees the version bump
+        Glossary.objects.filter(pk=egg.pk).update(name='Hen egg')
+        self.assertIs(get_term_matcher(), matcher)
+        get_cache().invalidate(VERSION_SCOPE)
+        self.assertEqual(get_term_matcher().lookup('hen egg')['original'], 'Hen egg')
+
+
+class IngredientHtmlTests(GlossaryTestCase):
+    """
+    Ingredient HTML is stored on the recipe and re-rendered only when its links change.
+    """
+
+    def test_saving_a_recipe_stores_its_ingredient_html(self):
+        make_term('Egg', plural_name='eggs')
+        recipe = make_recipe('Omelette', '2 [eggs]\n# Filling\n1 [cheese]')
+        html = Recipe.objects.get(pk=recipe.pk).ingredients_html
+        self.assertIn('<a href="/glossary/egg/">eggs</a>', html)
+        self.assertIn('ingredient-section-heading">Filling</h5>', html)
+
+    def test_new_term_refreshes_only_recipes_using_it(self):
+        omelette = make_recipe('Omelette', '2 [eggs]')
+        bread = make_recipe('Bread', '500 [flour]')
+        Recipe.objects.filter(pk=bread.pk).update(ingredients_html='unchanged')
+
+        make_term('Egg', plural_name='eggs')
+        self.assertIn('<a href="/glossary/egg/">eggs</a>', Recipe.objects.get(pk=omelette.pk).ingredients_html)
+        self.assertEqual(Recipe.objects.get(pk=bread.pk).ingredients_html, 'unchanged')
+
+    def test_renamed_slug_updates_stored_links(self):
+        egg = make_term('Egg', plural_name='eggs')
+        recipe = make_recipe('Omelette', '2 [eggs]')
+        egg.slug = 'hen-egg'
+        egg.save()
+        html = Recipe.objects.get(pk=recipe.pk).ingredients_html
+        self.assertIn('/hen-egg/', html)
+        self.assertNotIn('/egg/', html)
+
+    def test_saving_a_stale_instance_keeps_refreshed_links(self):
+        egg = make_term('Egg', plural_name='eggs')
+        recipe = make_recipe('Omelette', '2 [eggs]')
+        stale = Recipe.objects.get(pk=recipe.pk)
+        egg.slug = 'hen-egg'
+        egg.save()
+
+        stale.description = 'Fluffy.'
+        stale.save()
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(recipe.description, 'Fluffy.')
+        self.assertIn('/hen-egg/', recipe.ingredients_html)
+
+
+class NutritionRebuildTests(GlossaryTestCase):
+    """
+    Stored nutrition follows edits to recipes and to glossary nutrient values.
+    """
+
+    def setUp(self):
+        self.calories = Nutrient.objects.create(name='Calories', unit='kcal')
+        self.egg = make_term('Egg', plural_name='eggs')
+        self.value = GlossaryNutrient.objects.create(glossary=self.egg, nutrient=self.calories, value=70)
+        self.recipe = make_recipe('Boiled eggs', '2 [egg]')
+
+    def total(self):
+        return RecipeNutrition.objects.get(recipe=self.recipe, nutrient=self.calories).total
+
+    def test_editing_ingredients_rebuilds_totals(self):
+        self.recipe.ingredients_text = '3 [egg]'
+        self.recipe.save()
+        self.assertAlmostEqual(self.total(), 2.1)
+
+    def test_changed_nutrient_value_rebuilds_recipes_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.value.value = 140
+            self.value.save()
+        self.assertAlmostEqual(self.total(), 2.8)
+
+    def test_deleted_nutrient_value_clears_totals(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.value.delete()
+        self.assertFalse(RecipeNutrition.objects.filter(recipe=self.recipe, total__gt=0).exists())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SearchIndexTests(GlossaryTestCase):
+    """
+    The FTS5 index ranks recipes and glossary terms together and follows saves and deletes.
+    """
+
+    def setUp(self):
+        self.soup = make_recipe('Tomato soup', description='Blended and served hot.')
+        self.salad = make_recipe('Summer salad', description='Ripe tomatoes with basil.')
+        self.term = make_term('Tomato', description='A red fruit used as a vegetable.')
+
+    def titles(self, query, **kwargs):
+        return [(result['kind'], result['title']) for result in SearchResults(query, **kwargs)[:10]]
+
+    def test_results_mix_kinds_ranked_by_title(self):
+        titles = self.titles('tomato')
+        self.assertEqual(len(titles), 3)
+        self.assertEqual({kind for kind, title in titles}, {'recipe', 'glossary'})
+        # Title matches are weighted above a mention in the description
+        self.assertEqual(titles[-1], ('recipe', 'Summer salad'))
+        self.assertEqual(self.titles('tomato', kinds=['glossary']), [('glossary', 'Tomato')])
+        self.assertEqual(SearchResults('tomato').count(), 3)
+
+    def test_words_match_as_prefixes(self):
+        self.assertEqual(self.titles('tom sou'), [('recipe', 'Tomato soup')])
+        self.assertEqual(SearchResults('summ').count(), 1)
+
+    def test_admin_search_uses_the_index(self):
+        model_admin = RecipeAdmin(Recipe, admin.site)
+        request = RequestFactory().get('/admin/recipes/recipe/', {'q': 'tomat'})
+        queryset, use_distinct = model_admin.get_search_results(request, Recipe.objects.all(), 'tomat')
+        self.assertFalse(use_distinct)
+        self.assertEqual(set(queryset), {self.soup, self.salad})
+
+    def test_deleted_objects_leave_the_index(self):
+        self.soup.delete()
+        self.term.delete()
+        self.assertEqual(self.titles('tomato'), [('recipe', 'Summer salad')])
+        self.assertEqual(SearchResults('tomato').count(), 1)
+
+    def test_punctuation_only_queries_match_nothing(self):
+        for query in ('?!', '"*"', '-- ()'):
+            results = SearchResults(query)
+            self.assertEqual(results.count(), 0)
+            self.assertEqual(results[:10], [])
+            self.assertEqual(list(Recipe.objects.filter(pk__in=search_ids(Recipe, query))), [])
+
+
+class TieredCacheTests(GlossaryTestCase):
+    """
+    Cached entries are dropped by invalidating their scopes, and cached pages get the visitor's CSRF token.
+    """
+
+    def setUp(self):
+        caches['default'].clear()
+        get_cache().local.clear()
+
+    def test_invalidating_a_scope_changes_its_keys(self):
+        cache = TieredCache(local_max_entries=10)
+        key = cache.make_key('page', ['recipes', 'categories'])
+        cache.set(key, 'cached')
+        self.assertEqual(cache.get(key), 'cached')
+        self.assertEqual(cache.make_key('page', ['recipes', 'categories']), key)
+
+        cache.invalidate('categories')
+        self.assertNotEqual(cache.make_key('page', ['recipes', 'categories']), key)
+        self.assertEqual(cache.make_key('page', ['recipes']), cache.make_key('page', ['recipes']))
+
+    def test_local_tier_evicts_least_recently_used(self):
+        cache = TieredCache(local_max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual([cache.local.get(key)[0] for key in 'abc'], [True, False, True])
+        # The shared tier still has the evicted entry
+        self.assertEqual(cache.get('b'), 2)
+        self.assertEqual(cache.get_stats()['shared_hits'], 1)
+
+    def test_local_copy_of_a_shared_entry_expires_with_it(self):
+        writer = TieredCache(local_max_entries=10)
+        reader = TieredCache(local_max_entries=10)
+        writer.set('page', 'cached', timeout=30)
+        self.assertEqual(reader.get('page'), 'cached')
+        self.assertEqual(reader.get_stats()['shared_hits'], 1)
+
+        later = time.monotonic() + 31
+        with mock.patch('recipes.cache.time.monotonic', return_value=later):
+            self.assertEqual(reader.local.get('page'), (False, None))
+
+    def test_cached_page_gets_the_visitors_csrf_token(self):
+        calls = []
+
+        @cache_anonymous_page('recipes')
+        def page(request):
+            calls.append(request)
+            return HttpResponse('<input type="hidden" name="csrfmiddlewaretoken" value="first-token">')
+
+        factory = RequestFactory()
+        first = factory.get('/page/')
+        first.user = AnonymousUser()
+        self.assertEqual(page(first)['X-Cache'], 'MISS')
+        key = get_cache().make_key('page:page', ['recipes'], '/page/')
+        self.assertIn(CSRF_PLACEHOLDER, get_cache().get(key)[1])
+
+        second = factory.get('/page/')
+        second.user = AnonymousUser()
+        response = page(second)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(calls), 1)
+        content = response.content.decode()
+        self.assertNotIn(CSRF_PLACEHOLDER, content)
+        self.assertNotIn('first-token', content)
+        # The visitor was given a token of their own
+        self.assertIn('CSRF_COOKIE', second.META)
+
+        get_cache().invalidate('recipes')
+        self.assertEqual(page(second)['X-Cache'], 'MISS')
+
+    def test_pages_linking_to_a_renamed_recipe_are_invalidated(self):
+        pancake = make_recipe('Pancake')
+        brunch = make_recipe('Brunch', '2 [pancake]')
+        make_recipe('Dinner', '1 [soup]')
+        versions = {slug: get_cache().get_version(f'recipe:{slug}') for slug in ('brunch', 'dinner')}
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pancake.slug = 'fluffy-pancake'
+            pancake.save()
+        self.assertIn('/fluffy-pancake/', Recipe.objects.get(pk=brunch.pk).ingredients_html)
+        self.assertNotEqual(get_cache().get_version('recipe:brunch'), versions['brunch'])
+        self.assertEqual(get_cache().get_version('recipe:dinner'), versions['dinner'])
+
+
+class ViewCountBufferTests(TestCase):
+    """
+    Recipe views are counted in memory and written in one query per flush.
+    """
+
+    def setUp(self):
+        self.soup = make_recipe('Soup', views_count=5)
+        self.salad = make_recipe('Salad', views_count=None)
+
+    def views(self, recipe):
+        return Recipe.objects.get(pk=recipe.pk).views_count
+
+    def test_counts_are_written_once_the_buffer_is_full(self):
+        counter = ViewCountBuffer(flush_size=3, background=False)
+        counter.add('soup')
+        counter.add('salad')
+        self.assertEqual(self.views(self.soup), 5)
+        self.assertEqual(counter.pending(), {'soup': 1, 'salad': 1})
+
+        with self.assertNumQueries(1):
+            counter.add('soup')
+        self.assertEqual(counter.pending(), {})
+        self.assertEqual(self.views(self.soup), 7)
+        self.assertEqual(self.views(self.salad), 1)
+
+    def test_failed_flush_keeps_the_counts(self):
+        counter = ViewCountBuffer(flush_size=100, background=False)
+        counter.add('soup', 2)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError), self.assertLogs('recipes.counters'):
+            self.assertEqual(counter.flush(), 0)
+        self.assertEqual(counter.pending(), {'soup': 2})
+
+        counter.add('soup')
+        self.assertEqual(counter.flush(), 1)
+        self.assertEqual(self.views(self.soup), 8)
+
+
+class ReviewStatsTests(TestCase):
+    """
+    Review aggregates stored on the recipe follow approved reviews only.
+    """
+
+    def setUp(self):
+        self.recipe = make_recipe('Soup')
+
+    def stats(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        return recipe.countReview(), recipe.averageReview(), recipe.get_star_counts()
+
+    def review(self, email, rating, is_approved=True):
+        return RecipeReview.objects.create(recipe=self.recipe, email=email, rating=rating, is_approved=is_approved)
+
+    def test_approved_reviews_update_the_aggregates(self):
+        self.review('a@example.com', 5)
+        self.review('b@example.com', 2)
+        pending = self.review('c@example.com', 1, is_approved=False)
+        count, average, stars = self.stats()
+        self.assertEqual((count, average), (2, 3.5))
+        self.assertEqual(stars, {5: 1, 4: 0, 3: 0, 2: 1, 1: 0})
+
+        pending.is_approved = True
+        pending.save()
+        self.assertEqual(self.stats()[:2], (3, 8 / 3))
+
+    def test_changed_and_deleted_reviews_are_subtracted(self):
+        review = self.review('a@example.com', 5)
+        self.review('b@example.com', 3)
+        review.rating = 4
+        review.save()
+        self.assertEqual(self.stats()[2][4], 1)
+        self.assertEqual(self.stats()[2][5], 0)
+
+        review.delete()
+        self.assertEqual(self.stats(), (1, 3, {5: 0, 4: 0, 3: 1, 2: 0, 1: 0}))
+
+    def test_recount_fixes_reviews_approved_with_update(self):
+        self.review('a@example.com', 4, is_approved=False)
+        RecipeReview.objects.update(is_approved=True)
+        self.assertEqual(self.stats()[0], 0)
+
+        self.assertEqual(Recipe.recount_review_stats([self.recipe.pk]), 1)
+        self.assertEqual(self.stats()[:2], (1, 4))
+        self.assertEqual(Recipe.recount_review_stats(), 0)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RECIPES_VIEW_COUNTER={'BACKGROUND': False, 'FLUSH_SIZE': 1000, 'FLUSH_INTERVAL': 10},
+)
+class ListQueryCountTests(TestCase):
+    """
+    The number of queries for a page of recipes must not grow with the page size.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.categories = [
+            Category.objects.create(name=f'Category {i}', slug=f'category-{i}')
+            for i in range(3)
+        ]
+
+    def create_recipes(self, count):
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                recipe_name=f'Recipe {i}',
+                slug=f'recipe-{i}',
+                description='Description',
+                ingredients_text='2 [egg]\n1 [flour]',
+                instructions='Mix and bake.',
+                preparation_time=5,
+                cooking_time=10,
+                servings=2,
+            )
+            recipe.categories.set(self.categories)
+            RecipeReview.objects.create(
+                recipe=recipe, name='Guest', email=f'guest{i}@example.com', rating=4, is_approved=True
+            )
+
+    def render_cards(self, queryset):
+        # Everything the list cards touch for each recipe
+        for recipe in queryset:
+            recipe.get_absolute_url()
+            [category.name for category in recipe.categories.all()]
+            recipe.averageReview()
+            recipe.countReview()
+            recipe.image
+
+    def test_recipe_list_queries_do_not_depend_on_page_size(self):
+        for count in (3, 12):
+            Recipe.objects.all().delete()
+            self.create_recipes(count)
+            with self.assertNumQueries(2):
+                self.render_cards(recipe_card_queryset()[:12])
+
+    def test_category_recipes_queries_do_not_depend_on_page_size(self):
+        for count in (3, 12):
+            Recipe.objects.all().delete()
+            self.create_recipes(count)
+            with self.assertNumQueries(2):
+                self.render_cards(recipe_card_queryset().filter(categories=self.categories[0]))
+
+    def test_list_cards_defer_long_text(self):
+        self.create_recipes(1)
+        recipe = recipe_card_queryset().get()
+        self.assertEqual(
+            recipe.get_deferred_fields(),
+            {'instructions', 'ingredients_text', 'ingredients_html'},
+        )
+
+    def test_admin_changelist_queries_do_not_depend_on_page_size(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(admin_user)
+        url = reverse('admin:recipes_recipe_changelist')
+
+        self.create_recipes(3)
+        with CaptureQueriesContext(connection) as small_page:
+            self.client.get(url)
+
+        Recipe.objects.all().delete()
+        self.create_recipes(30)
+        with self.assertNumQueries(len(small_page)):
+            self.client.get(url)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PaginationTests(TestCase):
+    """
+    Keyset pages cover every row exactly once, and page counts are cached per scope.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Few distinct servings, so the seek must break ties on the id
+        for i in range(11):
+            make_recipe(f'Recipe {i}', servings=i % 3)
+
+    def setUp(self):
+        caches['default'].clear()
+        get_cache().local.clear()
+
+    def test_cursor_pages_walk_forward_and_back(self):
+        queryset = Recipe.objects.all()
+        expected = list(queryset.order_by('-servings', 'id').values_list('id', flat=True))
+        paginator = CursorPaginator(queryset, 4, ('-servings', 'id'))
+
+        pages, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.get_page(cursor)
+            pages.append(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([recipe.pk for page in pages for recipe in page], expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 3])
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.get_page(pages[2].previous_cursor)
+        self.assertEqual([recipe.pk for recipe in back], [recipe.pk for recipe in pages[1]])
+        self.assertTrue(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_malformed_cursor_returns_the_first_page(self):
+        paginator = CursorPaginator(Recipe.objects.all(), 4, ('-servings', 'id'))
+        first = [recipe.pk for recipe in paginator.get_page()]
+        for cursor in ('not-a-cursor', 'WyJuZXh0IiwgWzFdXQ'):
+            self.assertEqual([recipe.pk for recipe in paginator.get_page(cursor)], first)
+
+    def test_count_is_cached_until_its_scope_is_invalidated(self):
+        queryset = Recipe.objects.filter(servings__gt=0)
+        self.assertEqual(CachedCountPaginator(queryset, 4, scopes=('recipes',)).count, 7)
+        make_recipe('Stew', servings=4)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset, 4, scopes=('recipes',)).num_pages, 2)
+
+        get_cache().invalidate('recipes')
+        self.assertEqual(CachedCountPaginator(queryset, 4, scopes=('recipes',)).count, 8)
+
+
+    def render_category(self, **params):
+        request = RequestFactory().get(reverse('category_detail', args=['mains']), params)
+        request.user = AnonymousUser()
+        with mock.patch('recipes.views.render', return_value=HttpResponse()) as render:
+            category_detail_view(request, slug='mains')
+        return render.call_args.args[2]
+
+    def test_category_detail_pages_its_recipes(self):
+        for i in range(11, 14):
+            make_recipe(f'Recipe {i}')
+        category = Category.objects.create(name='Mains', slug='mains')
+        category.recipes.set(Recipe.objects.all())
+
+        first = self.render_category()
+        self.assertTrue(first['is_paginated'])
+        self.assertEqual(len(first['recipes']), 12)
+        self.assertEqual(len(self.render_category(page=2)['recipes']), 2)
+
+        cursor_page = self.render_category(cursor='')
+        self.assertEqual(len(cursor_page['recipes']), 12)
+        following = self.render_category(cursor=cursor_page['recipes'].next_cursor)
+        self.assertEqual(
+            {recipe.pk for recipe in cursor_page['recipes']} | {recipe.pk for recipe in following['recipes']},
+            set(Recipe.objects.values_list('pk', flat=True)),
+        )
+
+
+class BulkImporterTests(GlossaryTestCase):
+    """
+    Bulk imports link references by slug or name and bring derived data up to date in finish().
+    """
+
+    def import_records(self, importer):
+        importer.import_categories([{'name': 'Soups'}, {'name': 'Cold soups', 'parent': 'Soups'}])
+        importer.import_glossary([{'name': 'Egg'}, {'name': 'Quail egg', 'parent': 'Egg'}])
+        importer.import_nutrients([{'name': 'Calories', 'unit': 'kcal'}])
+        importer.import_glossary_nutrients([{'name': 'egg', 'nutrition': {'calories': 150}}])
+        importer.import_recipes([{
+            'recipe_name': 'Egg drop soup', 'ingredients_text': '2 [egg]\n1 [stock]',
+            'categories': ['Cold soups'], 'related_terms': ['Egg'],
+        }])
+        importer.finish()
+
+    def test_import_links_references_and_rebuilds_derived_data(self):
+        importer = BulkImporter(chunk_size=1)
+        self.import_records(importer)
+        self.assertEqual(importer.errors, [])
+
+        cold = Category.objects.get(slug='cold-soups')
+        self.assertEqual(cold.parent.slug, 'soups')
+        self.assertEqual(cold.level, 1)
+        recipe = Recipe.objects.get(slug='egg-drop-soup')
+        self.assertEqual(list(recipe.categories.all()), [cold])
+        self.assertEqual([term.name for term in recipe.related_terms.all()], ['Egg'])
+        self.assertAlmostEqual(recipe.nutrition.get(nutrient__name='Calories').total, 3)
+
+    def test_existing_records_are_skipped(self):
+        self.import_records(BulkImporter())
+        importer = BulkImporter()
+        self.import_records(importer)
+        self.assertEqual(
+            {key: importer.stats[key] for key in ('categories', 'glossary', 'recipes')},
+            {'categories': 0, 'glossary': 0, 'recipes': 0},
+        )
+        self.assertEqual(importer.stats['recipes_existing'], 1)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_unknown_parents_are_reported(self):
+        importer = BulkImporter()
+        importer.import_categories([{'name': 'Stews', 'parent': 'missing'}])
+        importer.finish()
+        self.assertEqual(importer.errors, ['Parent not found for Stews: missing'])
+        self.assertIsNone(Category.objects.get(slug='stews').parent)
+
+    def test_iter_records_streams_arrays_and_lines(self):
+        records = [{'name': f'Term {i}', 'description': 'x' * i} for i in range(20)]
+        with tempfile.TemporaryDirectory() as directory:
+            array, lines = os.path.join(directory, 'terms.json'), os.path.join(directory, 'terms.jsonl')
+            with open(array, 'w', encoding='utf-8') as f:
+                json.dump(records, f, indent=2)
+            with open(lines, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(json.dumps(record) for record in records))
+            self.assertEqual(list(iter_records(array, read_size=7)), records)
+            self.assertEqual(list(iter_records(lines)), records)
+
+
+class CatalogRoundTripTests(GlossaryTestCase):
+    """
+    An exported catalog imports back into the same catalog, and a damaged file is refused before any write.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'catalog.jsonl.gz')
+
+        soups = Category.objects.create(name='Soups', slug='soups')
+        Category.objects.create(name='Cold soups', slug='cold-soups', parent=soups)
+        egg = make_term('Egg', plural_name='eggs')
+        calories = Nutrient.objects.create(name='Calories', unit='kcal')
+        GlossaryNutrient.objects.create(glossary=egg, nutrient=calories, value=150)
+        recipe = make_recipe('Egg drop soup', '2 [eggs]')
+        recipe.categories.add(soups)
+        RecipeReview.objects.create(recipe=recipe, email='a@example.com', rating=4, is_approved=True)
+
+    def snapshot(self):
+        recipe = Recipe.objects.get(slug='egg-drop-soup')
+        return {
+            'categories': list(Category.objects.order_by('tree_id', 'lft').values_list('slug', 'parent__slug', 'level')),
+            'recipe': (recipe.ingredients_text, recipe.review_count, recipe.rating_sum),
+            'recipe_categories': list(recipe.categories.values_list('slug', flat=True)),
+            'nutrition': list(recipe.nutrition.values_list('nutrient__name', 'total')),
+            'created_at': recipe.created_at,
+        }
+
+    def test_export_and_import_round_trip(self):
+        before = self.snapshot()
+        counts = export_catalog(self.path)
+        self.assertEqual((counts['categories'], counts['glossary'], counts['recipes'], counts['reviews']), (2, 1, 1, 1))
+
+        importer = import_catalog(self.path)
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(self.snapshot(), before)
+        self.assertFalse(os.path.exists(f'{self.path}.progress'))
+
+    def test_damaged_catalog_is_refused(self):
+        export_catalog(self.path)
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            content = f.read()
+        with gzip.open(self.path, 'wt', encoding='utf-8') as f:
+            f.write(content.replace('Egg drop soup', 'Egg drop stew'))
+
+        with self.assertRaisesMessage(CatalogError, 'Checksum mismatch in section recipes'):
+            import_catalog(self.path)
+        self.assertTrue(Recipe.objects.filter(slug='egg-drop-soup').exists())
+
+    def test_resume_skips_committed_sections(self):
+        export_catalog(self.path)
+        import_catalog(self.path, chunk_size=1)
+        # A run that stopped after the categories section
+        with open(f'{self.path}.progress', 'w', encoding='utf-8') as f:
+            with gzip.open(self.path, 'rt', encoding='utf-8') as catalog:
+                catalog_id = json.loads(catalog.readline()[len('#catalog '):])['id']
+            json.dump({'catalog': catalog_id, 'done': ['nutrients', 'glossary_categories', 'categories'],
+                       'section': None, 'records': 0}, f)
+        Category.objects.filter(slug='cold-soups').delete()
+
+        importer = import_catalog(self.path, resume=True)
+        self.assertEqual(importer.stats['categories'], 0)
+        self.assertEqual(importer.stats['glossary_existing'], 1)
+        self.assertFalse(Category.objects.filter(slug='cold-soups').exists())
+
+
+@override_settings(RECIPES_RECOMMENDER={'MIN_SCORE': 0.01})
+class RecommendationTests(TestCase):
+    """
+    Stored recommendations rank recipes by shared features, and saves refresh them like a full rebuild would.
+    """
+
+    def setUp(self):
+        self.pancakes = make_recipe('Pancakes', '2 [eggs]\n200 [flour]\n300 [milk]')
+        self.crepes = make_recipe('Crepes', '2 [eggs]\n100 [flour]\n400 [milk]\n1 [butter]')
+        self.omelette = make_recipe('Omelette', '3 [eggs]\n1 [butter]')
+        self.salad = make_recipe('Salad', '1 [lettuce]')
+
+    def stored(self):
+        return list(RecipeRecommendation.objects.order_by('recipe', 'rank').values_list('recipe', 'recommended', 'rank'))
+
+    def test_rebuild_ranks_recipes_by_shared_features(self):
+        self.assertEqual(rebuild_recommendations(), 4)
+        recommended = list(self.pancakes.recommendations.values_list('recommended', flat=True))
+        self.assertEqual(recommended, [self.crepes.pk, self.omelette.pk])
+        self.assertFalse(self.salad.recommendations.exists())
+        self.assertFalse(RecipeRecommendation.objects.filter(recommended=self.salad).exists())
+
+    def test_saving_a_recipe_refreshes_like_a_rebuild(self):
+        rebuild_recommendations()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salad.ingredients_text = '1 [lettuce]\n2 [eggs]\n1 [butter]'
+            self.salad.save()
+        refreshed = self.stored()
+        self.assertIn((self.omelette.pk, self.salad.pk), [(recipe, recommended) for recipe, recommended, _ in refreshed])
+
+        rebuild_recommendations()
+        self.assertEqual(refreshed, self.stored())
+
+    def test_hand_picked_recipes_come_first(self):
+        rebuild_recommendations()
+        self.pancakes.related_recipes.add(self.salad)
+        self.assertEqual(self.pancakes.get_related_recipes(limit=2), [self.salad, self.crepes])
+        self.assertEqual(async_to_sync(self.pancakes.aget_related_recipes)(limit=2), [self.salad, self.crepes])
+
+
+class IngredientParserTests(GlossaryTestCase):
+    """
+    Ingredient lines are parsed once into rows that follow the recipe text and the glossary.
+    """
+
+    def test_parse_lines_with_sections_quantities_and_units(self):
+        parsed = parse_ingredients_text('1 [egg]\n\n# Sauce\n2.5 tbsp. [olive oil] and [lemon]\nsalt to taste\n')
+        self.assertEqual(
+            [(line.section, line.position, line.quantity, line.unit, line.term) for line in parsed],
+            [('', 0, 1.0, '', 'egg'), ('Sauce', 1, 2.5, 'tbsp', 'olive oil'), ('Sauce', 2, None, '', 'salt to taste')],
+        )
+        self.assertEqual(parsed[1].terms, ['olive oil', 'lemon'])
+        self.assertEqual(parsed[1].text, 'tbsp. [olive oil] and [lemon]')
+        self.assertEqual(parse_ingredients_text(None), [])
+
+    def test_rows_follow_the_recipe_text(self):
+        egg = make_term('Egg', plural_name='eggs')
+        recipe = make_recipe('Omelette', '2 [eggs]\n1 [cheese]')
+        self.assertEqual(list(recipe.ingredients.values_list('term', 'glossary')), [('eggs', egg.pk), ('cheese', None)])
+
+        recipe.ingredients_text = '3 [eggs]'
+        recipe.save()
+        self.assertEqual(list(recipe.ingredients.values_list('quantity', 'term')), [(3.0, 'eggs')])
+
+    def test_rows_resolve_to_new_and_deleted_terms(self):
+        recipe = make_recipe('Cheese toast', '1 [cheese]\n1 slice [bread]')
+        cheese = make_term('Cheese')
+        self.assertEqual(recipe.ingredients.get(term='cheese').glossary, cheese)
+
+        cheese.delete()
+        self.assertIsNone(recipe.ingredients.get(term='cheese').glossary)
+
+
+class CatalogNutritionTests(GlossaryTestCase):
+    """
+    The in-database nutrition rebuild writes the same rows as the Python engine.
+    """
+
+    def setUp(self):
+        protein = Nutrient.objects.create(name='Protein', unit='g')
+        zinc = Nutrient.objects.create(name='Zinc', unit='mg')
+        egg = make_term('Egg', plural_name='eggs')
+        flour = make_term('Flour', plural_name='flour')
+        GlossaryNutrient.objects.create(glossary=egg, nutrient=protein, value=13)
+        GlossaryNutrient.objects.create(glossary=egg, nutrient=zinc, value=1.3)
+        GlossaryNutrient.objects.create(glossary=flour, nutrient=protein, value=10)
+
+        make_recipe('Pasta', '3 [eggs]\n300 g [flour]\n1 [salt]', servings=4)
+        make_recipe('Boiled egg', 'egg', servings=0)
+        make_recipe('Water', '')
+        # Loaded without signals, e.g. from a fixture
+        RecipeIngredient.objects.filter(recipe__slug='boiled-egg').delete()
+
+    def stored(self):
+        return sorted(
+            (recipe_id, nutrient_id, round(total, 6), per_serving and round(per_serving, 6), round(daily_value, 6))
+            for recipe_id, nutrient_id, total, per_serving, daily_value in RecipeNutrition.objects.values_list(
+                'recipe', 'nutrient', 'total', 'per_serving', 'daily_value')
+        )
+
+    def expected(self):
+        rows = NutritionEngine().nutrition_rows(Recipe.objects.all())
+        return sorted(
+            (recipe_id, nutrient_id, round(total, 6), per_serving and round(per_serving, 6), round(daily_value, 6))
+            for recipe_id, nutrient_id, total, per_serving, daily_value in rows
+        )
+
+    def test_rebuild_matches_the_engine(self):
+        RecipeNutrition.objects.all().delete()
+        self.assertEqual(rebuild_catalog_nutrition(chunk_size=2), 6)
+        self.assertEqual(self.stored(), self.expected())
+        pasta = RecipeNutrition.objects.get(recipe__slug='pasta', nutrient__name='Protein')
+        self.assertAlmostEqual(pasta.total, 30.39)
+        self.assertAlmostEqual(pasta.daily_value, 60.78)
+
+    def test_rebuild_of_some_recipes_keeps_the_others(self):
+        pasta = Recipe.objects.get(slug='pasta')
+        Recipe.objects.filter(pk=pasta.pk).update(servings=2)
+        water = RecipeNutrition.objects.filter(recipe__slug='water')
+        water.update(total=99)
+
+        rebuild_catalog_nutrition([pasta.pk])
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=pasta, nutrient__name='Protein').per_serving, 15.195)
+        self.assertEqual(set(water.values_list('total', flat=True)), {99})
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IngredientResolverTests(GlossaryTestCase):
+    """
+    Plain ingredient lines resolve to glossary terms by exact forms first, then by close spellings.
+    """
+
+    def setUp(self):
+        calories = Nutrient.objects.create(name='Calories', unit='kcal')
+        self.egg = make_term('Egg', plural_name='eggs')
+        self.tomato = make_term('Tomato', plural_name='tomatoes')
+        self.milk = make_term('Milk', plural_name='milk')
+        self.whole_milk = make_term('Whole milk', plural_name='whole milk')
+        self.paprika = make_term('Paprika', plural_name='paprika')
+        self.smoked = make_term('Smoked paprika', plural_name='smoked paprika', parent=self.paprika)
+        GlossaryNutrient.objects.create(glossary=self.paprika, nutrient=calories, value=280)
+        self.resolver = IngredientResolver.build()
+
+    def test_quantities_units_and_descriptors_are_left_out(self):
+        self.assertEqual(self.resolver.resolve('2 large eggs'), self.egg.pk)
+        self.assertEqual(self.resolver.resolve('3 ripe tomatoes, chopped'), self.tomato.pk)
+        self.assertEqual(self.resolver.resolve('1 cup whole milk'), self.whole_milk.pk)
+        self.assertEqual(self.resolver.resolve('200 ml (1 cup) milk or cream'), self.milk.pk)
+
+    def test_close_spellings_within_the_length_limit(self):
+        self.assertEqual(self.resolver.resolve('2 tomatos'), self.tomato.pk)
+        # Too short for any edit
+        self.assertIsNone(self.resolver.resolve('1 cup fresh mlk'))
+        self.assertIsNone(self.resolver.resolve('1 banana'))
+        self.assertEqual(self.resolver.suggest('2 tomatto'), ('tomato', 1))
+        self.assertIsNone(self.resolver.suggest('banana'))
+        self.assertEqual(bounded_distance('tomatoes', 'tomato', 2), 2)
+        self.assertEqual(bounded_distance('tomatoes', 'potato', 1), 2)
+
+    def test_terms_without_values_fall_back_to_their_ancestor(self):
+        self.assertEqual(self.resolver.resolve('smoked paprika'), self.smoked.pk)
+        self.assertEqual(self.resolver.resolve('1 tsp smoked paprika'), self.paprika.pk)
+        self.assertEqual(self.resolver.resolve('1 tsp smokd paprika'), self.paprika.pk)
+
+    def test_resolver_follows_the_shared_version(self):
+        resolver = get_ingredient_resolver()
+        self.assertIsNone(resolver.resolve('2 bananas'))
+
+        # A term added by another process: this one only sees the version bump
+        Glossary.objects.bulk_create([Glossary(name='Banana', singular_name='banana', plural_name='bananas',
+                                               slug='banana', description='', lft=0, rght=0, tree_id=0, level=0)])
+        self.assertIs(get_ingredient_resolver(), resolver)
+        get_cache().invalidate(RESOLVER_SCOPE)
+        self.assertEqual(get_ingredient_resolver().resolve('2 bananas'), Glossary.objects.get(slug='banana').pk)
+
+    def test_plain_recipe_lines_are_resolved_on_save(self):
+        recipe = make_recipe('Shakshuka', '4 large eggs\n400 g chopped tomatoes\n1 banana')
+        self.assertEqual(
+            list(recipe.ingredients.order_by('position').values_list('glossary', flat=True)),
+            [self.egg.pk, self.tomato.pk, None],
+        )
+
+
+class ImportDemoDataTests(TransactionTestCase):
+    """
+    Importing the demo data replaces the catalog, including the rows derived from it.
+
+    Foreign keys are only checked when SQLite commits, so this runs outside a test transaction.
+    """
+
+    def test_import_twice(self):
+        call_command('import_demo_data', stdout=StringIO())
+        recipes = Recipe.objects.count()
+        recommendations = RecipeRecommendation.objects.count()
+        self.assertGreater(recipes, 0)
+        self.assertGreater(recommendations, 0)
+
+        call_command('import_demo_data', stdout=StringIO())
+        self.assertEqual(Recipe.objects.count(), recipes)
+        self.assertEqual(RecipeRecommendation.objects.count(), recommendations)
+
+
+class StoredNutritionTests(TestCase):
+    """
+    Recipe pages read the stored nutrition totals and never write them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.calories = Nutrient.objects.create(name='Calories', unit='kcal')
+        egg = Glossary.objects.create(name='Egg', singular_name='egg', plural_name='eggs', slug='egg', description='')
+        GlossaryNutrient.objects.create(glossary=egg, nutrient=cls.calories, value=70)
+        cls.recipe = Recipe.objects.create(
+            recipe_name='Boiled eggs', slug='boiled-eggs', description='', ingredients_text='2 [eggs]',
+            instructions='Boil.', preparation_time=1, cooking_time=8, servings=2,
+        )
+
+    def test_saving_a_recipe_stores_its_nutrition(self):
+        # Values are per 100g
+        self.assertAlmostEqual(RecipeNutrition.objects.get(recipe=self.recipe, nutrient=self.calories).total, 1.4)
+
+    def test_incomplete_nutrition_is_calculated_without_writing(self):
+        RecipeNutrition.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            nutrition = self.recipe.get_detailed_nutritional_values()
+        self.assertAlmostEqual(nutrition['total']['calories'], 1.4)
+        self.assertEqual([query['sql'] for query in queries if not query['sql'].startswith('SELECT')], [])
+        self.assertFalse(RecipeNutrition.objects.exists())
+
+
+class RecipeFilterTests(TestCase):
+    """
+    Recipes are filtered by nutrient ranges and category subtrees, and sorted by any nutrient.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.calories = Nutrient.objects.create(name='Calories', unit='kcal')
+        cls.protein = Nutrient.objects.create(name='Protein', unit='g')
+        cls.soups = Category.objects.create(name='Soups', slug='soups')
+        cls.cold_soups = Category.objects.create(name='Cold soups', slug='cold-soups', parent=cls.soups)
+        cls.recipes = {}
+        for name, calories, protein in [('Gazpacho', 120, 4), ('Lentil soup', 310, 18), ('Omelette', 250, 21)]:
+            recipe = make_recipe(name)
+            cls.recipes[name] = recipe
+            for nutrient, value in ((cls.calories, calories), (cls.protein, protein)):
+                RecipeNutrition.objects.update_or_create(
+                    recipe=recipe, nutrient=nutrient, defaults={'total': value * 2, 'per_serving': value},
+                )
+        cls.recipes['Gazpacho'].categories.add(cls.cold_soups)
+        cls.recipes['Lentil soup'].categories.add(cls.soups)
+
+    def setUp(self):
+        caches['default'].clear()
+        get_cache().local.clear()
+
+    def filtered(self, data):
+        form = RecipeFilterForm(data, nutrients=[self.calories, self.protein])
+        self.assertTrue(form.is_valid(), form.errors)
+        return [recipe.recipe_name for recipe in form.filter_queryset(Recipe.objects.all())]
+
+    def test_nutrient_ranges_per_serving(self):
+        self.assertEqual(set(self.filtered({'min_calories': 200})), {'Lentil soup', 'Omelette'})
+        self.assertEqual(self.filtered({'min_calories': 200, 'max_calories': 300}), ['Omelette'])
+        self.assertEqual(self.filtered({'max_calories': 300, 'min_protein': 10}), ['Omelette'])
+
+    def test_sorting_by_a_nutrient(self):
+        self.assertEqual(self.filtered({'sort': '-protein'}), ['Omelette', 'Lentil soup', 'Gazpacho'])
+        self.assertEqual(self.filtered({'sort': 'calories'}), ['Gazpacho', 'Omelette', 'Lentil soup'])
+
+    def test_category_covers_its_subtree(self):
+        self.assertEqual(set(self.filtered({'category': 'soups'})), {'Gazpacho', 'Lentil soup'})
+        self.assertEqual(self.filtered({'category': 'cold-soups'}), ['Gazpacho'])
+
+    def test_json_results_are_paged(self):
+        for i in range(12):
+            make_recipe(f'Snack {i}')
+        url = reverse('recipe_filter')
+        first = self.client.get(url, {'format': 'json', 'sort': 'newest'}).json()
+        self.assertEqual((first['count'], first['num_pages'], first['next_page']), (15, 2, 2))
+        self.assertEqual(len(first['results']), 12)
+
+        second = self.client.get(url, {'format': 'json', 'sort': 'newest', 'page': 2}).json()
+        self.assertEqual((second['page'], second['previous_page'], second['next_page']), (2, 1, None))
+        self.assertEqual([result['name'] for result in second['results']], ['Omelette', 'Lentil soup', 'Gazpacho'])
+        self.assertEqual(second['results'][0]['per_serving'], {'calories': 250})
+
+    def test_invalid_filters_return_400(self):
+        url = reverse('recipe_filter')
+        for params in ({'min_calories': 'lots'}, {'sort': 'sugar'}, {'category': 'missing'}):
+            response = self.client.get(url, {'format': 'json', **params})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(next(iter(params)), response.json()['errors'])
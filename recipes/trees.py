@@ -0,0 +1,180 @@
+from django.db.models import Count, OuterRef, Q, Subquery
+
+from .cache import get_cache
+
+
+def subtree_q(node, prefix=''):
+    """
+    Filter matching a node and all its descendants as one range on lft.
+
+    Args:
+        node: MPTT node, or a snapshot node dict, at the top of the subtree
+        prefix (str): Lookup path to the tree model, e.g. 'category__'
+
+    Returns:
+        Q: tree_id and lft range condition, served by the (tree_id, lft) index
+    """
+    if isinstance(node, dict):
+        tree_id, lft, rght = node['tree_id'], node['lft'], node['rght']
+    else:
+        tree_id, lft, rght = node.tree_id, node.lft, node.rght
+    return Q(**{
+        f'{prefix}tree_id': tree_id,
+        f'{prefix}lft__gte': lft,
+        f'{prefix}lft__lte': rght,
+    })
+
+
+def recipes_in_subtree(category, queryset=None):
+    """
+    Recipes filed under a category or any of its sub-categories.
+
+    Uses a subquery on the category links instead of a join, so recipes in
+    several sub-categories are returned once without DISTINCT.
+
+    Args:
+        category: Category node or snapshot node dict
+        queryset (QuerySet, optional): Recipe queryset to filter
+
+    Returns:
+        QuerySet: Recipes in the subtree
+    """
+    from .models import Recipe
+
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    links = Recipe.categories.through.objects.filter(subtree_q(category, 'category__'))
+    return queryset.filter(id__in=links.values('recipe_id'))
+
+
+class TreeSnapshot:
+    """
+    Flat copy of an MPTT tree in tree order, loaded with one query.
+
+    Nodes are plain dicts, so the snapshot pickles into the shared cache
+    and templates can walk it without touching the database. Because the
+    nodes are sorted by (tree_id, lft), the descendants of a node are the
+    (rght - lft - 1) / 2 nodes right after it.
+
+    Args:
+        nodes (list): Node dicts sorted by tree_id and lft
+    """
+
+    FIELDS = ('id', 'name', 'slug', 'parent_id', 'tree_id', 'lft', 'rght', 'level')
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self._positions = {node['id']: position for position, node in enumerate(nodes)}
+        self._slugs = {node['slug']: node['id'] for node in nodes}
+        self._children = {}
+        for node in nodes:
+            self._children.setdefault(node['parent_id'], []).append(node)
+
+    @classmethod
+    def load(cls, queryset):
+        return cls(list(queryset.order_by('tree_id', 'lft').values(*cls.FIELDS)))
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def get(self, node_id):
+        position = self._positions.get(node_id)
+        return None if position is None else self.nodes[position]
+
+    def get_by_slug(self, slug):
+        return self.get(self._slugs.get(slug))
+
+    def roots(self):
+        return self._children.get(None, [])
+
+    def children(self, node_id):
+        return self._children.get(node_id, [])
+
+    def descendants(self, node_id, include_self=False):
+        """
+        Returns the nodes under a node, in tree order.
+        """
+        position = self._positions.get(node_id)
+        if position is None:
+            return []
+        node = self.nodes[position]
+        size = (node['rght'] - node['lft'] - 1) // 2
+        start = position if include_self else position + 1
+        return self.nodes[start:position + 1 + size]
+
+    def descendant_ids(self, node_id, include_self=True):
+        return [node['id'] for node in self.descendants(node_id, include_self)]
+
+    def ancestors(self, node_id, include_self=False):
+        """
+        Returns the nodes above a node, root first, e.g. for breadcrumbs.
+        """
+        node = self.get(node_id)
+        path = [node] if node and include_self else []
+        while node and node['parent_id'] is not None:
+            node = self.get(node['parent_id'])
+            path.append(node)
+        return path[::-1]
+
+
+def category_recipe_counts():
+    """
+    Count the recipes of every category, directly and across its subtree.
+
+    Subtree counts are distinct, so a recipe filed under two sub-categories
+    counts once for their parent.
+
+    Returns:
+        dict: Category id mapped to (direct count, subtree count)
+    """
+    from .models import Category, Recipe
+
+    links = Recipe.categories.through.objects
+    direct = dict(links.values('category_id').annotate(recipes=Count('recipe_id')).values_list('category_id', 'recipes'))
+    subtree = links.filter(
+        category__tree_id=OuterRef('tree_id'),
+        category__lft__gte=OuterRef('lft'),
+        category__lft__lte=OuterRef('rght'),
+    ).order_by().values('category__tree_id').annotate(recipes=Count('recipe_id', distinct=True)).values('recipes')
+    totals = Category.objects.annotate(recipe_total=Subquery(subtree)).values_list('id', 'recipe_total')
+    return {category_id: (direct.get(category_id, 0), total or 0) for category_id, total in totals}
+
+
+def _build_category_tree():
+    from .models import Category
+
+    snapshot = TreeSnapshot.load(Category.objects.all())
+    counts = category_recipe_counts()
+    for node in snapshot:
+        node['recipe_count'], node['total_recipe_count'] = counts.get(node['id'], (0, 0))
+    return snapshot
+
+
+def _build_glossary_tree():
+    from .models import Glossary
+
+    return TreeSnapshot.load(Glossary.objects.all())
+
+
+def get_category_tree():
+    """
+    Returns the cached TreeSnapshot of categories with their recipe counts.
+
+    Rebuilt after the 'categories' scope (category edits and tree moves) or
+    the 'category_counts' scope (recipes filed or removed) is invalidated.
+    """
+    cache = get_cache()
+    key = cache.make_key('tree', ('categories', 'category_counts'), 'category')
+    return cache.get_or_set(key, _build_category_tree, None)
+
+
+def get_glossary_tree():
+    """
+    Returns the cached TreeSnapshot of glossary terms, rebuilt when the 'glossary' scope is invalidated.
+    """
+    cache = get_cache()
+    key = cache.make_key('tree', ('glossary',), 'glossary')
+    return cache.get_or_set(key, _build_glossary_tree, None)
@@ -1 +1,707 @@
+from django.shortcuts import render, get_object_or_404, redirect
+from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.urls import reverse_lazy
+from django.http import HttpResponse, JsonResponse
+from django.core.exceptions import PermissionDenied
+from .models import Recipe, Category, Glossary, GlossaryCategory, Nutrient, RecipeNutrition, RecipeReview, ReviewReply
+from .forms import RecipeForm, CategoryForm, GlossaryForm, RecipeReviewForm, ReviewReplyForm, RecipeFilterForm
+from .nutrition import NutritionEngine
+from .search import SearchResults
+from .cache import cache_anonymous_page, get_cache
+from .counters import count_recipe_view
+from .profiling import get_registry, is_local_request
+from .pagination import CachedCountPaginator, CursorPaginator, use_cursor_pagination
+from .trees import get_category_tree, get_glossary_tree, recipes_in_subtree
+from django.db.models import Q
+from django.urls import reverse
+from django.db.models import Q, Avg, Count, Prefetch
+from django.contrib.auth import get_user_model
 
+def recipe_card_queryset():
+    """
+    Recipes shaped for list cards and pages that show many recipes.
+
+    Categories are prefetched and ratings come from the stored review
+    aggregates, so rendering a page costs the same number of queries
+    whatever its size. Long text the cards never show is deferred.
+
+    Returns:
+        QuerySet: Recipes ready for list templates
+    """
+    return Recipe.objects.defer(
+        'instructions', 'ingredients_text', 'ingredients_html'
+    ).prefetch_related('categories')
+
+@cache_anonymous_page('recipes', 'categories')
+def recipe_list_view(request, category_slug=None):
+    """
+    Function-based view to list recipes, optionally filtered by category.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        category_slug (str, optional): Slug of the category to filter recipes
+
+    Returns:
+        HttpResponse: Rendered recipe list template
+    """
+    queryset = recipe_card_queryset()
+
+    if category_slug:
+        category = get_object_or_404(Category, slug=category_slug)
+        queryset = queryset.filter(categories=category)
+
+    # Pagination
+    if use_cursor_pagination(request):
+        # Seek on (created_at, id) so deep pages cost the same as the first one
+        paginator = CursorPaginator(queryset, 12, ('-created_at', '-id'), scopes=('recipes',))
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = CachedCountPaginator(queryset, 12, scopes=('recipes',))  # Show 12 recipes per page
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
+
+    context = {
+        'recipes': page_obj,
+        'categories': Category.objects.all(),
+        'is_paginated': page_obj.has_other_pages(),
+    }
+
+    return render(request, 'recipes/recipe_list.html', context)
+
+@count_recipe_view
+@cache_anonymous_page('recipe:{slug}', 'glossary', 'categories', 'recommendations')
+def recipe_detail_view(request, slug):
+    """
+    Function-based view to display a single recipe's details.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the recipe
+
+    Returns:
+        HttpResponse: Rendered recipe detail template
+    """
+    recipe = get_object_or_404(Recipe, slug=slug)
+
+    # Get related recipes
+    related_recipes = recipe.get_related_recipes()
+
+    # Get nutritional values
+    nutritional_details = recipe.get_detailed_nutritional_values()
+
+
+    # Get reviews
+    reviews = RecipeReview.objects.filter(recipe=recipe, is_approved=True).order_by('-created_at')
+
+    star_values = [5, 4, 3, 2, 1]
+
+    # Review statistics are stored on the recipe
+    average_rating = recipe.averageReview()
+    review_count = recipe.review_count
+    star_percentages = recipe.get_star_percentages()
+
+    context = {
+        'recipe': recipe,
+        'related_recipes': related_recipes,
+        'total_nutrition': nutritional_details['total'],
+        'daily_values': nutritional_details['daily_values'],
+        'reviews': reviews,
+        'average_rating': average_rating,
+        'review_count': review_count,
+        'star_values': star_values,
+        'star_percentages': star_percentages,
+        'review_form': RecipeReviewForm(),
+        'reply_form': ReviewReplyForm(),
+    }
+
+    return render(request, 'recipes/recipe_detail.html', context)
+
+@login_required
+def recipe_create_view(request):
+    """
+    Function-based view to create a new recipe.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        HttpResponse: Rendered recipe form or redirects after successful creation
+    """
+    if request.method == 'POST':
+        form = RecipeForm(request.POST, request.FILES)
+        if form.is_valid():
+            recipe = form.save()
+            messages.success(request, 'Recipe created successfully!')
+            return redirect(recipe.get_absolute_url())
+    else:
+        form = RecipeForm()
+
+    context = {
+        'form': form,
+        'glossary_terms': Glossary.objects.all()
+    }
+    return render(request, 'recipes/recipe_form.html', context)
+
+@login_required
+def recipe_update_view(request, slug):
+    """
+    Function-based view to update an existing recipe.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the recipe to update
+
+    Returns:
+        HttpResponse: Rendered recipe form or redirects after successful update
+    """
+    recipe = get_object_or_404(Recipe, slug=slug)
+
+    if request.method == 'POST':
+        form = RecipeForm(request.POST, request.FILES, instance=recipe)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Recipe updated successfully!')
+            return redirect(recipe.get_absolute_url())
+    else:
+        form = RecipeForm(instance=recipe)
+
+    context = {
+        'form': form,
+        'recipe': recipe,
+        'glossary_terms': Glossary.objects.all()
+    }
+    return render(request, 'recipes/recipe_form.html', context)
+
+@login_required
+def recipe_delete_view(request, slug):
+    """
+    Function-based view to delete a recipe.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the recipe to delete
+
+    Returns:
+        HttpResponse: Rendered delete confirmation or redirects after deletion
+    """
+    recipe = get_object_or_404(Recipe, slug=slug)
+
+    if request.method == 'POST':
+        recipe.delete()
+        messages.success(request, 'Recipe deleted successfully!')
+        return redirect('recipe_list')
+
+    return render(request, 'recipes/recipe_confirm_delete.html', {'recipe': recipe})
+
+@cache_anonymous_page('categories')
+def category_list_view(request):
+    """
+    Function-based view to list all categories.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        HttpResponse: Rendered category list template
+    """
+    categories = Category.objects.all()
+    context = {'categories': categories, 'category_tree': get_category_tree()}
+
+    if use_cursor_pagination(request):
+        page_obj = CursorPaginator(categories, 50, ('tree_id', 'lft'), scopes=('categories',)).get_page(request.GET.get('cursor'))
+        context.update({'categories': page_obj, 'is_paginated': page_obj.has_other_pages()})
+
+    return render(request, 'recipes/category_list.html', context)
+
+@cache_anonymous_page('category:{slug}', 'categories')
+def category_detail_view(request, slug):
+    """
+    Function-based view to display a single category's details.
+
+    Lists the recipes of the category and all its sub-categories, or only
+    the category's own recipes with ?direct=1.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the category
+
+    Returns:
+        HttpResponse: Rendered category detail template
+    """
+    category = get_object_or_404(Category, slug=slug)
+    include_subcategories = not request.GET.get('direct')
+    if include_subcategories:
+        recipes = recipes_in_subtree(category, recipe_card_queryset())
+    else:
+        recipes = recipe_card_queryset().filter(categories=category)
+
+    # Large categories are paged the same way as the recipe list
+    if use_cursor_pagination(request):
+        paginator = CursorPaginator(recipes, 12, ('-created_at', '-id'), scopes=('recipes', 'categories'))
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = CachedCountPaginator(recipes, 12, scopes=('recipes', 'categories'))
+        page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Sub-categories, breadcrumbs and counts come from the cached tree snapshot
+    tree = get_category_tree()
+    context = {
+        'category': category,
+        'recipes': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'include_subcategories': include_subcategories,
+        'category_node': tree.get(category.id),
+        'subcategories': tree.children(category.id),
+        'ancestors': tree.ancestors(category.id),
+    }
+    return render(request, 'recipes/category_detail.html', context)
+
+@cache_anonymous_page('glossary')
+def glossary_list_view(request):
+    """
+    Function-based view to list all glossary terms.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        HttpResponse: Rendered glossary list template
+    """
+    terms = Glossary.objects.all()
+    context = {'terms': terms}
+
+    if use_cursor_pagination(request):
+        page_obj = CursorPaginator(terms, 50, ('tree_id', 'lft'), scopes=('glossary',)).get_page(request.GET.get('cursor'))
+        context.update({'terms': page_obj, 'is_paginated': page_obj.has_other_pages()})
+
+    return render(request, 'recipes/glossary_list.html', context)
+
+@cache_anonymous_page('glossary:{slug}', 'recipes')
+def glossary_detail_view(request, slug):
+    """
+    Function-based view to display a single Glossary term's details.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the glossary term
+
+    Returns:
+        HttpResponse: Rendered glossary detail template
+    """
+    glossary_term = get_object_or_404(Glossary, slug=slug)
+
+    # Get child terms
+    child_terms = Glossary.objects.filter(parent=glossary_term)
+
+    # Get recipes that use this term in [brackets] through the ingredient term index
+    related_recipes = Recipe.objects.filter(
+        ingredient_terms__term__in=glossary_term.get_term_forms()
+    ).distinct()
+
+    # If no recipes found and term has children, check child terms
+    if not related_recipes and child_terms:
+        term_forms = set()
+        for term in glossary_term.get_descendants().only('name', 'singular_name', 'plural_name'):
+            term_forms |= term.get_term_forms()
+        related_recipes = Recipe.objects.filter(ingredient_terms__term__in=term_forms).distinct()
+
+    context = {
+        'glossary_term': glossary_term,
+        'child_terms': child_terms,
+        'related_recipes': related_recipes,
+    }
+
+    return render(request, 'recipes/glossary_detail.html', context)
+
+@cache_anonymous_page('glossary')
+def glossary_category_list_view(request):
+    """
+    Function-based view to list all Glossary Categories.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        HttpResponse: Rendered glossary category list template
+    """
+    categories = GlossaryCategory.objects.all()
+
+    context = {
+        'categories': categories,
+    }
+
+    return render(request, 'recipes/glossary_category_list.html', context)
+
+@cache_anonymous_page('glossary')
+def glossary_category_detail_view(request, slug):
+    """
+    Function-based view to display a single Glossary Category's details.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the glossary category
+
+    Returns:
+        HttpResponse: Rendered glossary category detail template
+    """
+    category = get_object_or_404(GlossaryCategory, slug=slug)
+
+    # Get all glossary terms in this category
+    glossary_terms = Glossary.objects.filter(category=category)
+
+    # Separate top-level and child terms
+    top_level_terms = glossary_terms.filter(parent__isnull=True)
+    child_terms = glossary_terms.filter(parent__isnull=False)
+
+    # The terms in tree order with their level, so templates need not walk children
+    term_ids = set(glossary_terms.values_list('id', flat=True))
+    term_tree = [node for node in get_glossary_tree() if node['id'] in term_ids]
+
+    context = {
+        'category': category,
+        'top_level_terms': top_level_terms,
+        'child_terms': child_terms,
+        'term_tree': term_tree,
+    }
+
+    return render(request, 'recipes/glossary_category_detail.html', context)
+
+@cache_anonymous_page('recipe:{slug}', 'glossary')
+def recipe_calories_detail_view(request, slug):
+    """
+    Function-based view to display a recipe's detailed nutritional information.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+        slug (str): Unique slug of the recipe
+
+    Returns:
+        HttpResponse: Rendered recipe calories detail template
+    """
+    recipe = get_object_or_404(Recipe, slug=slug)
+    engine = NutritionEngine()
+    nutritional_details = recipe.get_detailed_nutritional_values(engine)
+
+    nutrient_details = {
+        nutrient.name.lower(): {
+            'unit': nutrient.unit,
+            'nutrient_type': nutrient.nutrient_type
+        }
+        for nutrient in engine.nutrients
+    }
+
+    # Define nutrient type mapping
+    type_mapping = {
+        'macro': 'macro',
+        'micro': 'micro',
+        'vitamin': 'vitamin',
+        'mineral': 'mineral',
+        'other': 'other'
+    }
+
+    # Group nutrients by type
+    total_nutrition_grouped = {
+        'macro': {},
+        'micro': {},
+        'vitamin': {},
+        'mineral': {},
+        'other': {}
+    }
+
+    # Categorize nutrients based on their type
+    for nutrient, value in nutritional_details['total'].items():
+        nutrient_lower = nutrient.lower()
+        nutrient_info = nutrient_details.get(nutrient_lower, {})
+        nutrient_type = nutrient_info.get('nutrient_type', 'other')
+
+        # Map the nutrient type to a group
+        group_key = type_mapping.get(nutrient_type, 'other')
+
+        # Add nutrient to the appropriate group
+        total_nutrition_grouped[group_key][nutrient] = value
+
+    context = {
+        'recipe': recipe,
+        'total_nutrition': total_nutrition_grouped,
+        'daily_values': nutritional_details['daily_values'],
+        'nutrient_units': {k: v['unit'] for k, v in nutrient_details.items()},
+    }
+
+    return render(request, 'recipes/recipe_calories_detail.html', context)
+
+
+
+def create_review(request, slug):
+    """
+    Create a review for a specific recipe.
+    Allows both authenticated and guest reviews.
+    All reviews are set as unapproved by default.
+    """
+    recipe = get_object_or_404(Recipe, slug=slug)
+
+    if request.method == 'POST':
+        review_form = RecipeReviewForm(request.POST)
+
+        if review_form.is_valid():
+            try:
+                # Check if user is authenticated
+                if request.user.is_authenticated:
+                    # Check if user has already reviewed this recipe
+                    existing_review = RecipeReview.objects.filter(
+                        recipe=recipe,
+                        user=request.user
+                    ).first()
+
+                    if existing_review:
+                        # Update existing review
+                        existing_review.rating = review_form.cleaned_data['rating']
+                        existing_review.review_text = review_form.cleaned_data['review_text']
+                        existing_review.is_approved = False  # Reset approval status
+                        existing_review.save()
+                        messages.info(request, 'Your review has been updated and is pending approval.')
+                    else:
+                        # Create new review
+                        new_review = review_form.save(commit=False)
+                        new_review.recipe = recipe
+                        new_review.user = request.user
+                        new_review.is_approved = False
+                        new_review.ip_address = get_client_ip(request)
+                        new_review.save()
+                        messages.info(request, 'Your review is pending approval.')
+
+                else:
+                    # Guest review
+                    name = request.POST.get('name')
+                    email = request.POST.get('email')
+
+                    # Validate guest review
+                    if not name or not email:
+                        messages.error(request, 'Name and email are required for guest reviews.')
+                        return redirect(recipe.get_absolute_url())
+
+                    try:
+                        # Check if guest has already reviewed with this email
+                        review = RecipeReview.objects.get(recipe=recipe, email=email)
+
+                        # Update existing review
+                        review.rating = request.POST.get('rating')
+                        review.review_text = request.POST.get('review_text')
+                        review.name = name
+                        review.ip = get_client_ip(request)
+                        review.is_approved = False
+                        review.save()
+
+                        messages.info(request, 'Your previous review has been updated.')
+
+                    except RecipeReview.DoesNotExist:
+                        # Create new guest review
+                        review = RecipeReview.objects.create(
+                            recipe=recipe,
+                            name=name,
+                            email=email,
+                            rating=request.POST.get('rating'),
+                            review_text=request.POST.get('review_text'),
+                            ip=get_client_ip(request),
+                            is_approved=False
+                        )
+                        messages.success(request, 'Your review has been submitted and is pending approval.')
+
+                return redirect(recipe.get_absolute_url())
+
+            except Exception as e:
+                # Log the error (you might want to use proper logging)
+                import logging
+                logger = logging.getLogger(__name__)
+                logger.error(f"Error creating review: {str(e)}")
+                messages.error(request, 'An error occurred while submitting your review. Please try again.')
+
+    return redirect(recipe.get_absolute_url())
+
+@login_required
+def create_reply(request, review_id):
+    """
+    Create a reply to a specific review.
+    """
+    review = get_object_or_404(RecipeReview, id=review_id)
+
+    if request.method == 'POST':
+        reply_text = request.POST.get('reply_text', '').strip()
+
+        if not reply_text:
+            messages.error(request, 'Reply text cannot be empty.')
+            return redirect(review.recipe.get_absolute_url())
+
+        try:
+            reply = ReviewReply.objects.create(
+                review=review,
+                user=request.user,
+                reply_text=reply_text,
+                ip=request.META.get('REMOTE_ADDR')
+            )
+            messages.success(request, 'Your reply has been submitted and is pending approval.')
+        except Exception as e:
+            messages.error(request, f'An error occurred: {str(e)}')
+
+        return redirect(review.recipe.get_absolute_url())
+
+    return redirect(review.recipe.get_absolute_url())
+
+def get_client_ip(request):
+    """
+    Retrieve the client's IP address.
+    """
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+def search_view(request):
+    """
+    Function-based view to search recipes, glossary terms and videos.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with the query in ?q=
+            and an optional ?type= of recipe, glossary or video
+
+    Returns:
+        HttpResponse: Rendered search results template
+    """
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('type')
+
+    results = SearchResults(query, kinds=[kind] if kind else None)
+
+    # Pagination
+    paginator = Paginator(results, 12)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+
+    context = {
+        'query': query,
+        'type': kind,
+        'results': page_obj,
+        'result_count': paginator.count,
+        'is_paginated': page_obj.has_other_pages(),
+    }
+
+    return render(request, 'recipes/search_results.html', context)
+
+
+def _filter_result(recipe, nutrient_keys):
+    return {
+        'name': recipe.recipe_name or recipe.title,
+        'slug': recipe.slug,
+        'url': recipe.get_absolute_url(),
+        'image': recipe.image.url if recipe.image else None,
+        'difficulty': recipe.difficulty,
+        'total_time': recipe.total_time,
+        'servings': recipe.servings,
+        'rating': recipe.averageReview(),
+        'categories': [category.slug for category in recipe.categories.all()],
+        'per_serving': {
+            nutrient_keys[row.nutrient_id]: row.per_serving for row in recipe.nutrition.all()
+        },
+    }
+
+
+@cache_anonymous_page('recipes', 'categories', 'glossary')
+def recipe_filter_view(request):
+    """
+    Function-based view to filter and sort recipes by nutrition, time, difficulty and category.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with RecipeFilterForm
+            fields in the query string; ?format=json returns JSON
+
+    Returns:
+        HttpResponse: Rendered filter template, or a JsonResponse with one page of results
+    """
+    nutrients = list(Nutrient.objects.all())
+    form = RecipeFilterForm(request.GET or None, nutrients=nutrients)
+    as_json = request.GET.get('format') == 'json'
+
+    if form.is_bound and not form.is_valid():
+        if as_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return render(request, 'recipes/recipe_filter.html', {'form': form, 'recipes': [], 'is_paginated': False})
+
+    queryset = recipe_card_queryset()
+    shown = []
+    if form.is_bound:
+        queryset = form.filter_queryset(queryset)
+        shown = [nutrient for nutrient, _, _ in form.nutrient_ranges()]
+        sort_nutrient, _ = form.sort_nutrient()
+        if sort_nutrient is not None:
+            shown.append(sort_nutrient)
+    else:
+        queryset = queryset.order_by('-created_at', '-id')
+    shown += [nutrient for nutrient in nutrients if nutrient.name.lower() == 'calories']
+
+    queryset = queryset.prefetch_related(
+        Prefetch('nutrition', queryset=RecipeNutrition.objects.filter(nutrient__in=shown))
+    )
+
+    # Pagination
+    paginator = CachedCountPaginator(queryset, 12, scopes=('recipes', 'glossary'))
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    if as_json:
+        nutrient_keys = {nutrient.id: RecipeFilterForm.nutrient_key(nutrient) for nutrient in nutrients}
+        return JsonResponse({
+            'count': paginator.count,
+            'page': page_obj.number,
+            'num_pages': paginator.num_pages,
+            'next_page': page_obj.next_page_number() if page_obj.has_next() else None,
+            'previous_page': page_obj.previous_page_number() if page_obj.has_previous() else None,
+            'results': [_filter_result(recipe, nutrient_keys) for recipe in page_obj],
+        })
+
+    context = {
+        'form': form,
+        'recipes': page_obj,
+        'result_count': paginator.count,
+        'is_paginated': page_obj.has_other_pages(),
+    }
+    return render(request, 'recipes/recipe_filter.html', context)
+
+
+@staff_member_required
+def cache_stats_view(request):
+    """
+    Function-based view returning the page cache counters of this process.
+
+    Args:
+        request (HttpRequest): The HTTP request object
+
+    Returns:
+        JsonResponse: Hit, miss and invalidation counters with the local tier size
+    """
+    return JsonResponse(get_cache().get_stats())
+
+
+def profiling_stats_view(request):
+    """
+    Function-based view exporting the request profiles of this process.
+
+    Open to staff users, and to the addresses listed in RECIPES_PROFILING['ALLOWED_IPS']
+    so a local Prometheus agent can scrape it; none are listed by default.
+
+    Args:
+        request (HttpRequest): The HTTP request object, with ?format=prometheus
+            for the Prometheus text format
+
+    Returns:
+        HttpResponse: Per-route timings, query counts, spans and slow-path reports
+    """
+    if not (is_local_request(request) or request.user.is_staff):
+        raise PermissionDenied
+    registry = get_registry()
+    if request.GET.get('format') == 'prometheus':
+        return HttpResponse(registry.as_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    return JsonResponse(registry.as_dict())